@@ -1,26 +1,303 @@
+import array
+import bisect
+import collections
+import fractions
+import functools
+import hashlib
+import itertools
+import operator
+import os
 import random
-import math
+import shutil
+import sys
+import threading
+import types
 
 # Set to True in order to use an experimental (and IMO not as good) way of adhusting probability
 #  such that probability is guaranteed (I think) to increase monotonically with increasing
 #  underrepresentedness
 USE_MULTIPLICATIVE_ADJUSTING = False
 
+# Maximum number of different (num_dice, num_sides) configurations whose normal distributions are
+#  kept in NORMAL_DISTRIBUTION_CACHE at once
+NORMAL_DISTRIBUTION_CACHE_SIZE = 128
+# Maximum number of entries in each of the caches dice keep for preview() and
+#  expected_distribution_after(). A cache is emptied when it grows past this.
+PREVIEW_CACHE_SIZE = 2 ** 20
+# Number of random numbers DiceRNG.uniform_buffers() draws at a time, which bounds the memory used
+#  for them by roll_many() no matter how many rolls there are
+UNIFORM_BUFFER_SIZE = 4096
+
+
+def dice_sum_counts(num_dice, num_sides):
+    """ Returns a list of the exact number of ways (out of <num_sides>**<num_dice>) of getting each
+    possible sum when rolling <num_dice> dice, each with <num_sides> sides. The first element is
+    for the smallest possible sum, <num_dice>, and the last is for the largest, <num_dice> *
+    <num_sides>.
+    <num_dice> and <num_sides> must both be positive integers.
+    """
+    # The counts for n dice are the coefficients of (x + x^2 + ... + x^num_sides)^n. Multiplying by
+    #  one more die's polynomial replaces each count with the sum of the <num_sides> counts ending
+    #  at it, which is a sliding window sum and so takes a single pass over prefix sums. This is
+    #  cheaper than exponentiation by squaring, since squaring a general polynomial costs
+    #  quadratic time in its length while each die here only costs linear time.
+    counts = [1] * num_sides
+    for _ in range(num_dice - 1):
+        prefix_sums = [0]
+        prefix_sums.extend(itertools.accumulate(counts))
+        num_counts = len(counts)
+        counts = [prefix_sums[min(i + 1, num_counts)] - prefix_sums[max(i + 1 - num_sides, 0)]
+                  for i in range(num_counts + num_sides - 1)]
+    return counts
+
+
+def dice_sum_distribution(num_dice, num_sides):
+    """ Returns an array of the probabilities of getting each possible sum when rolling <num_dice>
+    dice, each with <num_sides> sides. The first element is for the smallest possible sum,
+    <num_dice>, and the last is for the largest, <num_dice> * <num_sides>.
+    <num_dice> and <num_sides> must both be positive integers.
+    """
+    num_individual_dice_roll_permutations = num_sides ** num_dice
+    # Dividing the exact integer counts (rather than accumulating floats) means each probability is
+    #  correctly rounded, no matter how many dice there are.
+    return array.array("d", [count / num_individual_dice_roll_permutations
+                             for count in dice_sum_counts(num_dice, num_sides)])
+
+
+# Names of the ways GamblersFallacyDice can sample a roll from its probabilities. See
+#  GamblersFallacyDice.__init__() for what each one does.
+SAMPLERS = ("linear", "bisect", "alias")
+# The normal (unadjusted) distribution of the sum of some dice. <probabilities> is a read only
+#  mapping from each possible roll to the probability of getting that roll, <cumulative> is a
+#  tuple whose i-th element is the probability of getting one of the i + 1 smallest rolls, and
+#  <alias> is the alias_table() of the probabilities. <values> is a tuple of the probabilities in
+#  order, <counts> is a tuple of the exact number of ways of getting each roll out of
+#  <num_permutations> (see dice_sum_counts()), and <multiplicative_offsets> is a tuple of the
+#  pseudo-count of each roll used by multiplicative adjusting (see adjust_multiplicative()).
+NormalDistribution = collections.namedtuple(
+    "NormalDistribution", ["probabilities", "cumulative", "alias", "values", "counts",
+                           "num_permutations", "multiplicative_offsets"])
+
+
+class NormalDistributionCache:
+    """ A bounded, thread safe cache of NormalDistributions, keyed by (num_dice, num_sides). When
+    full, the least recently used distribution is evicted. The cached distributions are read only,
+    so they're shared by every dice instance with the same configuration.
+    """
+
+    def __init__(self, max_size):
+        """ Initializes an empty cache which holds at most <max_size> distributions.
+        <max_size> must be a positive integer.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # Maps (num_dice, num_sides) to its NormalDistribution, from least to most recently used
+        self._distributions = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, num_dice, num_sides):
+        """ Returns the NormalDistribution for <num_dice> dice each with <num_sides> sides,
+        computing it only if it isn't already cached.
+        <num_dice> and <num_sides> must both be positive integers.
+        """
+        key = (num_dice, num_sides)
+        with self._lock:
+            distribution = self._distributions.get(key)
+            if distribution is not None:
+                self._distributions.move_to_end(key)
+                self.hits += 1
+                return distribution
+            self.misses += 1
+        # Computed without holding the lock so that other configurations can still be looked up in
+        #  the meantime. Two threads missing on the same key at once just compute it twice.
+        # Like dice_sum_distribution(), but keeping the exact counts, which exact dice need
+        counts = tuple(dice_sum_counts(num_dice, num_sides))
+        num_permutations = num_sides ** num_dice
+        probabilities = array.array("d", [count / num_permutations for count in counts])
+        values = tuple(probabilities)
+        least_probability = min(values)
+        distribution = NormalDistribution(
+            types.MappingProxyType(dict(zip(range(num_dice, num_dice * num_sides + 1), values))),
+            tuple(itertools.accumulate(probabilities)),
+            alias_table(probabilities),
+            values, counts, num_permutations,
+            tuple(probability / least_probability for probability in values))
+        with self._lock:
+            self._distributions[key] = distribution
+            self._distributions.move_to_end(key)
+            self._evict()
+        return distribution
+
+    def resize(self, max_size):
+        """ Changes the maximum number of cached distributions to <max_size>, evicting the least
+        recently used distributions if there are now too many.
+        <max_size> must be a positive integer.
+        """
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        """ Removes every cached distribution and resets the hit and miss counters.
+        """
+        with self._lock:
+            self._distributions.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """ Returns a dictionary containing the number of hits, misses, currently cached
+        distributions and the maximum number of cached distributions.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._distributions),
+                    "max_size": self.max_size}
+
+    def _evict(self):
+        """ Removes least recently used distributions until there are at most self.max_size. Must
+        be called while holding self._lock.
+        """
+        while len(self._distributions) > self.max_size:
+            self._distributions.popitem(last=False)
+
+
+NORMAL_DISTRIBUTION_CACHE = NormalDistributionCache(NORMAL_DISTRIBUTION_CACHE_SIZE)
+
+
+def normal_distribution(num_dice, num_sides):
+    """ Returns the (cached) NormalDistribution of the sum of rolling <num_dice> dice, each with
+    <num_sides> sides.
+    <num_dice> and <num_sides> must both be positive integers.
+    """
+    return NORMAL_DISTRIBUTION_CACHE.get(num_dice, num_sides)
+
 
 def dice_sum_probability(sum, num_dice, num_sides):
     """ Returns the probability of getting <sum> points as the sum of rolling <num_dice> dice, each
     with <num_sides> sides.
     """
-    # See https://mathworld.wolfram.com/Dice.html and/or
-    #  https://www.lucamoroni.it/the-dice-roll-sum-problem/ for an explanation of the formula being
-    #  computed here.
-    probability = 0
-    k_max = math.floor((sum - num_dice) / num_sides)
-    for k in range(k_max + 1):
-        probability += (-1)**k * math.comb(num_dice,
-                                           k) * math.comb(sum - num_sides*k - 1, num_dice - 1)
-    probability /= num_sides**num_dice
-    return probability
+    return normal_distribution(num_dice, num_sides).probabilities.get(sum, 0.0)
+
+
+def alias_table(probabilities):
+    """ Returns the tables used by Vose's alias method for sampling an index of <probabilities> in
+    constant time, as a tuple (acceptances, aliases) of two lists as long as <probabilities>. To
+    sample, pick an index i uniformly at random, then keep it with probability acceptances[i] and
+    otherwise use aliases[i] instead (see sample_alias_table()).
+    <probabilities> must be a non-empty sequence of non-negative numbers with a positive sum. They
+    don't need to sum to exactly 1.
+    """
+    num_probabilities = len(probabilities)
+    scale = num_probabilities / _sum(probabilities)
+    scaled = [probability * scale for probability in probabilities]
+    acceptances = [1.0] * num_probabilities
+    aliases = list(range(num_probabilities))
+    small = [index for index, value in enumerate(scaled) if value < 1]
+    large = [index for index, value in enumerate(scaled) if value >= 1]
+    while small and large:
+        small_index = small.pop()
+        large_index = large.pop()
+        acceptances[small_index] = scaled[small_index]
+        aliases[small_index] = large_index
+        # The large index donates the rest of the small index's column
+        scaled[large_index] += scaled[small_index] - 1
+        if scaled[large_index] < 1:
+            small.append(large_index)
+        else:
+            large.append(large_index)
+    # Whatever is left over is only not exactly 1 because of floating point errors, so the
+    #  acceptances are left as 1.
+    return acceptances, aliases
+
+
+def sample_alias_table(table, rand):
+    """ Returns an index sampled using the alias_table() <table>, using up the single uniformly
+    random number <rand> (in [0, 1)).
+    """
+    acceptances, aliases = table
+    scaled = rand * len(acceptances)
+    index = min(int(scaled), len(acceptances) - 1)
+    if scaled - index < acceptances[index]:
+        return index
+    return aliases[index]
+
+
+class DiceRNG(random.Random):
+    """ A random number generator for dice, which can be seeded for reproducible rolls and can
+    spawn any number of child generators with independent streams of random numbers (for example,
+    one for each worker process of a parallel simulation). Everything random.Random provides is
+    available too, and a DiceRNG seeded with an integer which hasn't spawned anything produces the
+    same numbers as random.Random seeded with that integer.
+    """
+
+    def __init__(self, seed=None, spawn_key=()):
+        """ Initializes a generator from the integer <seed>, or from fresh operating system entropy
+        if <seed> is None. The seed actually used is kept in self.entropy, so that the generator
+        (and all its children) can be recreated later.
+        <spawn_key> identifies a child generator among all those spawned from the same seed, and
+        should normally be left empty (spawn() sets it).
+        """
+        if seed is None:
+            seed = int.from_bytes(os.urandom(16), "little")
+        self.entropy = seed
+        self.spawn_key = tuple(spawn_key)
+        # Number of children spawned so far, so that every spawned child gets a new spawn key
+        self.num_spawned = 0
+        if self.spawn_key:
+            # Hashing makes the seeds of different children unrelated to each other, so their
+            #  streams are independent.
+            digest = hashlib.sha256(repr((self.entropy, self.spawn_key)).encode()).digest()
+            random.Random.__init__(self, int.from_bytes(digest, "little"))
+        else:
+            random.Random.__init__(self, self.entropy)
+
+    def spawn(self, num_children):
+        """ Returns a list of <num_children> new DiceRNGs, each with its own independent stream of
+        random numbers, determined only by this generator's entropy and how many children it has
+        spawned before (and not by how many random numbers it has generated).
+        """
+        children = [DiceRNG(self.entropy, self.spawn_key + (self.num_spawned + child,))
+                    for child in range(num_children)]
+        self.num_spawned += num_children
+        return children
+
+    def uniforms(self, num_uniforms):
+        """ Returns an array of <num_uniforms> random numbers in [0, 1), exactly the ones which
+        that many calls to self.random() would have returned.
+        """
+        rand = self.random
+        return array.array("d", [rand() for _ in range(num_uniforms)])
+
+    def uniform_buffers(self, num_uniforms):
+        """ Yields arrays of at most UNIFORM_BUFFER_SIZE random numbers in [0, 1), each drawn only
+        once the previous one has been used up, which together hold exactly the <num_uniforms>
+        random numbers that uniforms() would have returned.
+        """
+        for start in range(0, num_uniforms, UNIFORM_BUFFER_SIZE):
+            yield self.uniforms(min(UNIFORM_BUFFER_SIZE, num_uniforms - start))
+
+    def __reduce__(self):
+        """ Lets DiceRNGs be pickled (to be sent to another process, for example) along with their
+        entropy, spawn key and exact position in their stream.
+        """
+        return (self.__class__, (self.entropy, self.spawn_key),
+                (self.getstate(), self.num_spawned))
+
+    def __setstate__(self, state):
+        """ Restores the state returned by __reduce__().
+        """
+        generator_state, self.num_spawned = state
+        self.setstate(generator_state)
+
+
+def _sum(values):
+    """ Returns the sum of <values>, adding them one at a time from left to right exactly like the
+    loops in normalize() do (unlike the builtin sum(), which may compensate for rounding errors in
+    some versions of Python).
+    <values> must be an iterable of numbers.
+    """
+    return functools.reduce(operator.add, values, 0)
 
 
 def normalize(distribution):
@@ -57,6 +334,86 @@ def set_negative_values_to_0(distribution):
             distribution[key] = 0
 
 
+def adjust_additive(frequencies, normal, total, aggressiveness):
+    """ Returns a list of the weights of the possible rolls adjusted additively (see
+    GamblersFallacyDice.update_probabilities()), which are proportional to their probabilities.
+    <frequencies> and <normal> are sequences of the number of times each possible roll has been
+    rolled and of its normal probability, in the same order, and <total> is the sum of
+    <frequencies>.
+    """
+    if total == 0:
+        return list(normal)
+    weights = [normal_probability - aggressiveness * (frequency / total - normal_probability)
+               for frequency, normal_probability in zip(frequencies, normal)]
+    return [weight if weight > 0 else 0 for weight in weights]
+
+
+def adjust_multiplicative(frequencies, normal, total, aggressiveness):
+    """ Returns a list of the weights of the possible rolls adjusted multiplicatively (see
+    GamblersFallacyDice._update_probabilities_multiplicative(), which computes exactly the same
+    weights), taking the arguments described in adjust_additive(). The pseudo-count of each roll is
+    its normal probability divided by the smallest normal probability, which for the sum of dice is
+    the probability of the single permutation giving the smallest roll.
+    """
+    if total == 0:
+        return list(normal)
+    least = min(normal)
+    weights = []
+    for frequency, normal_probability in zip(frequencies, normal):
+        offset = normal_probability / least
+        weights.append(normal_probability * (offset / (frequency + offset)) ** aggressiveness)
+    return weights
+
+
+def adjust_r_ratio(frequencies, normal, total, aggressiveness):
+    """ Returns a list of the weights of the possible rolls adjusted like in old_run_catan(), taking
+    the arguments described in adjust_additive(). R is the largest ratio of a roll's frequency to
+    its normal probability, each roll's weight is how many more times it would have to be rolled
+    for its ratio to reach R, and the result is 70% those weights (normalized) and 30% the normal
+    probabilities. The original had no aggressiveness, so any positive aggressiveness gives the
+    same result, and an aggressiveness of 0 gives normal dice.
+    """
+    if total == 0 or aggressiveness == 0:
+        return list(normal)
+    ratio = max(map(operator.truediv, frequencies, normal))
+    deficits = [normal_probability * ratio - frequency
+                for frequency, normal_probability in zip(frequencies, normal)]
+    sum_of_deficits = sum(deficits)
+    if sum_of_deficits == 0:
+        return list(normal)
+    return [deficit / sum_of_deficits * 0.7 + normal_probability * 0.3
+            for deficit, normal_probability in zip(deficits, normal)]
+
+
+# Maps the name of each way GamblersFallacyDice can adjust its probabilities (see <adjusting> in
+#  GamblersFallacyDice.__init__()) to its strategy: a function taking the arguments described in
+#  adjust_additive(), and returning a list of non-negative weights (not all 0) of the possible
+#  rolls in the same order, proportional to their adjusted probabilities. More are added with
+#  register_adjusting(). Dice adjusting with adjust_additive() or adjust_multiplicative() compute
+#  the same probabilities in place, without the intermediate lists (see
+#  GamblersFallacyDice.update_probabilities()), but only while they're the registered strategy.
+ADJUSTINGS = {"additive": adjust_additive, "multiplicative": adjust_multiplicative,
+              "r_ratio": adjust_r_ratio}
+# Number of times register_adjusting() has changed ADJUSTINGS, which is part of the keys dice cache
+#  their probabilities by, so that dice created before a strategy was replaced stop using the
+#  probabilities computed with the old one
+_adjustings_version = 0
+
+
+def register_adjusting(name, strategy, replace=False):
+    """ Adds the function <strategy> (see ADJUSTINGS) as a way of adjusting probabilities which
+    dice can be created with, by passing <name> as their <adjusting>. Raises a ValueError if <name>
+    is already taken, unless <replace> is True, in which case it replaces the strategy registered
+    as <name> for every dice adjusting that way (except incremental and exact dice, which always
+    adjust like adjust_additive()).
+    """
+    global _adjustings_version
+    if name in ADJUSTINGS and not replace:
+        raise ValueError(f"There's already an adjusting called {name!r}")
+    ADJUSTINGS[name] = strategy
+    _adjustings_version += 1
+
+
 class GamblersFallacyDice:
     """ Represents dice which actually do exhibit the "gambler's fallacy". So, if an 8 hasn't been
     rolled in a long time, then an 8 actually is overdue and therefore will have a higher chance of
@@ -69,7 +426,9 @@ class GamblersFallacyDice:
     arbitrary number of faces, and a roll will be the sum of the rolls of all the dice.
     """
 
-    def __init__(self, num_dice, num_sides, aggressiveness):
+    def __init__(self, num_dice, num_sides, aggressiveness, incremental=False,
+                 verify_incremental=False, sampler="linear", max_history=None, rng=None,
+                 exact=False, adjusting=None):
         """ Initializes an instance representing <num_dice> dice each with <num_sides> sides, which
         adjusts the probabilities to favor underrepresented rolls (and disfavor overrepresented
         rolls) with the passed in level of aggressiveness.
@@ -78,25 +437,158 @@ class GamblersFallacyDice:
         dice which don't adjust probability according to the rolls that have occurred so far. The
         higher the aggressiveness, the more probabilities will be adjusted from their normal values,
         and the faster the normal long term average distribution of rolls will be trended towards.
+        If <incremental> is True, rolls, undos and redos only update a running total of the
+        frequencies instead of recomputing every probability, and rolls are sampled straight from
+        the frequencies (see roll_without_updating_frequencies()). Incremental dice always adjust
+        probabilities additively, and only compute self.probabilities when it's read.
+        If <verify_incremental> is True (which only makes sense along with <incremental>), the
+        running total and the probabilities implied by it are checked against a full recomputation
+        after every roll, undo and redo, raising a RuntimeError if they disagree.
+        <sampler> must be one of SAMPLERS, and decides how a roll is picked according to the
+        probabilities:
+        "linear" walks through the probabilities accumulating them until passing a random number.
+        "bisect" binary searches a table of cumulative probabilities.
+        "alias" uses Vose's alias method (see alias_table()), which takes constant time.
+        The bisect and alias tables are only rebuilt when the probabilities actually change, and
+        when the aggressiveness is 0 the shared tables of the normal distribution are used. In
+        incremental mode, the sampler is used for proposing rolls from the normal distribution
+        ("linear" proposes using "bisect").
+        <max_history> is the maximum number of rolls which can be undone in a row, or None for no
+        limit. Once that many rolls are remembered, each new roll forgets the oldest one.
+        <rng> is the random number generator used for rolling, which must be a random.Random (such
+        as a DiceRNG, which is what's used if it's None, seeded with fresh entropy).
+        If <exact> is True, probabilities are adjusted additively using only integer arithmetic,
+        with no rounding errors at all (see _current_exact_weights()). Rolls are sampled with
+        self.rng.randrange() on the total integer weight, whatever the <sampler>, and
+        self.probabilities are exact fractions.Fractions. Can't be combined with <incremental>.
+        <adjusting> must be the name of one of ADJUSTINGS, or None for adjusting however
+        USE_MULTIPLICATIVE_ADJUSTING says to whenever the probabilities are updated:
+        "additive" always adjusts additively, whatever USE_MULTIPLICATIVE_ADJUSTING is.
+        "multiplicative" always adjusts multiplicatively, with a dedicated engine which never
+        touches self.frequencies (see _update_probabilities_multiplicative()).
+        "r_ratio" adjusts like the original version of this program (see adjust_r_ratio()).
+        Any other name adjusts with the strategy registered as it by register_adjusting(). So
+        dice adjusting in each way can be used side by side.
         """
+        if adjusting is not None and adjusting not in ADJUSTINGS:
+            raise ValueError(f"Unknown adjusting {adjusting!r}, must be one of "
+                             f"{tuple(ADJUSTINGS)}")
+        self.adjusting = adjusting
+        if (incremental or exact) and self._adjusting() != "additive":
+            raise ValueError("Incremental and exact dice can only adjust probabilities additively")
+        if incremental and exact:
+            raise ValueError("Dice can't be both incremental and exact")
+        if sampler not in SAMPLERS:
+            raise ValueError(f"Unknown sampler {sampler!r}, must be one of {SAMPLERS}")
         self.aggressiveness = aggressiveness
-        # Maps each possible roll to the probability of getting that roll on real, normal dice
-        self.normal_probabilities = {roll: dice_sum_probability(
-            roll, num_dice, num_sides) for roll in range(num_dice, num_dice * num_sides + 1)}
-        # Initial probabilities will be those of normal dice
-        self.probabilities = self.normal_probabilities.copy()
-        # Maps each possible roll to the number of times it has been rolled so far on these dice
-        self.frequencies = {roll: 0 for roll in range(num_dice, num_dice * num_sides + 1)}
-        self.all_zeros_frequencies = self.frequencies.copy()
-        # Previous self.frequencies maps to return to with undo/redo
-        self.undo_states = []
-        self.redo_states = []
-        if USE_MULTIPLICATIVE_ADJUSTING:
-            # Needed for solving the problem of when a roll's frequency is 0
-            self.num_individual_dice_roll_permutations = num_sides ** num_dice
+        self.incremental = incremental
+        self.verify_incremental = verify_incremental
+        self.sampler = sampler
+        self.exact = exact
+        self.rng = rng if rng is not None else DiceRNG()
+        self._normal_distribution = normal_distribution(num_dice, num_sides)
+        # Read only map from each possible roll to the probability of getting that roll on real,
+        #  normal dice. Shared with every other instance with the same number of dice and sides.
+        self.normal_probabilities = self._normal_distribution.probabilities
+        # The normal probabilities of every possible roll in order, for passing to strategies
+        self._normal_values = self._normal_distribution.values
+        self._min_roll = num_dice
+        # 2 six sided dice are by far the most common dice, so they adjust probabilities additively
+        #  and sample linearly with their own unrolled routines, which give exactly the same results
+        #  as the general ones (see _update_probabilities_2d6())
+        self._two_six_sided = num_dice == 2 and num_sides == 6
+        # The exact number of ways of getting each possible roll, out of
+        #  self._num_individual_dice_roll_permutations, for exact dice. The number of permutations
+        #  is also needed for solving the problem of when a roll's frequency is 0 when adjusting
+        #  multiplicatively, which can be switched on after the dice are created. Both are shared
+        #  with every other instance with the same number of dice and sides.
+        self._normal_counts = self._normal_distribution.counts
+        self._num_individual_dice_roll_permutations = self._normal_distribution.num_permutations
+        # The cumulative integer weights of exact dice, and the _state_key() they were computed for
+        self._exact_weights = None
+        self._exact_weights_key = None
+        # The aggressiveness of exact dice as a tuple (aggressiveness, numerator, denominator) of
+        #  the exact fraction it's equal to, so that it's only converted when it changes
+        self._exact_aggressiveness = None
+        # The pseudo-count added to the frequency of each possible roll by multiplicative adjusting
+        #  (see _update_probabilities_multiplicative()), computed like adjust_multiplicative() does
+        self._multiplicative_offsets = self._normal_distribution.multiplicative_offsets
+        # Type code of the arrays returned by roll_many(), big enough to hold the largest roll
+        self._roll_typecode = "H" if num_dice * num_sides <= 0xFFFF else "L"
+        # Incremented whenever self.frequencies changes, so that anything computed from
+        #  self.frequencies can tell whether it's out of date
+        self._state_version = 0
+        # The bisect or alias table for self.probabilities, and the _state_key() it was built for
+        self._sampling_table = None
+        self._sampling_table_key = None
+        # The current (adjusted) probabilities, read through self.probabilities, and the
+        #  _state_key() they were computed for. Initial probabilities will be those of normal dice
+        #  (computed as exact fractions when they're first read, for exact dice).
+        self._probabilities = self.normal_probabilities.copy()
+        self._probabilities_key = None if exact else \
+            (0, aggressiveness, adjusting, USE_MULTIPLICATIVE_ADJUSTING, _adjustings_version)
+        # Number of times the probabilities have actually been recomputed by
+        #  update_probabilities(), rather than found to be already up to date
+        self.num_probability_updates = 0
+        # Maps the frequencies of states seen by preview() and expected_distribution_after() to a
+        #  tuple of the probabilities of each possible roll in that state, and maps (state, number
+        #  of rolls) to a tuple of the expected probabilities of each possible roll after that
+        #  many more rolls from that state. Both were computed for the _preview_cache_key()
+        #  self._preview_caches_key.
+        self._preview_distributions = {}
+        self._preview_expectations = {}
+        self._preview_caches_key = None
+        # Maps each possible roll to the number of times it has been rolled so far on these dice.
+        #  Only changed through _set_frequency(), _add_roll() and _remove_roll(), which keep
+        #  everything computed from it up to date, so self.frequencies is a read only view of it.
+        self._frequencies = {roll: 0 for roll in range(num_dice, num_dice * num_sides + 1)}
+        self.frequencies = types.MappingProxyType(self._frequencies)
+        self.all_zeros_frequencies = self._frequencies.copy()
+        # Always equal to the sum of the values of self.frequencies, so must be kept up to date
+        #  whenever self.frequencies changes (see _set_frequency())
+        self.sum_of_frequencies = 0
+        # Since probabilities depend only on current frequencies, the state of the dice can be
+        #  represented solely by self.frequencies, and each roll only changes one frequency by 1.
+        #  So the history only needs to be the rolls themselves: undo_states holds the rolls
+        #  which can be undone (most recent last), and redo_states holds the rolls which were
+        #  undone and can be redone (most recently undone last).
+        self.undo_states = array.array(self._roll_typecode)
+        self.redo_states = array.array(self._roll_typecode)
+        self.max_history = max_history
+        # Callables which are each called as listener(dice, action, roll) after every roll, undo
+        #  and redo, where <action> is "roll", "undo" or "redo" and <roll> is the roll which was
+        #  rolled, undone or redone. During roll_many() without recording history, they're called
+        #  after each roll and then with action "forget_history" and roll None.
+        self.listeners = []
+
+    @property
+    def probabilities(self):
+        """ Dictionary mapping each possible roll to its current (adjusted) probability. Computed
+        by update_probabilities() the first time it's read after the state of the dice changed, so
+        reading it repeatedly (such as printing the dice and then rolling them) is free.
+        """
+        self.update_probabilities()
+        return self._probabilities
+
+    def _adjusting(self):
+        """ Returns the name of the way the probabilities are currently adjusted (see <adjusting>
+        in __init__()).
+        """
+        if self.adjusting is not None:
+            return self.adjusting
+        return "multiplicative" if USE_MULTIPLICATIVE_ADJUSTING else "additive"
+
+    def _state_key(self):
+        """ Returns a tuple which changes whenever anything the probabilities are computed from
+        changes: the frequencies, the aggressiveness, the kind of adjusting, and the strategies
+        registered for each kind.
+        """
+        return (self._state_version, self.aggressiveness, self.adjusting,
+                USE_MULTIPLICATIVE_ADJUSTING, _adjustings_version)
 
     def update_probabilities(self):
-        """ Updates self.probabilities according to self.frequencies. Underrepresented rolls will
+        """ Updates self.probabilities according to self.frequencies, unless they're already up to
+        date with the _state_key() of the dice. Underrepresented rolls will
         tend to have higher probability than on normal dice, and overrepresented rolls will tend to
         have lower probability than on normal dice. The sorted order of the adjustments of
         probabilities will be guaranteed to be the same as the sorted order of underrepresentedness,
@@ -104,79 +596,550 @@ class GamblersFallacyDice:
         (either multiplicative or additive, depending on the value of use_multiplicative_adjusting)
         will be greater than that of roll B.
         """
-        if USE_MULTIPLICATIVE_ADJUSTING:
+        key = self._state_key()
+        if key == self._probabilities_key:
+            return
+        self.num_probability_updates += 1
+        # The built in strategies are computed in place rather than by calling them, unless
+        #  something else has been registered in their place
+        strategy = ADJUSTINGS[self._adjusting()]
+        if self.exact:
+            cumulative_weights = self._current_exact_weights()
+            total_weight = cumulative_weights[-1]
+            self._probabilities = {}
+            previous_cumulative_weight = 0
+            for roll, cumulative_weight in zip(self.frequencies, cumulative_weights):
+                self._probabilities[roll] = fractions.Fraction(
+                    cumulative_weight - previous_cumulative_weight, total_weight)
+                previous_cumulative_weight = cumulative_weight
+        elif strategy is adjust_multiplicative and self.adjusting is not None:
+            self._update_probabilities_multiplicative()
+        elif strategy is adjust_additive and self._two_six_sided:
+            self._update_probabilities_2d6()
+        elif strategy is adjust_multiplicative:
             # This is an experimental way of adhusting probability such that probability is
             #  guaranteed (I think) to increase monotonically with increasing underrepresentedness.
             #  IMO this isn't as good as the other, additive way of adjusting. It's called
             #  multiplicative because the normal probabilities are multiplied by a value determined
             #  by underrepresentedness.
             if self.frequencies == self.all_zeros_frequencies:
-                self.probabilities = self.normal_probabilities.copy()
+                self._probabilities = self.normal_probabilities.copy()
             else:
                 for roll in self.frequencies:
                     # This solves the problem of when a roll's frequency is 0 (so the ratio of the
                     #  roll's frequency to its expected frequency is 0, which can't be used to
                     #  adjust probability since it'd be a divide by 0 error).
-                    self.frequencies[roll] += self.normal_probabilities[roll] * \
-                        self.num_individual_dice_roll_permutations
+                    self._frequencies[roll] += self.normal_probabilities[roll] * \
+                        self._num_individual_dice_roll_permutations
                 for roll, fraction_of_rolls in normalized(self.frequencies).items():
                     deviation_from_expected = fraction_of_rolls / self.normal_probabilities[roll]
                     # TODO: See if using self.aggressiveness (or its inverse, depending on if
                     #  deviation_from_expected is > or < 1) in a multiplicative way makes this
                     #  method work better.
-                    self.probabilities[roll] = self.normal_probabilities[roll] / \
+                    self._probabilities[roll] = self.normal_probabilities[roll] / \
                         (deviation_from_expected ** self.aggressiveness)
                 for roll in self.frequencies:
                     # Undos the solution to the roll's frequency being 0 problem above, returning
                     #  self.frequencies back to its original value.
-                    self.frequencies[roll] = round(
-                        self.frequencies[roll] - self.normal_probabilities[roll]*self.num_individual_dice_roll_permutations)
-                normalize(self.probabilities)
-        else:
+                    self._frequencies[roll] = round(
+                        self.frequencies[roll] - self.normal_probabilities[roll]*self._num_individual_dice_roll_permutations)
+                normalize(self._probabilities)
+        elif strategy is adjust_additive:
             # My preferred way of adjusting probability. Probability isn't guaranteed to increase
             #  monotonically with increasing underrepresentedness using this method, but that's
             #  still pretty close to being the case and I don't think it's a big deal at all that
             #  it's not perfectly the case. It's called additive because a value determined by
             #  underrepresentedness is added to the normal probabilities.
-            if self.frequencies == self.all_zeros_frequencies:
-                self.probabilities = self.normal_probabilities.copy()
+            #  The frequencies and normal probabilities are worked through as sequences in the
+            #  order of the possible rolls, each step being a single comprehension rather than a
+            #  loop over dictionaries, with exactly the same floating point operations in the same
+            #  order as adjusting through dictionaries.
+            total = self.sum_of_frequencies
+            if total == 0:
+                self._probabilities = self.normal_probabilities.copy()
             else:
-                for roll, fraction_of_rolls in normalized(self.frequencies).items():
-                    deviation_from_expected = fraction_of_rolls - self.normal_probabilities[roll]
-                    self.probabilities[roll] = self.normal_probabilities[roll] - \
-                        self.aggressiveness * deviation_from_expected
+                aggressiveness = self.aggressiveness
+                adjusted = [normal_probability - aggressiveness * (frequency / total -
+                                                                   normal_probability)
+                            for frequency, normal_probability in zip(self.frequencies.values(),
+                                                                     self._normal_values)]
                 # I think that this (setting negative values to 0 and then normalizing) is why
                 #  probability doesn't always increase monotonically with increasing
                 #  underrepresentedness.
-                set_negative_values_to_0(self.probabilities)
-                normalize(self.probabilities)
+                adjusted = [0 if probability < 0 else probability for probability in adjusted]
+                total_probability = _sum(adjusted)
+                self._probabilities = dict(zip(self.frequencies,
+                                               [probability / total_probability
+                                                for probability in adjusted]))
+        else:
+            self._update_probabilities_with_strategy()
+        self._probabilities_key = key
+
+    def _update_probabilities_with_strategy(self):
+        """ Sets self._probabilities to the normalized weights returned by the strategy registered
+        in ADJUSTINGS as the way the dice currently adjust.
+        """
+        weights = ADJUSTINGS[self._adjusting()](tuple(self.frequencies.values()),
+                                                self._normal_values, self.sum_of_frequencies,
+                                                self.aggressiveness)
+        total = _sum(weights)
+        self._probabilities = {roll: weight / total
+                               for roll, weight in zip(self.frequencies, weights)}
+
+    def _update_probabilities_multiplicative(self):
+        """ Updates self._probabilities multiplicatively, like update_probabilities() does when
+        USE_MULTIPLICATIVE_ADJUSTING is True, but without ever modifying self.frequencies. Adding
+        each roll's pseudo-count c (its normal probability multiplied by the number of individual
+        dice roll permutations) to its frequency f, its deviation from expected is
+        ((f + c) / (total + permutations)) / normal, and its adjusted probability is
+        normal / deviation**aggressiveness. Since the factor (total + permutations) / permutations
+        is the same for every roll, it cancels out when normalizing, leaving
+        normal * (c / (f + c))**aggressiveness. So with the pseudo-counts precomputed, each
+        probability takes a single pass with one division and one power, written straight into
+        self._probabilities. Gives exactly the same probabilities as normalizing the weights
+        returned by adjust_multiplicative(), and agrees with the other multiplicative adjustment up
+        to floating point rounding (which that one's rounding of the frequencies back makes
+        slightly lossy).
+        """
+        if self.sum_of_frequencies == 0:
+            self._probabilities = self.normal_probabilities.copy()
+            return
+        probabilities = self._probabilities
+        aggressiveness = self.aggressiveness
+        total = 0.0
+        for (roll, frequency), offset, normal_probability in zip(
+                self.frequencies.items(), self._multiplicative_offsets,
+                self.normal_probabilities.values()):
+            probability = normal_probability * (offset / (frequency + offset)) ** aggressiveness
+            probabilities[roll] = probability
+            total += probability
+        for roll in probabilities:
+            probabilities[roll] /= total
+
+    def _update_probabilities_2d6(self):
+        """ Updates self._probabilities of 2 six sided dice additively, performing exactly the same
+        floating point operations in the same order as the general additive adjustment in
+        update_probabilities() (so the results are identical), but unrolled over the 11 possible
+        rolls, with the normal probabilities as constants and without any intermediate
+        dictionaries.
+        """
+        total = self.sum_of_frequencies
+        if total == 0:
+            self._probabilities = self.normal_probabilities.copy()
+            return
+        frequencies = self.frequencies
+        aggressiveness = self.aggressiveness
+        p2 = 1/36 - aggressiveness * (frequencies[2] / total - 1/36)
+        p3 = 2/36 - aggressiveness * (frequencies[3] / total - 2/36)
+        p4 = 3/36 - aggressiveness * (frequencies[4] / total - 3/36)
+        p5 = 4/36 - aggressiveness * (frequencies[5] / total - 4/36)
+        p6 = 5/36 - aggressiveness * (frequencies[6] / total - 5/36)
+        p7 = 6/36 - aggressiveness * (frequencies[7] / total - 6/36)
+        p8 = 5/36 - aggressiveness * (frequencies[8] / total - 5/36)
+        p9 = 4/36 - aggressiveness * (frequencies[9] / total - 4/36)
+        p10 = 3/36 - aggressiveness * (frequencies[10] / total - 3/36)
+        p11 = 2/36 - aggressiveness * (frequencies[11] / total - 2/36)
+        p12 = 1/36 - aggressiveness * (frequencies[12] / total - 1/36)
+        if p2 < 0:
+            p2 = 0
+        if p3 < 0:
+            p3 = 0
+        if p4 < 0:
+            p4 = 0
+        if p5 < 0:
+            p5 = 0
+        if p6 < 0:
+            p6 = 0
+        if p7 < 0:
+            p7 = 0
+        if p8 < 0:
+            p8 = 0
+        if p9 < 0:
+            p9 = 0
+        if p10 < 0:
+            p10 = 0
+        if p11 < 0:
+            p11 = 0
+        if p12 < 0:
+            p12 = 0
+        sum = p2 + p3 + p4 + p5 + p6 + p7 + p8 + p9 + p10 + p11 + p12
+        self._probabilities = {2: p2 / sum, 3: p3 / sum, 4: p4 / sum, 5: p5 / sum, 6: p6 / sum,
+                               7: p7 / sum, 8: p8 / sum, 9: p9 / sum, 10: p10 / sum,
+                               11: p11 / sum, 12: p12 / sum}
+
+    def _sample_2d6(self, rand):
+        """ Returns the roll of 2 six sided dice which the linear walk in
+        roll_without_updating_frequencies() would pick with the random number <rand>, unrolled
+        over the 11 possible rolls.
+        """
+        probabilities = self._probabilities
+        cumulative = probabilities[2]
+        if rand < cumulative:
+            return 2
+        cumulative += probabilities[3]
+        if rand < cumulative:
+            return 3
+        cumulative += probabilities[4]
+        if rand < cumulative:
+            return 4
+        cumulative += probabilities[5]
+        if rand < cumulative:
+            return 5
+        cumulative += probabilities[6]
+        if rand < cumulative:
+            return 6
+        cumulative += probabilities[7]
+        if rand < cumulative:
+            return 7
+        cumulative += probabilities[8]
+        if rand < cumulative:
+            return 8
+        cumulative += probabilities[9]
+        if rand < cumulative:
+            return 9
+        cumulative += probabilities[10]
+        if rand < cumulative:
+            return 10
+        cumulative += probabilities[11]
+        if rand < cumulative:
+            return 11
+        # Also covers floating point errors causing the probabilities to sum to < 1
+        return 12
 
     def roll_without_updating_frequencies(self):
         """ Returns a roll of these dice but the dice won't remember that this roll occurred, so
         the probabilities won't get adjusted.
         """
+        if self.exact:
+            cumulative_weights = self._current_exact_weights()
+            return self._min_roll + bisect.bisect_right(
+                cumulative_weights, self.rng.randrange(cumulative_weights[-1]))
+        if self.incremental:
+            return self._roll_incrementally()
+        if self.sampler != "linear":
+            return self._min_roll + self._sample_index(self._current_sampling_table())
         self.update_probabilities()
-        rand = random.random()
+        rand = self.rng.random()
+        if self._two_six_sided:
+            return self._sample_2d6(rand)
         cumulative = 0
-        for roll, probability in self.probabilities.items():
+        for roll, probability in self._probabilities.items():
             cumulative += probability
             if rand < cumulative:
                 return roll
         # Only needed because floating point errors could cause probabilities to sum to < 1
         return roll
 
+    def _sample_index(self, table):
+        """ Returns the index of a roll (its offset from the smallest roll) sampled using <table>,
+        which must be an alias_table() if self.sampler is "alias" and a tuple of cumulative
+        probabilities otherwise.
+        """
+        if self.sampler == "alias":
+            return sample_alias_table(table, self.rng.random())
+        # Capped at the last index only because floating point errors could cause probabilities
+        #  to sum to < 1
+        return min(bisect.bisect_right(table, self.rng.random()), len(table) - 1)
+
+    def _normal_sampling_table(self):
+        """ Returns the shared table for sampling from the normal distribution with
+        _sample_index().
+        """
+        if self.sampler == "alias":
+            return self._normal_distribution.alias
+        return self._normal_distribution.cumulative
+
+    def _current_sampling_table(self):
+        """ Returns the table for sampling from the current probabilities with _sample_index(),
+        updating the probabilities and rebuilding the table only if the frequencies, the
+        aggressiveness or the kind of adjusting have changed since it was last built.
+        """
+        if self.aggressiveness == 0:
+            return self._normal_sampling_table()
+        key = self._state_key()
+        if key != self._sampling_table_key:
+            probabilities = list(self.probabilities.values())
+            if self.sampler == "alias":
+                self._sampling_table = alias_table(probabilities)
+            else:
+                self._sampling_table = tuple(itertools.accumulate(probabilities))
+            self._sampling_table_key = key
+        return self._sampling_table
+
+    def _current_exact_weights(self):
+        """ Returns a tuple of the cumulative integer weights of exact dice, whose i-th element is
+        the total weight of the i + 1 smallest rolls, recomputing them only if the state of the dice
+        has changed since they were last computed.
+        With the aggressiveness as the exact fraction p / q, a total of T rolls so far, and P
+        individual dice roll permutations, the additively adjusted probability of a roll which
+        occurs in c of those permutations and has been rolled f times is
+        c / P - (p / q) * (f / T - c / P) = ((q + p) * c * T - p * f * P) / (q * P * T).
+        The denominator is the same for every roll, so the numerators (clamped to 0) are weights
+        proportional to the adjusted probabilities. They always add up to at least q * P * T > 0.
+        """
+        key = self._state_key()
+        if key != self._exact_weights_key:
+            total = self.sum_of_frequencies
+            if total == 0 or self.aggressiveness == 0:
+                weights = self._normal_counts
+            else:
+                if self._exact_aggressiveness is None or \
+                        self._exact_aggressiveness[0] != self.aggressiveness:
+                    aggressiveness = fractions.Fraction(self.aggressiveness)
+                    self._exact_aggressiveness = (self.aggressiveness, aggressiveness.numerator,
+                                                  aggressiveness.denominator)
+                _, numerator, denominator = self._exact_aggressiveness
+                count_scale = (denominator + numerator) * total
+                frequency_scale = numerator * self._num_individual_dice_roll_permutations
+                weights = [count_scale * count - frequency_scale * frequency
+                           for count, frequency in zip(self._normal_counts,
+                                                       self.frequencies.values())]
+                weights = [weight if weight > 0 else 0 for weight in weights]
+            self._exact_weights = tuple(itertools.accumulate(weights))
+            self._exact_weights_key = key
+        return self._exact_weights
+
+    def _roll_incrementally(self):
+        """ Returns a roll sampled from the additively adjusted probabilities implied by
+        self.frequencies and self.sum_of_frequencies, without computing those probabilities. Uses
+        rejection sampling: a roll is proposed according to the normal probabilities and accepted
+        with probability equal to the ratio of its (unnormalized, clamped to 0) adjusted
+        probability to its normal probability, divided by 1 + self.aggressiveness, which is the
+        largest that ratio can be. This repeats until a roll is accepted, which on average takes at
+        most 1 + self.aggressiveness proposals no matter how many possible rolls there are.
+        """
+        table = self._normal_sampling_table()
+        if self.sum_of_frequencies == 0 or self.aggressiveness == 0:
+            return self._min_roll + self._sample_index(table)
+        scale = self._acceptance_scale()
+        normal_probabilities = self.normal_probabilities
+        frequencies = self.frequencies
+        rand = self.rng.random
+        while True:
+            roll = self._min_roll + self._sample_index(table)
+            normal_probability = normal_probabilities[roll]
+            if rand() * normal_probability < \
+                    normal_probability - scale * frequencies[roll]:
+                return roll
+
+    def _acceptance_scale(self):
+        """ Returns the scale with which _roll_incrementally() accepts a proposed roll with
+        probability 1 - scale * frequency / normal_probability (or never, if that's negative).
+        The adjusted probability of a roll is normal_probability - aggressiveness *
+        (frequency / sum_of_frequencies - normal_probability), and dividing it by
+        (1 + aggressiveness) * normal_probability gives that acceptance probability.
+        """
+        return self.aggressiveness / ((1 + self.aggressiveness) * self.sum_of_frequencies)
+
+    def _incremental_probabilities(self):
+        """ Returns a dictionary mapping each possible roll to the probability with which
+        _roll_incrementally() currently samples it, worked out from the probability of proposing
+        it and the probability of accepting it once proposed, which are the same thresholds the
+        rejection sampling compares against.
+        """
+        if self.sum_of_frequencies == 0 or self.aggressiveness == 0:
+            return self.normal_probabilities.copy()
+        scale = self._acceptance_scale()
+        probabilities = {}
+        for roll, normal_probability in self.normal_probabilities.items():
+            acceptance_probability = 1 - scale * self.frequencies[roll] / normal_probability
+            probabilities[roll] = normal_probability * acceptance_probability \
+                if acceptance_probability > 0 else 0
+        normalize(probabilities)
+        return probabilities
+
+    def _verify_incremental_state(self):
+        """ Raises a RuntimeError if self.sum_of_frequencies disagrees with a full recomputation
+        from self.frequencies, or if the probabilities _roll_incrementally() samples rolls with
+        disagree with self.probabilities.
+        """
+        if self.sum_of_frequencies != sum(self.frequencies.values()):
+            raise RuntimeError(
+                f"Running total of frequencies is {self.sum_of_frequencies}, but the frequencies "
+                f"sum to {sum(self.frequencies.values())}")
+        for roll, probability in self._incremental_probabilities().items():
+            if abs(probability - self.probabilities[roll]) > 1e-9:
+                raise RuntimeError(
+                    f"Incrementally maintained probability of {roll} is {probability}, but full "
+                    f"recomputation gives {self.probabilities[roll]}")
+
+    def _set_frequency(self, roll, frequency):
+        """ Sets the frequency of <roll> to <frequency>, keeping self.sum_of_frequencies up to
+        date.
+        """
+        if frequency != self.frequencies[roll]:
+            self.sum_of_frequencies += frequency - self.frequencies[roll]
+            self._frequencies[roll] = frequency
+            self._state_version += 1
+
     def roll(self):
         """ Returns a roll of these dice and remembers that this roll occurred (which will cause
         probabilities to be changed).
         """
-        # Since probabilities depend only on current frequencies, the state of the dice can be
-        #  represented solely by self.frequencies.
-        self.undo_states.append(self.frequencies.copy())
-        self.redo_states = []
         roll = self.roll_without_updating_frequencies()
-        self.frequencies[roll] += 1
+        self._record_roll(roll)
+        if self.listeners:
+            self._notify("roll", roll)
         return roll
 
+    def _record_roll(self, roll):
+        """ Does everything roll() does after picking <roll>, except notifying self.listeners.
+        """
+        self._add_roll(roll)
+        self._push_undo_state(roll)
+        del self.redo_states[:]
+
+    def _notify(self, action, roll):
+        """ Calls each of self.listeners with these dice, <action> and <roll>.
+        """
+        for listener in self.listeners:
+            listener(self, action, roll)
+
+    def _add_roll(self, roll):
+        """ Remembers that <roll> occurred, without touching the undo/redo history. Subclasses
+        which keep track of more state than just the frequencies should extend this (and
+        _remove_roll()), since it's also used for redoing rolls.
+        """
+        self._frequencies[roll] += 1
+        self.sum_of_frequencies += 1
+        self._state_version += 1
+        if self.verify_incremental:
+            self._verify_incremental_state()
+
+    def _remove_roll(self, roll):
+        """ Forgets one occurrence of <roll>, which must have been the most recent roll which hasn't
+        been undone, without touching the undo/redo history.
+        """
+        self._frequencies[roll] -= 1
+        self.sum_of_frequencies -= 1
+        self._state_version += 1
+        if self.verify_incremental:
+            self._verify_incremental_state()
+
+    def _push_undo_state(self, roll):
+        """ Remembers that <roll> can be undone, forgetting the oldest roll which could be undone if
+        that would be more than self.max_history.
+        """
+        self.undo_states.append(roll)
+        if self.max_history is not None and len(self.undo_states) > self.max_history:
+            del self.undo_states[:len(self.undo_states) - self.max_history]
+
+    def roll_many(self, num_rolls, record_history=True):
+        """ Rolls these dice <num_rolls> times in a row, exactly as if roll() were called that many
+        times, and returns an array of the rolls in the order they occurred. If <record_history>
+        is False, the rolls can't be undone, which saves saving a previous state for each roll.
+        Since the states from before the rolls no longer make sense to return to, the undo/redo
+        history is cleared in that case.
+        Dice which adjust additively and sample linearly (the defaults) draw the random numbers for
+        the rolls in bulk and never build their probabilities (see _batched_rolls()).
+        <num_rolls> must be a non-negative integer.
+        """
+        rolls = array.array(self._roll_typecode)
+        if num_rolls <= 0:
+            if not record_history:
+                del self.undo_states[:]
+                del self.redo_states[:]
+                if self.listeners:
+                    self._notify("forget_history", None)
+            return rolls
+        if record_history:
+            del self.redo_states[:]
+        else:
+            del self.undo_states[:]
+            del self.redo_states[:]
+        if self._can_batch_rolls():
+            sampled_rolls = self._batched_rolls(num_rolls)
+        else:
+            roll_without_updating_frequencies = self.roll_without_updating_frequencies
+            sampled_rolls = (roll_without_updating_frequencies() for _ in range(num_rolls))
+        add_roll = self._add_roll
+        append = rolls.append
+        if not self.listeners:
+            if record_history:
+                push_undo_state = self._push_undo_state
+                for roll in sampled_rolls:
+                    add_roll(roll)
+                    push_undo_state(roll)
+                    append(roll)
+            else:
+                for roll in sampled_rolls:
+                    add_roll(roll)
+                    append(roll)
+            return rolls
+        # Listeners are notified about each roll as soon as it happens (so they see the dice in
+        #  the state right after it, such as whose turn it is now), and, if the rolls aren't
+        #  recorded, then about the history being forgotten, which leads to the same state as these
+        #  unrecorded rolls did.
+        notify = self._notify
+        for roll in sampled_rolls:
+            add_roll(roll)
+            if record_history:
+                self._push_undo_state(roll)
+            append(roll)
+            notify("roll", roll)
+        if not record_history:
+            notify("forget_history", None)
+        return rolls
+
+    def _can_batch_rolls(self):
+        """ Returns True if _batched_rolls() samples rolls exactly like
+        roll_without_updating_frequencies() currently does, i.e. if these dice adjust with the
+        built in additive strategy, aren't exact or incremental, sample linearly, and don't
+        override how probabilities are computed or rolls are sampled.
+        """
+        return (not self.exact and not self.incremental and self.sampler == "linear"
+                and ADJUSTINGS[self._adjusting()] is adjust_additive
+                and type(self).update_probabilities is GamblersFallacyDice.update_probabilities
+                and type(self).roll_without_updating_frequencies is
+                GamblersFallacyDice.roll_without_updating_frequencies)
+
+    def _batched_rolls(self, num_rolls):
+        """ Yields <num_rolls> rolls, each one sampled from the state the dice are in when it's
+        asked for (so the caller must record each roll before asking for the next one), exactly
+        like roll_without_updating_frequencies() would sample it. The random numbers for the rolls
+        are drawn in bulk from self.rng.uniform_buffers(), and the additively adjusted weights are
+        computed with the same floating point operations in the same order as
+        update_probabilities(), but each is only divided by their total once the linear walk
+        reaches it, and no probabilities dictionary is built. 2 six sided dice use their unrolled adjustment and sampling instead, without
+        checking whether the probabilities are up to date first.
+        roll() doesn't buffer random numbers like this: dice may share their rng with other dice
+        (or anything else), and drawing ahead would change which numbers each of them gets.
+        """
+        uniforms = itertools.chain.from_iterable(self.rng.uniform_buffers(num_rolls))
+        if self._two_six_sided:
+            update_probabilities = self._update_probabilities_2d6
+            sample = self._sample_2d6
+            for rand in uniforms:
+                update_probabilities()
+                yield sample(rand)
+            return
+        normal_values = self._normal_values
+        frequencies = self._frequencies.values()
+        min_roll = self._min_roll
+        max_roll = min_roll + len(normal_values) - 1
+        for rand in uniforms:
+            total = self.sum_of_frequencies
+            if total == 0:
+                # The normal probabilities are used as they are, and dividing by 1 changes nothing
+                weights = normal_values
+                total_weight = 1
+            else:
+                aggressiveness = self.aggressiveness
+                weights = [normal_probability - aggressiveness * (frequency / total -
+                                                                  normal_probability)
+                           for frequency, normal_probability in zip(frequencies, normal_values)]
+                weights = [0 if weight < 0 else weight for weight in weights]
+                total_weight = _sum(weights)
+            cumulative = 0
+            # Only needed because floating point errors could cause probabilities to sum to < 1
+            roll = max_roll
+            for index, weight in enumerate(weights):
+                cumulative += weight / total_weight
+                if rand < cumulative:
+                    roll = min_roll + index
+                    break
+            yield roll
+
     def can_undo(self):
         """ Returns True if there is a previous state for these dice to return to with an undo,
         False otherwise.
@@ -189,8 +1152,11 @@ class GamblersFallacyDice:
         """ Undoes the effects of the previous roll.
         """
         if self.can_undo():
-            self.redo_states.append(self.frequencies.copy())
-            self.frequencies = self.undo_states.pop()
+            roll = self.undo_states.pop()
+            self.redo_states.append(roll)
+            self._remove_roll(roll)
+            if self.listeners:
+                self._notify("undo", roll)
         else:
             raise ValueError("Can't undo, no previous state to return to")
 
@@ -207,17 +1173,156 @@ class GamblersFallacyDice:
         times in a row to redo multiple consecutive undos.
         """
         if self.can_redo():
-            self.undo_states.append(self.frequencies.copy())
-            self.frequencies = self.redo_states.pop()
+            roll = self.redo_states.pop()
+            self._push_undo_state(roll)
+            self._add_roll(roll)
+            if self.listeners:
+                self._notify("redo", roll)
         else:
             raise ValueError("Can't redo, no immediately recent undos to redo")
 
+    def preview(self, rolls):
+        """ Returns a dictionary mapping each possible roll to the probability it would have if the
+        rolls in the iterable <rolls> were rolled next, in order. Doesn't change the dice in any
+        way (including their undo/redo history), and states which have already been previewed are
+        looked up rather than recomputed. The probabilities are the same as the dice would have in
+        that state, up to floating point rounding.
+        Raises a ValueError if any of <rolls> isn't a possible roll.
+        """
+        self._validate_preview_caches()
+        state = self._preview_state()
+        for roll in rolls:
+            if roll not in self.frequencies:
+                raise ValueError(f"{roll} isn't a possible roll of these dice")
+            state = self._preview_next_state(state, roll - self._min_roll)
+        return dict(zip(self.frequencies, self._preview_distribution(state)))
+
+    def expected_distribution_after(self, num_rolls):
+        """ Returns a dictionary mapping each possible roll to the probability of it being rolled
+        <num_rolls> rolls from now (so 0 gives the current probabilities), which is the expected
+        value of the probabilities after <num_rolls> random rolls. Doesn't change the dice in any
+        way. Computed exactly, by dynamic programming over the states the dice can reach, which is
+        memoized so that states which were reached before (by this call or earlier ones, or
+        preview()) are never worked out again. The number of states grows quickly with
+        <num_rolls>, so it's only practical for a few rolls ahead on dice with many possible rolls.
+        <num_rolls> must be a non-negative integer.
+        """
+        if not isinstance(num_rolls, int) or isinstance(num_rolls, bool):
+            raise ValueError(f"The number of rolls to look ahead must be an integer, not "
+                             f"{num_rolls!r}")
+        if num_rolls < 0:
+            raise ValueError("Can't look ahead a negative number of rolls")
+        self._validate_preview_caches()
+        return dict(zip(self.frequencies,
+                        self._expected_distribution(self._preview_state(), num_rolls)))
+
+    def _preview_cache_key(self):
+        """ Returns a tuple of everything other than the frequencies which the probabilities cached
+        for preview() and expected_distribution_after() are computed from.
+        """
+        return self.aggressiveness, self._adjusting(), self.exact, _adjustings_version
+
+    def _validate_preview_caches(self):
+        """ Empties the caches of preview() and expected_distribution_after() if they were computed
+        for a different _preview_cache_key(), or have grown past PREVIEW_CACHE_SIZE.
+        """
+        key = self._preview_cache_key()
+        if key != self._preview_caches_key:
+            self._preview_distributions = {}
+            self._preview_expectations = {}
+            self._preview_caches_key = key
+        if len(self._preview_distributions) > PREVIEW_CACHE_SIZE:
+            self._preview_distributions = {}
+        if len(self._preview_expectations) > PREVIEW_CACHE_SIZE:
+            self._preview_expectations = {}
+
+    def _preview_state(self):
+        """ Returns a hashable representation of the current state of the dice, from which
+        _preview_next_state() works out the states after further rolls.
+        """
+        return tuple(self.frequencies.values())
+
+    def _preview_next_state(self, state, index):
+        """ Returns the state after the roll at index <index> of the possible rolls is rolled in
+        <state>.
+        """
+        return state[:index] + (state[index] + 1,) + state[index + 1:]
+
+    def _preview_frequencies(self, state):
+        """ Returns a tuple of the frequencies the probabilities in <state> are computed from.
+        """
+        return state
+
+    def _preview_distribution(self, state):
+        """ Returns a tuple of the probabilities of each possible roll in <state>, computed with the
+        strategy in ADJUSTINGS that the dice adjust with (using exact fractions for exact dice) and
+        cached by the frequencies they're computed from.
+        """
+        frequencies = self._preview_frequencies(state)
+        distribution = self._preview_distributions.get(frequencies)
+        if distribution is None:
+            total = sum(frequencies)
+            if self.exact:
+                normal = [fractions.Fraction(count, self._num_individual_dice_roll_permutations)
+                          for count in self._normal_counts]
+                weights = adjust_additive(frequencies, normal, fractions.Fraction(total),
+                                          fractions.Fraction(self.aggressiveness))
+            else:
+                weights = ADJUSTINGS[self._adjusting()](frequencies, self._normal_values, total,
+                                                        self.aggressiveness)
+            total_weight = sum(weights)
+            distribution = tuple(weight / total_weight for weight in weights)
+            self._preview_distributions[frequencies] = distribution
+        return distribution
+
+    def _expected_distribution(self, state, num_rolls):
+        """ Returns a tuple of the expected probabilities of each possible roll after <num_rolls>
+        random rolls from <state>. Works layer by layer rather than recursively, so it isn't
+        limited by the recursion limit: first the states which can be reached after each number of
+        rolls (and whose expectations aren't cached yet) are found, and then their expectations
+        are worked out from the last layer back to <state>, each from the expectations of the
+        states one roll later.
+        """
+        if num_rolls == 0:
+            return self._preview_distribution(state)
+        expectations = self._preview_expectations
+        if (state, num_rolls) in expectations:
+            return expectations[(state, num_rolls)]
+        # layers[i] holds the states reached after i rolls whose expectations after the other
+        #  num_rolls - i rolls are needed. Rolls which can't happen lead to states which never need
+        #  to be visited.
+        layers = [[state]]
+        for depth in range(1, num_rolls):
+            remaining = num_rolls - depth
+            layer = {}
+            for previous_state in layers[-1]:
+                for index, probability in enumerate(self._preview_distribution(previous_state)):
+                    if probability:
+                        next_state = self._preview_next_state(previous_state, index)
+                        if (next_state, remaining) not in expectations:
+                            layer[next_state] = None
+            layers.append(list(layer))
+        for depth in reversed(range(num_rolls)):
+            remaining = num_rolls - depth
+            for layer_state in layers[depth]:
+                expected = [0] * len(self.frequencies)
+                for index, probability in enumerate(self._preview_distribution(layer_state)):
+                    if probability:
+                        next_state = self._preview_next_state(layer_state, index)
+                        if remaining == 1:
+                            after = self._preview_distribution(next_state)
+                        else:
+                            after = expectations[(next_state, remaining - 1)]
+                        for i, later_probability in enumerate(after):
+                            expected[i] += probability * later_probability
+                expectations[(layer_state, remaining)] = tuple(expected)
+        return expectations[(state, num_rolls)]
+
     def __str__(self):
         """ Returns a well formatted string which displays the current (adjusted) probabilities of
         rolling each possible roll and the number of times each roll has already occurred.
         Probabilities are rounded to the nearest percent.
         """
-        self.update_probabilities()
         string = ""
         for roll, probability in self.probabilities.items():
             string += "\n{0:2d}: {1:3d}% chance, {2}".format(
@@ -237,68 +1342,96 @@ class CatanDice(GamblersFallacyDice):
     turn it is to roll.
     """
 
-    def __init__(self, num_players, aggressiveness):
+    def __init__(self, num_players, aggressiveness, incremental=False, verify_incremental=False,
+                 sampler="linear", max_history=None, rng=None, exact=False, adjusting=None):
         """ See the docstring for GamblersFallacyDice.__init__(). Initializes with 2 six sided dice,
         and <num_players> players (which matters here for 7s).
         """
-        GamblersFallacyDice.__init__(self, num_dice=2, num_sides=6, aggressiveness=aggressiveness)
+        GamblersFallacyDice.__init__(self, num_dice=2, num_sides=6, aggressiveness=aggressiveness,
+                                     incremental=incremental,
+                                     verify_incremental=verify_incremental, sampler=sampler,
+                                     max_history=max_history, rng=rng, exact=exact,
+                                     adjusting=adjusting)
         self.num_players = num_players
         # The player who's turn it is to roll
         self.curr_player = 1
         # Maps each player (integer 1 through num_players) to the number of times that player has
         #  rolled a 7.
         self.players_seven_counts = {player: 0 for player in range(1, num_players + 1)}
-        # We use the methods in GamblersFallacyDice to keep track of the previous states of
-        #  self.frequencies, so the only additional work we need to do is keeping track of the
-        #  previous states of self.players_seven_counts.
-        self.undo_sevens_states = []
-        self.redo_sevens_states = []
+        # We use the rolls remembered by GamblersFallacyDice for undo/redo. Since players always
+        #  take turns in order, the player who made each of those rolls can be worked out from
+        #  self.curr_player, so no additional history is needed here.
 
     # TODO: Add comments within the code below here in this class.
-    def roll(self):
-        """ Returns a roll of these dice and remembers that this roll occurred (which will cause
-        probabilities to be changed).
+    def _add_roll(self, roll):
+        """ See the docstring for GamblersFallacyDice._add_roll(). <roll> is taken to have been
+        rolled by the current player, and then it becomes the next player's turn.
         """
-        self.undo_sevens_states.append(self.players_seven_counts.copy())
-        self.redo_sevens_states = []
-        # For purposes of determining probabilities the number of 7s rolled so far is taken to be
-        #  the number of players multiplied by the number of times the current player has rolled a 7
-        #  so far.
-        self.frequencies[7] = self.players_seven_counts[self.curr_player] * self.num_players
-        roll = GamblersFallacyDice.roll(self)
+        GamblersFallacyDice._add_roll(self, roll)
         if roll == 7:
             self.players_seven_counts[self.curr_player] += 1
-            # It's not necessary to update self.frequencies[7] since that is set at the beggining
-            #  of each call to roll(), and is unused by __str__().
         self.curr_player += 1
         if self.curr_player > self.num_players:
             self.curr_player = 1
-        return roll
+        self._sync_seven_frequency()
 
-    def undo(self):
-        """ Undoes the effects of the previous roll.
+    def _remove_roll(self, roll):
+        """ See the docstring for GamblersFallacyDice._remove_roll(). <roll> was rolled by the
+        previous player, so it becomes their turn again.
         """
-        # GamblersFallacyDice.undo() deals with the state of self.frequencies.
-        GamblersFallacyDice.undo(self)
-        # We also need to deal with the states of self.players_seven_counts and self.curr_player.
-        self.redo_sevens_states.append(self.players_seven_counts.copy())
-        self.players_seven_counts = self.undo_sevens_states.pop()
+        GamblersFallacyDice._remove_roll(self, roll)
         self.curr_player -= 1
         if self.curr_player < 1:
             self.curr_player = self.num_players
+        if roll == 7:
+            self.players_seven_counts[self.curr_player] -= 1
+        self._sync_seven_frequency()
 
-    def redo(self):
-        """ Redoes the effects of the previous roll which was just undone. Can be called multiple
-        times in a row to redo multiple consecutive undos.
+    def _sync_seven_frequency(self):
+        """ Sets self.frequencies[7] to the number of 7s which is used for determining the current
+        player's probabilities. This must be done whenever the current player or their number of 7s
+        changes, so that self.frequencies[7] is always up to date.
         """
-        # GamblersFallacyDice.redo() deals with the state of self.frequencies.
-        GamblersFallacyDice.redo(self)
-        # We also need to deal with the states of self.players_seven_counts and self.curr_player.
-        self.undo_sevens_states.append(self.players_seven_counts.copy())
-        self.players_seven_counts = self.redo_sevens_states.pop()
-        self.curr_player += 1
-        if self.curr_player > self.num_players:
-            self.curr_player = 1
+        # For purposes of determining probabilities the number of 7s rolled so far is taken to be
+        #  the number of players multiplied by the number of times the current player has rolled a 7
+        #  so far.
+        # Each player's distribution isn't kept between turns, because none of it could be reused:
+        #  the total number of rolls the adjustment divides by includes this scaled number of 7s,
+        #  so every roll other than 7 gets a different weight (and different rolls get clamped to
+        #  0) for each player, and every roll changes that total for every player anyway. Going
+        #  back to a player's turn by undoing is the only time a distribution could be reused, and
+        #  caching for that made every other turn slower.
+        self._set_frequency(7, self.players_seven_counts[self.curr_player] * self.num_players)
+
+    def _preview_state(self):
+        """ See the docstring for GamblersFallacyDice._preview_state(). The state is a tuple of the
+        frequencies (with 0 for 7), each player's number of 7s, and the current player.
+        """
+        frequencies = list(self.frequencies.values())
+        frequencies[7 - self._min_roll] = 0
+        return (tuple(frequencies), tuple(self.players_seven_counts.values()), self.curr_player)
+
+    def _preview_next_state(self, state, index):
+        """ See the docstring for GamblersFallacyDice._preview_next_state(). The roll is rolled by
+        the current player of <state>, and then it's the next player's turn.
+        """
+        frequencies, seven_counts, curr_player = state
+        if index == 7 - self._min_roll:
+            seven_counts = GamblersFallacyDice._preview_next_state(self, seven_counts,
+                                                                   curr_player - 1)
+        else:
+            frequencies = GamblersFallacyDice._preview_next_state(self, frequencies, index)
+        return (frequencies, seven_counts, curr_player % self.num_players + 1)
+
+    def _preview_frequencies(self, state):
+        """ See the docstring for GamblersFallacyDice._preview_frequencies(). The frequency of 7 is
+        worked out from the current player's 7s like in _sync_seven_frequency(), so every state in
+        which the current player sees the same frequencies shares its probabilities.
+        """
+        frequencies, seven_counts, curr_player = state
+        seven_index = 7 - self._min_roll
+        return frequencies[:seven_index] + (seven_counts[curr_player - 1] * self.num_players,) + \
+            frequencies[seven_index + 1:]
 
     def __str__(self):
         """ Returns a well formatted string which displays the current (adjusted) probabilities of
@@ -308,11 +1441,6 @@ class CatanDice(GamblersFallacyDice):
         displayed (since it's impossible for any players other than the current player to roll a 7
         during the current player's turn).
         """
-        # For purposes of determining probabilities the number of 7s rolled so far is taken to be
-        #  the number of players multiplied by the number of times the current player has rolled a 7
-        #  so far.
-        self.frequencies[7] = self.players_seven_counts[self.curr_player] * self.num_players
-        self.update_probabilities()
         string = ""
         for roll, probability in self.probabilities.items():
             if roll == 7:
@@ -337,6 +1465,129 @@ DEFAULT_COLOR = "\033[0m"
 # Escape character sequence for turning printed text light yellow (console) or bold and yellow
 #  (xterm)
 YELLOW = "\033[1;33m"
+# Escape character sequences for moving the cursor to the top left of the terminal and clearing
+#  it, for moving the cursor to line {0} (counting from 1), and for clearing from the cursor to the
+#  end of its line or to the end of the terminal
+CLEAR_SCREEN = "\033[H\033[2J"
+MOVE_TO_LINE = "\033[{0};1H"
+CLEAR_LINE = "\033[K"
+CLEAR_BELOW = "\033[J"
+
+
+class TerminalRenderer:
+    """ Displays the same table of probabilities and frequencies as str() of GamblersFallacyDice (or
+    CatanDice), for showing it every turn of a game. The text around each number in each row is
+    worked out once, so a row is a single f-string, and everything is written with a single write.
+    On terminals which support cursor addressing the table stays at the top of the terminal, and
+    only the rows which changed since the last time it was rendered are rewritten. The
+    probabilities shown are worked out from whatever the next roll is sampled with (see
+    displayed_probabilities()), so rendering never makes the dice compute anything which that roll
+    doesn't need anyway.
+    """
+
+    def __init__(self, dice, stream=None, cursor_addressing=None):
+        """ Initializes a renderer of <dice> which writes to the file-like <stream> (sys.stdout if
+        None).
+        <cursor_addressing> is whether to update the table in place with cursor addressing, or None
+        for doing so only if <stream> is a terminal which supports it.
+        """
+        self.dice = dice
+        self.stream = stream if stream is not None else sys.stdout
+        if cursor_addressing is None:
+            cursor_addressing = self.stream.isatty() and os.environ.get("TERM", "dumb") != "dumb"
+        self.cursor_addressing = cursor_addressing
+        # Number of rows of the table actually written so far, which is less than the number of
+        #  rows rendered when only changed rows are rewritten
+        self.num_rows_written = 0
+        # The rows written by the last render() with cursor addressing, or None if the whole
+        #  terminal must be redrawn
+        self._previous_rows = None
+        # Each row is (roll, player, prefix, other_prefix), where player is None except for the
+        #  rows of each player's 7s on CatanDice, and other_prefix is the prefix used when player
+        #  isn't the current player (and so no probability is shown)
+        self._layout = []
+        for roll in dice.frequencies:
+            if not isinstance(dice, CatanDice):
+                self._layout.append((roll, None, f"{roll:2d}: ", None))
+            elif roll != 7:
+                self._layout.append((roll, None, f"        {roll:2d}: ", None))
+            else:
+                for player in sorted(dice.players_seven_counts):
+                    self._layout.append((roll, player, f"Player {player} 7: ",
+                                         f"Player {player} 7:              "))
+
+    def displayed_probabilities(self):
+        """ Returns a dictionary mapping each possible roll to its current probability, worked out
+        from what the next roll is sampled with: the acceptance thresholds of incremental dice (see
+        GamblersFallacyDice._incremental_probabilities()), the cumulative weights of exact dice,
+        and otherwise self.dice.probabilities, which are then computed only once for both the
+        rendering and the next roll.
+        """
+        dice = self.dice
+        if dice.incremental:
+            return dice._incremental_probabilities()
+        if dice.exact:
+            cumulative_weights = dice._current_exact_weights()
+            total_weight = cumulative_weights[-1]
+            return {roll: fractions.Fraction(cumulative_weight - previous_cumulative_weight,
+                                             total_weight)
+                    for roll, previous_cumulative_weight, cumulative_weight in
+                    zip(dice.frequencies, (0,) + cumulative_weights, cumulative_weights)}
+        return dice.probabilities
+
+    def rows(self):
+        """ Returns a list of the rows of the table for the current state of the dice, without
+        newlines.
+        """
+        dice = self.dice
+        probabilities = self.displayed_probabilities()
+        frequencies = dice.frequencies
+        # Only used by the 7 rows of CatanDice
+        seven_counts = getattr(dice, "players_seven_counts", None)
+        curr_player = getattr(dice, "curr_player", None)
+        rows = []
+        for roll, player, prefix, other_prefix in self._layout:
+            if player is None:
+                rows.append(f"{prefix}{round(100 * probabilities[roll]):3d}% chance, "
+                            f"{frequencies[roll]}")
+            elif player == curr_player:
+                rows.append(f"{prefix}{round(100 * probabilities[roll]):3d}% chance, "
+                            f"{seven_counts[player]}")
+            else:
+                rows.append(f"{other_prefix}{seven_counts[player]}")
+        return rows
+
+    def render(self, message=""):
+        """ Writes the table for the current state of the dice, along with <message> (such as the
+        result of the last roll) if it isn't empty. Without cursor addressing, the message and then
+        the table are written just like printing them would. With it, the changed rows of the table
+        are rewritten in place, and the message is written below the table, replacing everything
+        which was there, with the cursor left on the line after it.
+        """
+        rows = self.rows()
+        if not self.cursor_addressing:
+            parts = [message, "\n"] if message else []
+            parts.extend(["\n", "\n".join(rows), "\n"])
+            self.num_rows_written += len(rows)
+        else:
+            previous_rows = self._previous_rows
+            # If the table and the lines below it don't fit, writing them scrolls the terminal,
+            #  moving the table, so it has to be redrawn from scratch every time
+            if previous_rows is None or len(previous_rows) != len(rows) or \
+                    len(rows) + 3 > shutil.get_terminal_size().lines:
+                parts = [CLEAR_SCREEN, "\n".join(rows)]
+                self.num_rows_written += len(rows)
+            else:
+                parts = []
+                for line, (row, previous_row) in enumerate(zip(rows, previous_rows), 1):
+                    if row != previous_row:
+                        parts.extend([MOVE_TO_LINE.format(line), row, CLEAR_LINE])
+                        self.num_rows_written += 1
+            # One blank line is left between the table and the message
+            parts.extend([MOVE_TO_LINE.format(len(rows) + 2), CLEAR_BELOW, message, "\n"])
+            self._previous_rows = rows
+        self.stream.write("".join(parts))
+        self.stream.flush()
 
 
 def run_catan(num_players, aggressiveness):
@@ -351,8 +1602,12 @@ def run_catan(num_players, aggressiveness):
         prompt = f"Enter Player {player}'s name: "
         names[player] = input(prompt)
     dice = CatanDice(num_players, aggressiveness)
+    renderer = TerminalRenderer(dice)
+    # What happened on the last turn, shown along with the table
+    message = ""
     while True:
-        print(dice)
+        renderer.render(message)
+        message = ""
         prompt = f"{names[dice.curr_player]}'s turn. "
         if dice.can_undo() and dice.can_redo():
             prompt += "Press Enter to roll, Ctrl+c to quit, or type UNDO or REDO: "
@@ -370,21 +1625,21 @@ def run_catan(num_players, aggressiveness):
         if user_input == "UNDO":
             try:
                 dice.undo()
-                print("Successful undo")
+                message = "Successful undo"
             except ValueError as e:
-                print(e)
+                message = str(e)
         elif user_input == "REDO":
             try:
                 dice.redo()
-                print("Successful redo")
+                message = "Successful redo"
             except ValueError as e:
-                print(e)
+                message = str(e)
         elif user_input == "":
             # Colors draw the eye to the roll, which otherwise might be lost in a sea of text
-            print(RED_BACKGROUND + "Roll:" + DEFAULT_COLOR,
-                  YELLOW + str(dice.roll()) + DEFAULT_COLOR)
+            message = RED_BACKGROUND + "Roll:" + DEFAULT_COLOR + " " + YELLOW + str(dice.roll()) + \
+                DEFAULT_COLOR
         else:
-            print("Invalid input, no action done")
+            message = "Invalid input, no action done"
 
 
 def run_no_split_7s_catan(num_players, aggressiveness):
@@ -403,11 +1658,15 @@ def run_no_split_7s_catan(num_players, aggressiveness):
         prompt = f"Enter Player {player}'s name: "
         names.append(input(prompt))
     player = 1
+    renderer = TerminalRenderer(dice)
+    # What happened on the last turn, shown along with the table
+    message = ""
     while True:
         player = player % num_players
         if player == 0:
             player = num_players
-        print(dice)
+        renderer.render(message)
+        message = ""
         prompt = f"{names[player]}'s turn. "
         if dice.can_undo() and dice.can_redo():
             prompt += "Press Enter to roll, Ctrl+c to quit, or type UNDO or REDO: "
@@ -426,23 +1685,23 @@ def run_no_split_7s_catan(num_players, aggressiveness):
             try:
                 dice.undo()
                 player -= 1
-                print("Successful undo")
+                message = "Successful undo"
             except ValueError as e:
-                print(e)
+                message = str(e)
         elif user_input == "REDO":
             try:
                 dice.redo()
                 player += 1
-                print("Successful redo")
+                message = "Successful redo"
             except ValueError as e:
-                print(e)
+                message = str(e)
         elif user_input == "":
             # Colors draw the eye to the roll, which otherwise might be lost in a sea of text
-            print(RED_BACKGROUND + "Roll: " + DEFAULT_COLOR,
-                  YELLOW + str(dice.roll()) + DEFAULT_COLOR)
+            message = RED_BACKGROUND + "Roll: " + DEFAULT_COLOR + " " + YELLOW + \
+                str(dice.roll()) + DEFAULT_COLOR
             player += 1
         else:
-            print("Invalid input, no action done")
+            message = "Invalid input, no action done"
 
 
 def old_run_catan():
@@ -0,0 +1,354 @@
+import argparse
+import array
+import collections
+import fractions
+import os
+import pickle
+import shutil
+import tempfile
+import zlib
+
+import DiceRoller
+
+# Default for the most states with the same number of rolls a ConvergenceAnalysis keeps in memory
+#  before spilling them to disk
+MAX_STATES_IN_MEMORY = 1000000
+# Number of files the states with the same number of rolls are spread over once they're spilled,
+#  so that each file's states are few enough to be merged in memory
+NUM_SPILL_BUCKETS = 64
+
+# The exact distribution of how far the rolls deviate from the normal distribution after
+#  <num_rolls> rolls. <num_states> is the number of different (canonical, see
+#  ConvergenceAnalysis) frequency states the dice can be in, and <deviations> is a dictionary
+#  mapping each possible deviation (the total variation distance between the distribution of the
+#  rolls and the normal distribution, as an exact fractions.Fraction) to its probability, sorted by
+#  deviation.
+DeviationSummary = collections.namedtuple("DeviationSummary",
+                                          ["num_rolls", "num_states", "deviations"])
+
+
+def expected_deviation(summary):
+    """ Returns the expected deviation of the DeviationSummary <summary>.
+    """
+    return sum(deviation * probability for deviation, probability in summary.deviations.items())
+
+
+def probability_within(summary, deviation):
+    """ Returns the probability of the rolls deviating by at most <deviation> in the
+    DeviationSummary <summary>.
+    """
+    return sum(probability for possible_deviation, probability in summary.deviations.items()
+               if possible_deviation <= deviation)
+
+
+class _Layer:
+    """ The probability of each state the dice can be in after the same number of rolls, keyed by
+    the states' compact keys. Held in a dictionary until there are more than max_states of them,
+    after which they're spilled into NUM_SPILL_BUCKETS files, each holding a share of the keys
+    (possibly more than once, with probabilities to be added up when the file is read back).
+    """
+
+    def __init__(self, max_states, make_directory):
+        """ Initializes an empty layer, which spills into the directory returned by calling
+        <make_directory> (which takes no arguments) if it gets too big. It's only called then, so
+        nothing is created on disk for layers which are never spilled.
+        """
+        self.max_states = max_states
+        self.make_directory = make_directory
+        self.directory = None
+        self.probabilities = {}
+        self.spilled = False
+
+    def add(self, key, probability):
+        """ Adds <probability> to the probability of the state with key <key>.
+        """
+        probabilities = self.probabilities
+        if key in probabilities:
+            probabilities[key] += probability
+        else:
+            probabilities[key] = probability
+            if len(probabilities) > self.max_states:
+                self._spill()
+
+    def _spill(self):
+        """ Appends the states held in memory to the bucket files, and forgets them.
+        """
+        if not self.spilled:
+            self.directory = self.make_directory()
+            os.makedirs(self.directory)
+            self.spilled = True
+        buckets = [[] for _ in range(NUM_SPILL_BUCKETS)]
+        for item in self.probabilities.items():
+            buckets[zlib.crc32(item[0]) % NUM_SPILL_BUCKETS].append(item)
+        for bucket, items in enumerate(buckets):
+            with open(os.path.join(self.directory, str(bucket)), "ab") as file:
+                pickle.dump(items, file, pickle.HIGHEST_PROTOCOL)
+        self.probabilities = {}
+
+    def finish(self):
+        """ Spills the states still held in memory if the layer has been spilled before, so that
+        every state is in the bucket files. Must be called once every state has been added.
+        """
+        if self.spilled and self.probabilities:
+            self._spill()
+
+    def items(self):
+        """ Yields a tuple (key, probability) for every state of the layer, once each.
+        """
+        if not self.spilled:
+            yield from self.probabilities.items()
+            return
+        for bucket in range(NUM_SPILL_BUCKETS):
+            merged = {}
+            with open(os.path.join(self.directory, str(bucket)), "rb") as file:
+                while True:
+                    try:
+                        items = pickle.load(file)
+                    except EOFError:
+                        break
+                    for key, probability in items:
+                        if key in merged:
+                            merged[key] += probability
+                        else:
+                            merged[key] = probability
+            yield from merged.items()
+
+    def discard(self):
+        """ Deletes the layer's bucket files, if it was spilled.
+        """
+        if self.spilled:
+            shutil.rmtree(self.directory)
+        self.probabilities = {}
+
+
+class ConvergenceAnalysis:
+    """ Works out exactly how GamblersFallacyDice converge towards the normal distribution, by
+    treating them as a Markov chain over their frequencies. The states after each number of rolls
+    are enumerated from those after one fewer, merging states reached in different orders, along
+    with the probability of the dice being in each. Nothing is sampled, so the results have no
+    noise, and dice which adjust aggressively reach few states since many rolls become impossible.
+    Each state is stored as a compact key: the bytes of an array of its frequencies, using the
+    smallest integer type that fits. If the normal distribution is symmetric (as it is for any
+    number of identical dice), a state and its mirror image (frequencies in reverse order) behave
+    the same, so only the smaller of their keys is used, halving the number of states. The states
+    after the last analyzed number of rolls are kept, so analyzing more rolls later carries on
+    from there rather than starting again, and the summary of every number of rolls is kept.
+    """
+
+    def __init__(self, num_dice, num_sides, aggressiveness, adjusting="additive", exact=False,
+                 max_states_in_memory=MAX_STATES_IN_MEMORY, spill_directory=None):
+        """ Initializes an analysis of GamblersFallacyDice(<num_dice>, <num_sides>,
+        <aggressiveness>, adjusting=<adjusting>), before any rolls.
+        <adjusting> must be the name of one of DiceRoller.ADJUSTINGS.
+        If <exact> is True, probabilities are exact fractions.Fractions (like for exact dice), and
+        <adjusting> must be "additive". Otherwise they're floats, which is much faster.
+        <max_states_in_memory> is the most states after the same number of rolls which are held in
+        memory before spilling them to disk.
+        <spill_directory> is the directory in which a temporary directory for the states spilled to
+        disk is created when it's first needed (and deleted by close()), or None for the system's
+        default location for temporary files.
+        """
+        if adjusting not in DiceRoller.ADJUSTINGS:
+            raise ValueError(f"Unknown adjusting {adjusting!r}, must be one of "
+                             f"{tuple(DiceRoller.ADJUSTINGS)}")
+        if exact and adjusting != "additive":
+            raise ValueError("Exact analysis can only adjust probabilities additively")
+        self.num_dice = num_dice
+        self.num_sides = num_sides
+        self.aggressiveness = aggressiveness
+        self.adjusting = adjusting
+        self.exact = exact
+        self.max_states_in_memory = max_states_in_memory
+        self._strategy = DiceRoller.ADJUSTINGS[adjusting]
+        self._counts = DiceRoller.normal_distribution(num_dice, num_sides).counts
+        self._num_permutations = num_sides ** num_dice
+        if exact:
+            self._normal = [fractions.Fraction(count, self._num_permutations)
+                            for count in self._counts]
+            self._aggressiveness = fractions.Fraction(aggressiveness)
+        else:
+            self._normal = tuple(DiceRoller.normal_distribution(num_dice,
+                                                                num_sides).probabilities.values())
+            self._aggressiveness = aggressiveness
+        self._symmetric = self._counts == self._counts[::-1]
+        self._spill_directory = spill_directory
+        self._temporary_directory = None
+        # Summary of every number of rolls analyzed so far, in order
+        self.summaries = []
+        # The states after len(self.summaries) - 1 rolls
+        self._num_rolls = 0
+        self._layer = _Layer(max_states_in_memory, None)
+        # Whether close() has been called, after which no more rolls can be analyzed
+        self.closed = False
+        # Before any rolls, the dice are certainly in the state with every frequency 0
+        self._layer.add(array.array("B", [0] * len(self._counts)).tobytes(), 1)
+        self.summaries.append(self._summarize(0, self._layer))
+
+    @staticmethod
+    def _typecode(num_rolls):
+        """ Returns the array type code of the keys of states after <num_rolls> rolls.
+        """
+        if num_rolls <= 0xFF:
+            return "B"
+        if num_rolls <= 0xFFFF:
+            return "H"
+        return "L"
+
+    def _distribution(self, frequencies, num_rolls):
+        """ Returns a list of the probabilities of each possible roll in the state with
+        <frequencies>, after <num_rolls> rolls.
+        """
+        total = fractions.Fraction(num_rolls) if self.exact else num_rolls
+        weights = self._strategy(frequencies, self._normal, total, self._aggressiveness)
+        total_weight = sum(weights)
+        return [weight / total_weight for weight in weights]
+
+    def _summarize(self, num_rolls, layer):
+        """ Returns the DeviationSummary of <layer>, the states after <num_rolls> rolls. The total
+        variation distance of each state is worked out in integers, as the sum of
+        |frequency * permutations - count * num_rolls| over 2 * num_rolls * permutations, so that
+        it's exact and the same however the state was reached, and the probabilities are added up
+        by numerator, since the denominator is the same for every state.
+        """
+        typecode = self._typecode(num_rolls)
+        num_permutations = self._num_permutations
+        expected_counts = [count * num_rolls for count in self._counts]
+        probabilities = {}
+        num_states = 0
+        for key, probability in layer.items():
+            num_states += 1
+            numerator = sum(abs(frequency * num_permutations - expected_count)
+                            for frequency, expected_count in zip(array.array(typecode, key),
+                                                                 expected_counts))
+            probabilities[numerator] = probabilities.get(numerator, 0) + probability
+        denominator = 2 * num_rolls * num_permutations or 1
+        return DeviationSummary(num_rolls, num_states,
+                                {fractions.Fraction(numerator, denominator): probability
+                                 for numerator, probability in sorted(probabilities.items())})
+
+    def _layer_directory(self, num_rolls):
+        """ Returns the directory the states after <num_rolls> rolls are spilled into, creating the
+        temporary directory it's in if this is the first time anything has been spilled.
+        """
+        if self._temporary_directory is None:
+            self._temporary_directory = tempfile.mkdtemp(prefix="DiceRollerAnalysis-",
+                                                         dir=self._spill_directory)
+        return os.path.join(self._temporary_directory, f"rolls-{num_rolls}")
+
+    def _step(self):
+        """ Replaces the current layer of states with the states one roll later, and returns its
+        DeviationSummary. A state's key is the smaller of the keys of it and its mirror image if
+        the normal distribution is symmetric.
+        """
+        num_rolls = self._num_rolls + 1
+        typecode = self._typecode(self._num_rolls)
+        next_layer = _Layer(self.max_states_in_memory,
+                            lambda: self._layer_directory(num_rolls))
+        next_typecode = self._typecode(num_rolls)
+        last_index = len(self._counts) - 1
+        for key, probability in self._layer.items():
+            frequencies = array.array(typecode, key).tolist()
+            # The keys of the next states are the bytes of these arrays (and their mirror images)
+            #  with one frequency incremented, which is much cheaper than building each from scratch
+            next_frequencies = array.array(next_typecode, frequencies)
+            mirrored = array.array(next_typecode, reversed(frequencies))
+            for index, roll_probability in enumerate(self._distribution(frequencies,
+                                                                        self._num_rolls)):
+                # Rolls which can't happen don't lead anywhere
+                if roll_probability:
+                    next_frequencies[index] += 1
+                    next_key = next_frequencies.tobytes()
+                    next_frequencies[index] -= 1
+                    if self._symmetric:
+                        mirrored[last_index - index] += 1
+                        next_key = min(next_key, mirrored.tobytes())
+                        mirrored[last_index - index] -= 1
+                    next_layer.add(next_key, probability * roll_probability)
+        next_layer.finish()
+        self._layer.discard()
+        self._layer = next_layer
+        self._num_rolls = num_rolls
+        return self._summarize(num_rolls, next_layer)
+
+    def run(self, num_rolls):
+        """ Analyzes every number of rolls up to <num_rolls>, carrying on from the most analyzed so
+        far, and returns the list of the DeviationSummary of every number of rolls from 0 to
+        <num_rolls>. Raises a ValueError if that needs more rolls to be analyzed after close().
+        """
+        if self.closed and len(self.summaries) <= num_rolls:
+            raise ValueError(f"Can't analyze {num_rolls} rolls after closing, only the "
+                             f"{len(self.summaries) - 1} rolls analyzed before then")
+        while len(self.summaries) <= num_rolls:
+            self.summaries.append(self._step())
+        return self.summaries[:num_rolls + 1]
+
+    def close(self):
+        """ Deletes anything spilled to disk. The summaries are kept, but no more rolls can be
+        analyzed.
+        """
+        self._layer.discard()
+        self.closed = True
+        if self._temporary_directory is not None:
+            shutil.rmtree(self._temporary_directory, ignore_errors=True)
+            self._temporary_directory = None
+
+    def __enter__(self):
+        """ Returns the analysis, which is closed at the end of the with block.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """ Closes the analysis.
+        """
+        self.close()
+
+
+def format_table(summaries, baseline=None, within=0.05):
+    """ Returns a well formatted string with a row for each of the list of DeviationSummaries
+    <summaries>, showing the number of states, the expected deviation and the probability of the
+    deviation being at most <within>. If <baseline> is a list of summaries of the same numbers of
+    rolls (such as of normal dice), the expected deviation of each is shown alongside.
+    """
+    lines = ["rolls     states  expected deviation  {0:>22s}".format(f"P(deviation <= {within})")]
+    if baseline is not None:
+        lines[0] += "  baseline deviation"
+    for index, summary in enumerate(summaries):
+        line = "{0:5d} {1:10d} {2:19.4f} {3:22.4f}".format(
+            summary.num_rolls, summary.num_states, float(expected_deviation(summary)),
+            float(probability_within(summary, within)))
+        if baseline is not None:
+            line += " {0:19.4f}".format(float(expected_deviation(baseline[index])))
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main():
+    """ Runs an analysis with the parameters passed on the command line and prints the results.
+    """
+    parser = argparse.ArgumentParser(
+        description="Works out exactly how far the rolls of GamblersFallacyDice are expected to "
+                    "deviate from the normal distribution after each number of rolls, optionally "
+                    "alongside normal dice.")
+    parser.add_argument("num_dice", type=int)
+    parser.add_argument("num_sides", type=int)
+    parser.add_argument("aggressiveness", type=float)
+    parser.add_argument("--rolls", type=int, default=20)
+    parser.add_argument("--adjusting", choices=tuple(DiceRoller.ADJUSTINGS), default="additive")
+    parser.add_argument("--exact", action="store_true")
+    parser.add_argument("--within", type=fractions.Fraction, default=fractions.Fraction("0.05"))
+    parser.add_argument("--baseline", action="store_true",
+                        help="also analyze normal dice (aggressiveness 0), which reach far more "
+                             "states")
+    parser.add_argument("--max-states", type=int, default=MAX_STATES_IN_MEMORY)
+    parser.add_argument("--spill-directory", default=None)
+    args = parser.parse_args()
+    results = []
+    for aggressiveness in (args.aggressiveness, 0) if args.baseline else (args.aggressiveness,):
+        with ConvergenceAnalysis(args.num_dice, args.num_sides, aggressiveness, args.adjusting,
+                                 args.exact, args.max_states, args.spill_directory) as analysis:
+            results.append(analysis.run(args.rolls))
+    print(format_table(results[0], results[1] if args.baseline else None, args.within))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import contextlib
+import json
+import platform
+import sys
+import timeit
+
+import DiceRoller
+
+# (num_dice, num_sides) of the dice benchmarked, from the usual 2d6 up to dice with many rolls
+DICE_SIZES = ((2, 6), (4, 4), (5, 20), (10, 20))
+# Numbers of rolls already made on the dice before they're benchmarked
+HISTORY_LENGTHS = (0, 100, 10000)
+# Numbers of players the CatanDice are benchmarked with
+PLAYER_COUNTS = (2, 4, 6)
+# A result is a regression if it's slower than its baseline by more than this fraction
+DEFAULT_THRESHOLD = 0.1
+
+
+@contextlib.contextmanager
+def _adjusting(multiplicative):
+    """ Sets DiceRoller.USE_MULTIPLICATIVE_ADJUSTING to <multiplicative> within the with block, and
+    restores its previous value afterwards.
+    """
+    previous = DiceRoller.USE_MULTIPLICATIVE_ADJUSTING
+    DiceRoller.USE_MULTIPLICATIVE_ADJUSTING = multiplicative
+    try:
+        yield
+    finally:
+        DiceRoller.USE_MULTIPLICATIVE_ADJUSTING = previous
+
+
+def _rolled(dice, num_rolls):
+    """ Rolls <dice> <num_rolls> times, and returns them.
+    """
+    for _ in range(num_rolls):
+        dice.roll()
+    return dice
+
+
+class _NullStream:
+    """ A file-like object which discards everything written to it, so that rendering can be
+    benchmarked without the terminal.
+    """
+
+    def write(self, text):
+        """ Discards <text>.
+        """
+
+    def flush(self):
+        """ Does nothing.
+        """
+
+
+def _rolling(make_dice):
+    """ Returns a tuple (function, setup), where function rolls the dice most recently created by
+    setup(), which creates new ones with make_dice(). Since rolling changes the dice, each
+    measurement calls setup() first, so that every measurement rolls the same rolls from the same
+    state.
+    """
+    dice = []
+
+    def setup():
+        dice[:] = [make_dice()]
+
+    def function():
+        dice[0].roll()
+    return function, setup
+
+
+def _recomputing(dice):
+    """ Returns a function which makes <dice> recompute their probabilities, which
+    update_probabilities() alone wouldn't do once they're up to date.
+    """
+    def function():
+        dice._state_version += 1
+        dice.update_probabilities()
+    return function
+
+
+def _adjusted(dice, strategy):
+    """ Returns a function which adjusts the probabilities of <dice> with the ADJUSTINGS strategy
+    <strategy>, without the dice themselves being involved.
+    """
+    frequencies = tuple(dice.frequencies.values())
+    normal = tuple(dice.normal_probabilities.values())
+    total = dice.sum_of_frequencies
+    return lambda: strategy(frequencies, normal, total, 10)
+
+
+def _benchmarks():
+    """ Yields a tuple (name, multiplicative, make_function) for every benchmark, where
+    make_function() returns the function to be timed, which takes no arguments, or a tuple of it
+    and a setup function to call before each measurement (see _rolling()). Everything is called
+    with DiceRoller.USE_MULTIPLICATIVE_ADJUSTING set to <multiplicative>. All dice are seeded, so
+    every run benchmarks the same rolls.
+    """
+    for num_dice, num_sides in DICE_SIZES:
+        size = f"{num_dice}d{num_sides}"
+        middle = (num_dice + num_dice * num_sides) // 2
+        yield (f"dice_sum_probability/{size}", False,
+               lambda n=num_dice, s=num_sides, m=middle:
+                   lambda: DiceRoller.dice_sum_probability(m, n, s))
+
+        def uncached(n=num_dice, s=num_sides):
+            DiceRoller.NORMAL_DISTRIBUTION_CACHE.clear()
+            DiceRoller.normal_distribution(n, s)
+        yield f"normal_distribution_uncached/{size}", False, lambda f=uncached: f
+        yield (f"construction/{size}", False,
+               lambda n=num_dice, s=num_sides: lambda: DiceRoller.GamblersFallacyDice(n, s, 10))
+        # The multiplicative engine selected per instance is benchmarked alongside the one
+        #  selected by DiceRoller.USE_MULTIPLICATIVE_ADJUSTING, so the two can be compared
+        for name, multiplicative, adjusting in (("additive", False, None),
+                                                ("multiplicative", True, None),
+                                                ("multiplicative_engine", False,
+                                                 "multiplicative"),
+                                                ("r_ratio", False, "r_ratio")):
+            for history in HISTORY_LENGTHS:
+                yield (f"update_probabilities/{name}/{size}/{history}", multiplicative,
+                       lambda n=num_dice, s=num_sides, h=history, a=adjusting: _recomputing(
+                           _rolled(DiceRoller.GamblersFallacyDice(n, s, 10, adjusting=a,
+                                                                  rng=DiceRoller.DiceRNG(0)), h)))
+        # Every registered strategy on its own, side by side on the same frequencies
+        for adjusting in DiceRoller.ADJUSTINGS:
+            for history in HISTORY_LENGTHS:
+                yield (f"adjust/{adjusting}/{size}/{history}", False,
+                       lambda n=num_dice, s=num_sides, h=history, a=adjusting: _adjusted(
+                           _rolled(DiceRoller.GamblersFallacyDice(n, s, 10,
+                                                                  rng=DiceRoller.DiceRNG(0)), h),
+                           DiceRoller.ADJUSTINGS[a]))
+        yield (f"roll/{size}", False,
+               lambda n=num_dice, s=num_sides: _rolling(lambda: _rolled(
+                   DiceRoller.GamblersFallacyDice(n, s, 10, rng=DiceRoller.DiceRNG(0)), 100)))
+
+        def undo_redo(n=num_dice, s=num_sides):
+            dice = _rolled(DiceRoller.GamblersFallacyDice(n, s, 10, rng=DiceRoller.DiceRNG(0)),
+                           100)
+
+            def function():
+                dice.undo()
+                dice.redo()
+            return function
+        yield f"undo_redo/{size}", False, undo_redo
+    for num_players in PLAYER_COUNTS:
+        yield (f"catan_roll/{num_players}", False,
+               lambda p=num_players: _rolling(lambda: _rolled(
+                   DiceRoller.CatanDice(p, 15, rng=DiceRoller.DiceRNG(0)), 100)))
+        for history in HISTORY_LENGTHS:
+            yield (f"catan_str/{num_players}/{history}", False,
+                   lambda p=num_players, h=history: _rolled(
+                       DiceRoller.CatanDice(p, 15, rng=DiceRoller.DiceRNG(0)), h).__str__)
+            yield (f"catan_render/{num_players}/{history}", False,
+                   lambda p=num_players, h=history: DiceRoller.TerminalRenderer(
+                       _rolled(DiceRoller.CatanDice(p, 15, rng=DiceRoller.DiceRNG(0)), h),
+                       _NullStream(), cursor_addressing=False).render)
+
+
+def time_function(function, repeat=5, setup=None):
+    """ Returns the number of seconds one call of <function> (which takes no arguments) takes.
+    Calls it enough times for each measurement to take at least 0.2 seconds, and returns the best of
+    <repeat> measurements, since slower measurements are slowed by other things running.
+    <setup> is a function which takes no arguments and is called (untimed) before each
+    measurement, or None.
+    """
+    timer = timeit.Timer(function, setup if setup is not None else "pass")
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run_benchmarks(name_filter="", repeat=5):
+    """ Runs every benchmark whose name contains <name_filter>, and returns a dictionary mapping
+    the name of each to the number of seconds one call of its function took (see time_function()).
+    """
+    results = {}
+    for name, multiplicative, make_function in _benchmarks():
+        if name_filter in name:
+            with _adjusting(multiplicative):
+                function = make_function()
+                setup = None
+                if isinstance(function, tuple):
+                    function, setup = function
+                results[name] = time_function(function, repeat, setup)
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """ Returns a list of the regressions in <results> compared to <baseline>, both dictionaries
+    like those returned by run_benchmarks(). A regression is a benchmark in both which got slower by
+    more than the fraction <threshold> of its baseline time, and is described by a dictionary of its
+    name, baseline time, current time, and ratio of the two. The list is sorted worst first.
+    """
+    regressions = []
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * (1 + threshold):
+            regressions.append({"name": name, "baseline": baseline[name], "current": seconds,
+                                "ratio": seconds / baseline[name]})
+    regressions.sort(key=lambda regression: regression["ratio"], reverse=True)
+    return regressions
+
+
+def main():
+    """ Runs the benchmarks and writes their results as JSON, optionally comparing them against a
+    baseline written by a previous run. Exits with status 1 if there were any regressions.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the hot paths of the dice. Save the JSON output of a run before an "
+                    "optimization, and pass it as --baseline to a run after it.")
+    parser.add_argument("--output", help="file to write the results to (default: stdout)")
+    parser.add_argument("--baseline", help="results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fraction slower than the baseline which counts as a regression")
+    parser.add_argument("--filter", default="",
+                        help="only run benchmarks whose names contain this")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "results": run_benchmarks(args.filter, args.repeat)}
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        report["threshold"] = args.threshold
+        report["regressions"] = compare(report["results"], baseline, args.threshold)
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    for regression in report.get("regressions", []):
+        print("Regression: {name} took {current:.3g}s, {ratio:.2f} times its baseline of "
+              "{baseline:.3g}s".format(**regression), file=sys.stderr)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import collections
+import itertools
+import json
+import struct
+import threading
+import time
+
+import DiceRoller
+import DiceRollerPersistence
+
+# A roll, undo, redo or forgetting of history ("forget_history", see
+#  GamblersFallacyDice.roll_many()) which happened to the dice at table number <table>. <sequence>
+#  numbers the events of an EventPipeline in the order they happened, <time> is when it happened
+#  in seconds since the epoch, <roll> is the roll which was rolled, undone or redone (None for
+#  "forget_history"), and <player> is the player who rolled it for CatanDice (None otherwise).
+RollEvent = collections.namedtuple("RollEvent",
+                                   ["sequence", "time", "table", "action", "roll", "player"])
+
+# A binary event log holds a header (magic, format version) followed by one fixed size record
+#  (sequence, time, table, action code, roll, player) per event, all little endian. Action codes
+#  are the same as in journals (see DiceRollerPersistence.JOURNAL_ACTIONS), and a roll or player
+#  of 0 means None.
+EVENT_LOG_MAGIC = b"CDEV"
+EVENT_LOG_FORMAT_VERSION = 1
+_EVENT_LOG_HEADER = struct.Struct("<4sH")
+_EVENT_RECORD = struct.Struct("<QdIBHH")
+_ACTION_CODES = {action: code
+                 for code, action in enumerate(DiceRollerPersistence.JOURNAL_ACTIONS)}
+
+
+class NDJSONSink:
+    """ Writes events to a file as newline delimited JSON, one object per event.
+    """
+
+    def __init__(self, path):
+        """ Opens (creating if necessary) the file at <path>, appending events to it.
+        """
+        self._file = open(path, "a")
+
+    def write(self, events):
+        """ Writes the list of RollEvents <events>.
+        """
+        self._file.write("".join(json.dumps(event._asdict(), separators=(",", ":")) + "\n"
+                                 for event in events))
+
+    def flush(self):
+        """ Hands everything written so far to the operating system.
+        """
+        self._file.flush()
+
+    def close(self):
+        """ Closes the file.
+        """
+        self._file.close()
+
+
+class BinarySink:
+    """ Writes events to a compact binary event log (see read_event_log()).
+    """
+
+    def __init__(self, path):
+        """ Opens (creating if necessary) the event log at <path>, appending events to it.
+        """
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(_EVENT_LOG_HEADER.pack(EVENT_LOG_MAGIC, EVENT_LOG_FORMAT_VERSION))
+
+    def write(self, events):
+        """ Writes the list of RollEvents <events>.
+        """
+        self._file.write(b"".join(
+            _EVENT_RECORD.pack(event.sequence, event.time, event.table,
+                               _ACTION_CODES[event.action], event.roll or 0, event.player or 0)
+            for event in events))
+
+    def flush(self):
+        """ Hands everything written so far to the operating system.
+        """
+        self._file.flush()
+
+    def close(self):
+        """ Closes the file.
+        """
+        self._file.close()
+
+
+class RingBufferSink:
+    """ Keeps the most recent events in memory, forgetting the oldest ones once there are more than
+    it can hold.
+    """
+
+    def __init__(self, capacity):
+        """ Initializes an empty buffer which holds up to <capacity> events.
+        """
+        self._events = collections.deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def write(self, events):
+        """ Adds the list of RollEvents <events>.
+        """
+        with self._lock:
+            self._events.extend(events)
+
+    def events(self):
+        """ Returns a list of the RollEvents held, oldest first.
+        """
+        with self._lock:
+            return list(self._events)
+
+    def flush(self):
+        """ Does nothing, since the events are only kept in memory.
+        """
+
+    def close(self):
+        """ Does nothing, since the events are only kept in memory.
+        """
+
+
+def read_event_log(path):
+    """ Returns a list of the RollEvents in the binary event log at <path>, in the order they were
+    written. A partially written record at the end of the file is ignored.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version = _EVENT_LOG_HEADER.unpack_from(data)
+    if magic != EVENT_LOG_MAGIC:
+        raise ValueError(f"{path} isn't an event log")
+    if version != EVENT_LOG_FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {version}, but only version "
+                         f"{EVENT_LOG_FORMAT_VERSION} is supported")
+    num_records = (len(data) - _EVENT_LOG_HEADER.size) // _EVENT_RECORD.size
+    end = _EVENT_LOG_HEADER.size + num_records * _EVENT_RECORD.size
+    return [RollEvent(sequence, event_time, table,
+                      DiceRollerPersistence.JOURNAL_ACTIONS[code], roll or None, player or None)
+            for sequence, event_time, table, code, roll, player in
+            _EVENT_RECORD.iter_unpack(data[_EVENT_LOG_HEADER.size:end])]
+
+
+def acting_player(dice, action):
+    """ Returns the player who rolled the roll which <action> just happened to on the CatanDice
+    <dice>, or None if <dice> aren't CatanDice or <action> is "forget_history".
+    """
+    if not isinstance(dice, DiceRoller.CatanDice) or action == "forget_history":
+        return None
+    if action == "undo":
+        # Undoing a roll makes it the turn of the player who rolled it again
+        return dice.curr_player
+    # Rolling or redoing a roll makes it the next player's turn
+    return (dice.curr_player - 2) % dice.num_players + 1
+
+
+class EventPipeline:
+    """ Streams an event for every roll, undo and redo of any number of dice to sinks (such as
+    NDJSONSink, BinarySink and RingBufferSink). Recording an event only appends it to a bounded
+    queue, without ever blocking, taking a lock or doing any I/O, and a background thread
+    periodically writes the queued events to every sink in batches, flushing them every so often.
+    If the queue is full because the sinks can't keep up, events are dropped (and counted in
+    self.num_dropped) rather than slowing the dice down.
+    """
+
+    def __init__(self, sinks, max_queue_size=65536, batch_size=1024, poll_interval=0.01,
+                 flush_interval=1.0):
+        """ Starts a pipeline writing to the list of <sinks>, each of which must have write(events),
+        flush() and close() methods.
+        <max_queue_size> is the most events which can be waiting to be written.
+        <batch_size> is the most events written to the sinks at a time.
+        <poll_interval> is how long in seconds the background thread waits between checks for
+        queued events.
+        <flush_interval> is the longest time in seconds written events can go without being flushed.
+        """
+        self.sinks = sinks
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.flush_interval = flush_interval
+        # Number of events dropped because the queue was full
+        self.num_dropped = 0
+        # Appending to and popping from opposite ends of a deque are both atomic, so the dice and
+        #  the background thread can share it without a lock
+        self._queue = collections.deque()
+        self._sequence = itertools.count()
+        # Maps the number of each attached table to (dice, listener)
+        self._tables = {}
+        self._next_table = 1
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._write_events, name="EventPipeline",
+                                        daemon=True)
+        self._thread.start()
+
+    def attach(self, dice, table=None):
+        """ Starts recording the events of <dice> as table number <table> (the next unused number
+        if None), and returns that number.
+        """
+        if table is None:
+            table = self._next_table
+        self._next_table = max(self._next_table, table + 1)
+
+        def listener(dice, action, roll):
+            self._record(table, dice, action, roll)
+        self._tables[table] = (dice, listener)
+        dice.listeners.append(listener)
+        return table
+
+    def detach(self, table):
+        """ Stops recording the events of the dice attached as table number <table>.
+        """
+        dice, listener = self._tables.pop(table)
+        dice.listeners.remove(listener)
+
+    def _record(self, table, dice, action, roll):
+        """ Queues the event of <action> happening to <roll> on the dice <dice> at <table>.
+        """
+        if len(self._queue) >= self.max_queue_size:
+            self.num_dropped += 1
+            return
+        self._queue.append(RollEvent(next(self._sequence), time.time(), table, action, roll,
+                                     acting_player(dice, action)))
+
+    def _write_events(self):
+        """ Writes queued events to the sinks in batches until the pipeline is closed. Runs in the
+        background thread.
+        """
+        last_flush = time.monotonic()
+        unflushed = False
+        while True:
+            # Checked before writing, so that events queued before closing are always written
+            closing = self._closing.wait(self.poll_interval)
+            while self._queue:
+                popleft = self._queue.popleft
+                events = [popleft() for _ in range(min(len(self._queue), self.batch_size))]
+                for sink in self.sinks:
+                    sink.write(events)
+                unflushed = True
+            if unflushed and (closing or time.monotonic() - last_flush >= self.flush_interval):
+                for sink in self.sinks:
+                    sink.flush()
+                last_flush = time.monotonic()
+                unflushed = False
+            if closing:
+                return
+
+    def close(self):
+        """ Stops recording events of every attached dice, waits for every queued event to be
+        written and flushed, and closes the sinks.
+        """
+        if self._closing.is_set():
+            return
+        for table in list(self._tables):
+            self.detach(table)
+        self._closing.set()
+        self._thread.join()
+        for sink in self.sinks:
+            sink.close()
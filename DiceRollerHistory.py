@@ -0,0 +1,231 @@
+import array
+import collections
+import itertools
+import json
+import mmap
+import operator
+import os
+import sys
+import time
+
+import DiceRollerEvents
+
+# Name and array type code of each column of a HistoryStore, in the order they're recorded. Row i
+#  of every column is about the same roll. A roll of 0 marks a row whose roll was undone, and a
+#  player of 0 means the dice weren't CatanDice.
+COLUMNS = (("roll", "H"), ("player", "H"), ("table", "I"), ("probability", "d"), ("time", "d"))
+_METADATA_FILE = "history.json"
+
+
+class HistoryStore:
+    """ A columnar store of the rolls of any number of tables of dice: for each roll, its value,
+    the player who rolled it, the table it was rolled at, the probability it had just before it
+    was rolled, and when it was rolled. Each column is a compact array (or a memory mapped file,
+    see load()), so aggregation queries run over whole columns with C level iteration rather than
+    Python loops, and handle millions of rows in a fraction of a second.
+    """
+
+    def __init__(self):
+        """ Initializes an empty store, which dice can be attached to with attach().
+        """
+        self.columns = {name: array.array(typecode) for name, typecode in COLUMNS}
+        self.read_only = False
+        # Maps the number of each table to an array of the rows of its rolls which haven't been
+        #  undone, oldest first
+        self._table_rows = {}
+        # Maps the number of each attached table to [dice, listener, key], where key is the
+        #  _state_key() of the dice after their last event, which is the state the next roll is
+        #  sampled in
+        self._attached = {}
+        self._mmaps = []
+
+    def __len__(self):
+        """ Returns the number of rows in the store, including those whose rolls were undone.
+        """
+        return len(self.columns["roll"])
+
+    def append(self, roll, player, table, probability, roll_time=None):
+        """ Records that <roll> (which had <probability> just before it was rolled) was rolled by
+        <player> (None if not applicable) at table number <table>, at <roll_time> seconds since the
+        epoch (now if None).
+        """
+        if self.read_only:
+            raise ValueError("Can't record rolls in a memory mapped store")
+        row = len(self)
+        columns = self.columns
+        columns["roll"].append(roll)
+        columns["player"].append(player or 0)
+        columns["table"].append(table)
+        columns["probability"].append(probability)
+        columns["time"].append(time.time() if roll_time is None else roll_time)
+        self._table_rows.setdefault(table, array.array("Q")).append(row)
+
+    def undo(self, table):
+        """ Forgets the most recent roll at table number <table> which hasn't already been undone.
+        If it's the last row of the store it's removed, and otherwise its roll is set to 0, which
+        queries ignore. Does nothing if there's no such roll (for example, it was rolled before the
+        dice were attached).
+        """
+        if self.read_only:
+            raise ValueError("Can't undo rolls in a memory mapped store")
+        if not self._table_rows.get(table):
+            return
+        row = self._table_rows[table].pop()
+        if row == len(self) - 1:
+            for column in self.columns.values():
+                del column[-1]
+        else:
+            self.columns["roll"][row] = 0
+
+    def attach(self, dice, table):
+        """ Starts recording every roll, undo and redo of <dice> as table number <table>. The
+        probability recorded with each roll is the one the dice sampled it with when they already
+        computed it for the roll, and is only worked out otherwise (see _probability_before()), so
+        recording never makes dice compute probabilities after their events.
+        """
+        def listener(dice, action, roll):
+            entry = self._attached[table]
+            if action in ("roll", "redo"):
+                self.append(roll, DiceRollerEvents.acting_player(dice, action), table,
+                            self._probability_before(dice, roll, entry[2]))
+            elif action == "undo":
+                self.undo(table)
+            entry[2] = dice._state_key()
+        self._attached[table] = [dice, listener, dice._state_key()]
+        dice.listeners.append(listener)
+
+    @staticmethod
+    def _probability_before(dice, roll, key):
+        """ Returns the probability <roll> had just before it was rolled (or redone) on <dice>,
+        whose _state_key() was <key> before then. If the dice computed their probabilities in that
+        state (as roll() does, unless the dice are exact or incremental), they're still there to be
+        read. Otherwise the dice are stepped back over <roll> to work it out, and forward again,
+        using the probabilities incremental dice sample with rather than computing them all.
+        """
+        if dice._probabilities_key == key:
+            return dice._probabilities[roll]
+        dice._remove_roll(roll)
+        try:
+            if dice.incremental:
+                return dice._incremental_probabilities()[roll]
+            return dice.probabilities[roll]
+        finally:
+            dice._add_roll(roll)
+
+    def detach(self, table):
+        """ Stops recording the rolls of the dice attached as table number <table>.
+        """
+        dice, listener, _ = self._attached.pop(table)
+        dice.listeners.remove(listener)
+
+    def _rows(self, name, last, table):
+        """ Returns an iterable over column <name>, restricted to the rows of table number <table>
+        (or every table if None) whose rolls weren't undone, and then to the last <last> of those
+        rows (or all of them if None).
+        """
+        rolled = map(operator.ne, self.columns["roll"], itertools.repeat(0))
+        if table is not None:
+            rolled = map(operator.and_, rolled,
+                         map(operator.eq, self.columns["table"], itertools.repeat(table)))
+        column = list(itertools.compress(self.columns[name], rolled))
+        if last is not None:
+            column = column[max(len(column) - last, 0):]
+        return column
+
+    def frequencies(self, last=None, table=None):
+        """ Returns a dictionary mapping each roll to the number of times it was rolled (and not
+        undone), over the last <last> rolls which weren't undone (all of them if None) of table
+        number <table> (every table if None).
+        """
+        return dict(sorted(collections.Counter(self._rows("roll", last, table)).items()))
+
+    def chi_square(self, normal_probabilities, last=None, table=None):
+        """ Returns a tuple (statistic, degrees_of_freedom) of Pearson's chi-square test of the rolls
+        selected like in frequencies() against the normal distribution <normal_probabilities> (such
+        as GamblersFallacyDice.normal_probabilities). Rolls rolled far closer to their expected
+        number of times than normal dice would have a statistic far below the degrees of freedom.
+        """
+        frequencies = self.frequencies(last, table)
+        num_rolls = sum(frequencies.values())
+        statistic = 0.0
+        if num_rolls:
+            for roll, probability in normal_probabilities.items():
+                expected = probability * num_rolls
+                statistic += (frequencies.get(roll, 0) - expected) ** 2 / expected
+        return statistic, len(normal_probabilities) - 1
+
+    def seven_counts(self, last=None, table=None):
+        """ Returns a dictionary mapping each player to the number of 7s they rolled, over the rows
+        selected like in frequencies().
+        """
+        players = self._rows("player", last, table)
+        is_seven = map(operator.eq, self._rows("roll", last, table), itertools.repeat(7))
+        return dict(sorted(collections.Counter(itertools.compress(players, is_seven)).items()))
+
+    def seven_rates(self, last=None, table=None):
+        """ Returns a dictionary mapping each player to the fraction of their rolls which were 7s,
+        over the rows selected like in frequencies().
+        """
+        roll_counts = collections.Counter(self._rows("player", last, table))
+        seven_counts = self.seven_counts(last, table)
+        return {player: seven_counts.get(player, 0) / count
+                for player, count in sorted(roll_counts.items())}
+
+    def save(self, directory):
+        """ Saves every column to its own file in <directory> (creating it if necessary), in a
+        layout which load() can memory map.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, column in self.columns.items():
+            with open(os.path.join(directory, name), "wb") as file:
+                file.write(column)
+        with open(os.path.join(directory, _METADATA_FILE), "w") as file:
+            json.dump({"rows": len(self), "byteorder": sys.byteorder,
+                       "columns": dict(COLUMNS)}, file)
+
+    @classmethod
+    def load(cls, directory, memory_map=True):
+        """ Returns the store saved in <directory> by save(). If <memory_map> is True, the columns
+        are memory mapped rather than read into memory, so opening even a huge store is instant, but
+        the store is read only. Otherwise rolls can be recorded in it just like in a new store.
+        """
+        with open(os.path.join(directory, _METADATA_FILE)) as file:
+            metadata = json.load(file)
+        store = cls()
+        for name, typecode in COLUMNS:
+            path = os.path.join(directory, name)
+            if memory_map:
+                if metadata["byteorder"] != sys.byteorder:
+                    raise ValueError(f"Can't memory map {directory}, which was saved on a machine "
+                                     f"with a different byte order")
+                if metadata["rows"] == 0:
+                    continue
+                with open(path, "rb") as file:
+                    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                store._mmaps.append(mapped)
+                store.columns[name] = memoryview(mapped).cast(typecode)
+            else:
+                with open(path, "rb") as file:
+                    store.columns[name].frombytes(file.read())
+                if metadata["byteorder"] != sys.byteorder:
+                    store.columns[name].byteswap()
+        store.read_only = memory_map
+        if not memory_map:
+            for row, table in enumerate(store.columns["table"]):
+                if store.columns["roll"][row]:
+                    store._table_rows.setdefault(table, array.array("Q")).append(row)
+        return store
+
+    def close(self):
+        """ Stops recording every attached dice, and unmaps the columns of a memory mapped store.
+        """
+        for table in list(self._attached):
+            self.detach(table)
+        for name, typecode in COLUMNS:
+            if isinstance(self.columns[name], memoryview):
+                self.columns[name].release()
+                self.columns[name] = array.array(typecode)
+        for mapped in self._mmaps:
+            mapped.close()
+        self._mmaps = []
+
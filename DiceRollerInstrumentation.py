@@ -0,0 +1,161 @@
+import functools
+import time
+
+import DiceRoller
+
+# Methods of GamblersFallacyDice (and so of CatanDice) which are timed while instrumentation is
+#  enabled, mapped to what they're reported as. Times are inclusive, so rendering includes the
+#  update_probabilities() it calls, for example.
+INSTRUMENTED_METHODS = {
+    "update_probabilities": "update_probabilities",
+    "roll_without_updating_frequencies": "sampling",
+    "_push_undo_state": "history_push",
+    "undo": "history_pop",
+    "redo": "history_redo",
+    "_add_roll": "add_roll",
+    "_remove_roll": "remove_roll",
+    "__str__": "rendering",
+}
+
+# Methods of DiceRoller.TerminalRenderer (which run_catan() renders the dice with every turn) which
+#  are timed while instrumentation is enabled on the renderer, mapped to what they're reported as.
+#  They're recorded in the stats of the dice being rendered, alongside their own methods.
+INSTRUMENTED_RENDERER_METHODS = {
+    "render": "rendering",
+}
+
+# Maps each class to the instrumented subclass of it which enabled dice are switched to
+_instrumented_classes = {}
+
+
+class MethodStats:
+    """ The number of calls of an instrumented method, their total wall time, and a histogram of
+    their latencies.
+    """
+
+    def __init__(self):
+        """ Initializes the stats of a method which hasn't been called yet.
+        """
+        self.calls = 0
+        self.total_nanoseconds = 0
+        # Index i is the number of calls which took between 2**(i - 1) (inclusive) and 2**i
+        #  (exclusive) nanoseconds, so that a few bytes cover every latency from 1ns to minutes
+        self.histogram = []
+
+    def record(self, nanoseconds):
+        """ Records a call which took <nanoseconds>.
+        """
+        self.calls += 1
+        self.total_nanoseconds += nanoseconds
+        bucket = nanoseconds.bit_length()
+        if bucket >= len(self.histogram):
+            self.histogram.extend([0] * (bucket + 1 - len(self.histogram)))
+        self.histogram[bucket] += 1
+
+    def percentile(self, fraction):
+        """ Returns an upper bound in nanoseconds on the latency which <fraction> of the calls took
+        at most, at the resolution of the histogram (so within a factor of 2), or 0 if there were
+        no calls.
+        """
+        needed = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= needed:
+                return 2 ** bucket
+        return 0
+
+    def as_dict(self):
+        """ Returns these stats as a dictionary which can be serialized as JSON.
+        """
+        return {"calls": self.calls, "total_seconds": self.total_nanoseconds / 1e9,
+                "histogram": {2 ** bucket: count for bucket, count in enumerate(self.histogram)
+                              if count}}
+
+
+def _instrument(name, method):
+    """ Returns a version of <method> which records how long each call takes in the stats called
+    <name> of the dice it's called on.
+    """
+    @functools.wraps(method)
+    def instrumented(self, *args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.instrumentation[name].record(time.perf_counter_ns() - start)
+    return instrumented
+
+
+def instrumented_class(cls):
+    """ Returns the subclass of the dice class (or DiceRoller.TerminalRenderer) <cls> whose
+    instrumented methods are timed, creating it the first time it's asked for.
+    """
+    if cls not in _instrumented_classes:
+        is_renderer = issubclass(cls, DiceRoller.TerminalRenderer)
+        methods = INSTRUMENTED_RENDERER_METHODS if is_renderer else INSTRUMENTED_METHODS
+        namespace = {method: _instrument(name, getattr(cls, method))
+                     for method, name in methods.items()}
+        namespace["_uninstrumented_class"] = cls
+        if is_renderer:
+            # Renderers record their stats in those of the dice they render
+            namespace["instrumentation"] = property(lambda renderer: renderer.dice.instrumentation)
+        _instrumented_classes[cls] = type("Instrumented" + cls.__name__, (cls,), namespace)
+    return _instrumented_classes[cls]
+
+
+def enable(dice):
+    """ Starts timing the instrumented methods of the GamblersFallacyDice (or CatanDice) <dice>,
+    adding to any stats recorded by a previous enable(). <dice> can also be a
+    DiceRoller.TerminalRenderer, whose rendering is then timed in the stats of the dice it renders.
+    Works by switching the class of <dice> to an instrumented subclass, so dice which aren't
+    instrumented run exactly the same code as they would if this module didn't exist.
+    """
+    if not is_enabled(dice):
+        stats_holder = dice.dice if isinstance(dice, DiceRoller.TerminalRenderer) else dice
+        if not hasattr(stats_holder, "instrumentation"):
+            reset(stats_holder)
+        dice.__class__ = instrumented_class(type(dice))
+
+
+def disable(dice):
+    """ Stops timing the methods of <dice>. The stats recorded so far are kept for report().
+    """
+    if is_enabled(dice):
+        dice.__class__ = dice._uninstrumented_class
+
+
+def is_enabled(dice):
+    """ Returns whether the methods of <dice> are currently being timed.
+    """
+    return type(dice) in _instrumented_classes.values()
+
+
+def reset(dice):
+    """ Discards the stats recorded so far for <dice>.
+    """
+    dice.instrumentation = {name: MethodStats() for name in INSTRUMENTED_METHODS.values()}
+
+
+def stats(dice):
+    """ Returns a dictionary mapping the name of each instrumented method of <dice> which has been
+    called to its MethodStats.as_dict(), which can be serialized as JSON.
+    """
+    return {name: method_stats.as_dict()
+            for name, method_stats in getattr(dice, "instrumentation", {}).items()
+            if method_stats.calls}
+
+
+def report(dice):
+    """ Returns a well formatted string with a row for each instrumented method of <dice> which has
+    been called, showing its number of calls, total time, mean latency, and median and 99th
+    percentile latencies (as upper bounds from the histogram).
+    """
+    lines = ["method                   calls   total ms    mean us     p50 us     p99 us"]
+    for name, method_stats in getattr(dice, "instrumentation", {}).items():
+        if method_stats.calls:
+            lines.append("{0:20s} {1:9d} {2:10.3f} {3:10.3f} {4:10.3f} {5:10.3f}".format(
+                name, method_stats.calls, method_stats.total_nanoseconds / 1e6,
+                method_stats.total_nanoseconds / method_stats.calls / 1e3,
+                method_stats.percentile(0.5) / 1e3, method_stats.percentile(0.99) / 1e3))
+    return "\n".join(lines)
@@ -0,0 +1,233 @@
+import os
+import struct
+
+import DiceRoller
+
+# Version of the binary formats below. Bump whenever either format changes.
+FORMAT_VERSION = 1
+
+# A checkpoint file holds the complete state of a CatanDice: a header (magic, format version,
+#  number of players, aggressiveness, current player, max history or -1 for no limit, number of
+#  journal records the checkpoint already includes, number of rolls which can be undone, number of
+#  rolls which can be redone), followed by the frequencies of every roll, each player's number of
+#  7s, and the rolls which can be undone and redone, all as little endian unsigned integers.
+CHECKPOINT_MAGIC = b"CDCK"
+_CHECKPOINT_HEADER = struct.Struct("<4sHHdHiQII")
+# The most players, and the largest max history, which the headers above can hold
+MAX_PLAYERS = 0xFFFF
+MAX_HISTORY = 2 ** 31 - 1
+
+# A journal file holds a header (magic, format version, number of players, aggressiveness, max
+#  history or -1 for no limit), followed by one fixed size record (action code, roll) for every
+#  roll, undo and redo, in the order they happened.
+JOURNAL_MAGIC = b"CDJL"
+_JOURNAL_HEADER = struct.Struct("<4sHHdi")
+_JOURNAL_RECORD = struct.Struct("<BH")
+# Index i is the action with code i in journal records
+JOURNAL_ACTIONS = ("roll", "undo", "redo", "forget_history")
+_JOURNAL_ACTION_CODES = {action: code for code, action in enumerate(JOURNAL_ACTIONS)}
+
+
+def _pack_max_history(max_history):
+    """ Returns <max_history> in the form it's stored in headers, where -1 means no limit.
+    """
+    return -1 if max_history is None else max_history
+
+
+def _unpack_max_history(max_history):
+    """ Returns the max history stored in a header as <max_history>.
+    """
+    return None if max_history == -1 else max_history
+
+
+def _check_header(magic, version, expected_magic, path):
+    """ Raises a ValueError if the <magic> and format <version> read from the header of the file at
+    <path> aren't <expected_magic> and FORMAT_VERSION.
+    """
+    if magic != expected_magic:
+        kind = "checkpoint" if expected_magic == CHECKPOINT_MAGIC else "journal"
+        raise ValueError(f"{path} isn't a CatanDice {kind}")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {version}, but only version "
+                         f"{FORMAT_VERSION} is supported")
+
+
+def save_checkpoint(dice, path, journal_length=0):
+    """ Saves the complete state of the CatanDice <dice> to a checkpoint file at <path>, which is
+    replaced atomically so that a crash never leaves a partially written checkpoint behind.
+    <journal_length> is the number of records of the dice's journal (if it has one) which the
+    checkpoint already includes, so that load_catan_dice() knows which records to replay on top of
+    it.
+    """
+    header = _CHECKPOINT_HEADER.pack(
+        CHECKPOINT_MAGIC, FORMAT_VERSION, dice.num_players, dice.aggressiveness, dice.curr_player,
+        _pack_max_history(dice.max_history), journal_length, len(dice.undo_states),
+        len(dice.redo_states))
+    body = struct.pack(f"<{len(dice.frequencies)}I", *dice.frequencies.values()) + \
+        struct.pack(f"<{dice.num_players}I", *(dice.players_seven_counts[player]
+                                               for player in range(1, dice.num_players + 1))) + \
+        struct.pack(f"<{len(dice.undo_states)}H", *dice.undo_states) + \
+        struct.pack(f"<{len(dice.redo_states)}H", *dice.redo_states)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(header + body)
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(path, **options):
+    """ Returns a tuple (dice, journal_length) of the CatanDice saved in the checkpoint file at
+    <path>, and the number of journal records that checkpoint already includes.
+    <options> are passed on to CatanDice.__init__() (for choosing a sampler, for example).
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    (magic, version, num_players, aggressiveness, curr_player, max_history, journal_length,
+     num_undo_states, num_redo_states) = _CHECKPOINT_HEADER.unpack_from(data)
+    _check_header(magic, version, CHECKPOINT_MAGIC, path)
+    dice = DiceRoller.CatanDice(num_players, aggressiveness,
+                                max_history=_unpack_max_history(max_history), **options)
+    offset = _CHECKPOINT_HEADER.size
+    frequencies = struct.unpack_from(f"<{len(dice.frequencies)}I", data, offset)
+    offset += 4 * len(frequencies)
+    seven_counts = struct.unpack_from(f"<{num_players}I", data, offset)
+    offset += 4 * num_players
+    undo_states = struct.unpack_from(f"<{num_undo_states}H", data, offset)
+    offset += 2 * num_undo_states
+    redo_states = struct.unpack_from(f"<{num_redo_states}H", data, offset)
+    for roll, frequency in zip(dice.frequencies, frequencies):
+        dice._set_frequency(roll, frequency)
+    dice.players_seven_counts = dict(zip(range(1, num_players + 1), seven_counts))
+    dice.curr_player = curr_player
+    dice.undo_states.extend(undo_states)
+    dice.redo_states.extend(redo_states)
+    return dice, journal_length
+
+
+class CatanDiceJournal:
+    """ An append only journal of every roll, undo and redo of a CatanDice, saved to a file as it
+    happens. Recording an action is a single fixed size write, so it's cheap enough to do after
+    every roll, and the dice can be reconstructed from the journal (optionally on top of a
+    checkpoint) with load_catan_dice().
+    """
+
+    def __init__(self, path, dice, durable=False):
+        """ Opens (creating if necessary) the journal file at <path> for the CatanDice <dice>, and
+        starts recording its actions. If the file already exists, it must be the journal of <dice>
+        (for example, <dice> was loaded from it) and new records are appended to it. Raises a
+        ValueError if its header isn't that of a journal of dice with the same number of players,
+        aggressiveness and max history. A file too short to hold a header is only accepted if it's
+        the start of the header of <dice> (left by a crash while creating the journal), in which
+        case the header is written again.
+        If <durable> is True, every record is forced to disk before the action returns, rather than
+        just handed to the operating system, which survives power loss but is much slower.
+        """
+        self.path = path
+        self.durable = durable
+        header = _JOURNAL_HEADER.pack(JOURNAL_MAGIC, FORMAT_VERSION, dice.num_players,
+                                      dice.aggressiveness, _pack_max_history(dice.max_history))
+        existing_header = b""
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                existing_header = file.read(_JOURNAL_HEADER.size)
+        if len(existing_header) == _JOURNAL_HEADER.size:
+            magic, version, num_players, aggressiveness, max_history = \
+                _JOURNAL_HEADER.unpack(existing_header)
+            _check_header(magic, version, JOURNAL_MAGIC, path)
+            if (num_players, aggressiveness, _unpack_max_history(max_history)) != \
+                    (dice.num_players, dice.aggressiveness, dice.max_history):
+                raise ValueError(f"{path} is the journal of CatanDice({num_players}, "
+                                 f"{aggressiveness}, max_history="
+                                 f"{_unpack_max_history(max_history)}), not of these dice")
+        elif not header.startswith(existing_header):
+            raise ValueError(f"{path} isn't a CatanDice journal")
+        self._file = open(path, "ab")
+        if len(existing_header) < _JOURNAL_HEADER.size:
+            self._file.truncate(0)
+            self._file.write(header)
+            self._flush()
+        # Number of records in the journal file
+        self.length = (os.path.getsize(path) - _JOURNAL_HEADER.size) // _JOURNAL_RECORD.size
+        # Drops a partially written record left by a crash, so that new records line up
+        self._file.truncate(_JOURNAL_HEADER.size + self.length * _JOURNAL_RECORD.size)
+        self.dice = dice
+        dice.listeners.append(self)
+
+    def __call__(self, dice, action, roll):
+        """ Records that <action> happened to <dice> with <roll>. Called by the dice as one of its
+        listeners.
+        """
+        self._file.write(_JOURNAL_RECORD.pack(_JOURNAL_ACTION_CODES[action], roll or 0))
+        self.length += 1
+        self._flush()
+
+    def _flush(self):
+        """ Hands everything written so far to the operating system, and also forces it to disk if
+        self.durable is True.
+        """
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+
+    def checkpoint(self, path):
+        """ Saves a checkpoint of the dice to <path> which includes every record journaled so far,
+        so that loading doesn't have to replay them.
+        """
+        save_checkpoint(self.dice, path, journal_length=self.length)
+
+    def close(self):
+        """ Stops recording the dice's actions and closes the journal file.
+        """
+        self.dice.listeners.remove(self)
+        self._file.close()
+
+
+def read_journal(path):
+    """ Returns a tuple (num_players, aggressiveness, max_history, records) read from the journal
+    file at <path>, where records is a list of (action, roll) tuples in the order they happened.
+    A partially written record at the end of the file (from a crash while writing it) is ignored.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version, num_players, aggressiveness, max_history = _JOURNAL_HEADER.unpack_from(data)
+    _check_header(magic, version, JOURNAL_MAGIC, path)
+    num_records = (len(data) - _JOURNAL_HEADER.size) // _JOURNAL_RECORD.size
+    end = _JOURNAL_HEADER.size + num_records * _JOURNAL_RECORD.size
+    records = [(JOURNAL_ACTIONS[code], roll) for code, roll in
+               _JOURNAL_RECORD.iter_unpack(data[_JOURNAL_HEADER.size:end])]
+    return num_players, aggressiveness, _unpack_max_history(max_history), records
+
+
+def replay(dice, records):
+    """ Applies the (action, roll) <records> read from a journal to <dice>, in order, without
+    notifying its listeners (so replaying doesn't journal the records a second time).
+    """
+    for action, roll in records:
+        if action == "roll":
+            dice._record_roll(roll)
+        elif action == "undo":
+            dice.redo_states.append(dice.undo_states.pop())
+            dice._remove_roll(roll)
+        elif action == "redo":
+            dice._push_undo_state(dice.redo_states.pop())
+            dice._add_roll(roll)
+        else:
+            del dice.undo_states[:]
+            del dice.redo_states[:]
+
+
+def load_catan_dice(journal_path=None, checkpoint_path=None, **options):
+    """ Returns the CatanDice reconstructed from the checkpoint file at <checkpoint_path> and/or the
+    journal file at <journal_path>. With both, the journal records which came after the checkpoint
+    are replayed on top of it. With only a journal, every record is replayed on new dice.
+    At least one of <journal_path> and <checkpoint_path> must be given.
+    <options> are passed on to CatanDice.__init__() (for choosing a sampler, for example).
+    """
+    if checkpoint_path is not None:
+        dice, journal_length = load_checkpoint(checkpoint_path, **options)
+        if journal_path is not None and os.path.exists(journal_path):
+            replay(dice, read_journal(journal_path)[3][journal_length:])
+        return dice
+    num_players, aggressiveness, max_history, records = read_journal(journal_path)
+    dice = DiceRoller.CatanDice(num_players, aggressiveness, max_history=max_history, **options)
+    replay(dice, records)
+    return dice
@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import signal
+import sys
+
+import DiceRoller
+import DiceRollerPersistence
+
+# Longest request line (in bytes) a connection may send. A longer line gets an error response and
+#  the connection is closed, so one client can't make the server buffer unbounded amounts of data.
+MAX_LINE_LENGTH = 64 * 1024
+# Once this many bytes of responses are waiting to be sent on a connection, the server stops
+#  reading that connection's requests until the client catches up on reading its responses
+WRITE_BUFFER_LIMIT = 256 * 1024
+# Snapshots of table <table_id> are saved as checkpoints named SNAPSHOT_PREFIX + table_id +
+#  SNAPSHOT_SUFFIX
+SNAPSHOT_PREFIX = "table-"
+SNAPSHOT_SUFFIX = ".cdck"
+
+
+class Table:
+    """ A game hosted by a DiceServer: its CatanDice, and a lock which is held while the dice are
+    being used, so that nothing changes the dice while a snapshot of them is being saved.
+    """
+
+    def __init__(self, table_id, dice):
+        """ Initializes table number <table_id>, rolling the CatanDice <dice>.
+        """
+        self.table_id = table_id
+        self.dice = dice
+        self.lock = asyncio.Lock()
+
+
+class DiceServer:
+    """ Hosts many games of Catan at once, each at its own table with its own CatanDice, for clients
+    connected over a local socket. Clients send one JSON object per line, and get one JSON object
+    per line back for each, in the same order. Every request has an "op", which is one of:
+    "create": creates a table with "players" players and "aggressiveness" (and optionally
+    "max_history", see GamblersFallacyDice.__init__()), and responds with its "table" number.
+    "roll", "undo", "redo": does that on the dice of table number "table", and responds with the
+    "roll" that was rolled, undone or redone, the "player" who rolled it, and the "curr_player".
+    "state": responds with the state of the dice of table number "table" (see state()).
+    "close": closes table number "table", discarding its dice.
+    Every response has "ok", which is False if the request failed, along with an "error" message.
+    If a request has an "id", the response has the same "id".
+    """
+
+    def __init__(self, snapshot_directory=None, max_tables=None, dice_options=None):
+        """ Initializes a server with no tables, which isn't listening yet (see start()).
+        <snapshot_directory> is the directory snapshots of every table are saved to by snapshot()
+        (and so when the server shuts down), and loaded from by load_snapshots(), or None for never
+        saving snapshots.
+        <max_tables> is the most tables which can be open at once, or None for no limit.
+        <dice_options> is a dictionary of extra keyword arguments for the CatanDice of every table
+        (such as the sampler), or None for none.
+        """
+        self.snapshot_directory = snapshot_directory
+        self.max_tables = max_tables
+        self.dice_options = dice_options or {}
+        # Maps the number of each open table to its Table
+        self.tables = {}
+        self._next_table_id = 1
+        self._server = None
+        # The asyncio.StreamWriter of every connected client
+        self._writers = set()
+        # The task serving each connected client
+        self._client_tasks = set()
+
+    def load_snapshots(self):
+        """ Reopens every table saved in self.snapshot_directory, as it was when it was saved. Files
+        which aren't named like snapshots are ignored.
+        """
+        if self.snapshot_directory is None or not os.path.isdir(self.snapshot_directory):
+            return
+        for name in os.listdir(self.snapshot_directory):
+            table_id = name[len(SNAPSHOT_PREFIX):-len(SNAPSHOT_SUFFIX)]
+            if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX) and \
+                    table_id.isdecimal() and table_id.isascii():
+                table_id = int(table_id)
+                dice, _ = DiceRollerPersistence.load_checkpoint(
+                    os.path.join(self.snapshot_directory, name), **self.dice_options)
+                self.tables[table_id] = Table(table_id, dice)
+                self._next_table_id = max(self._next_table_id, table_id + 1)
+
+    def _snapshot_path(self, table_id):
+        """ Returns the path of the snapshot of table number <table_id>.
+        """
+        return os.path.join(self.snapshot_directory,
+                            f"{SNAPSHOT_PREFIX}{table_id}{SNAPSHOT_SUFFIX}")
+
+    async def snapshot(self):
+        """ Saves a snapshot of every open table to self.snapshot_directory. Each table is locked
+        while its snapshot is saved, in a worker thread so that the other tables keep being served.
+        A table whose snapshot can't be saved is reported on stderr and skipped, so that the other
+        tables are still saved. Returns a dictionary mapping the number of each such table to the
+        error message.
+        """
+        failures = {}
+        if self.snapshot_directory is None:
+            return failures
+        os.makedirs(self.snapshot_directory, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        for table in list(self.tables.values()):
+            async with table.lock:
+                # The table might have been closed while waiting for the lock
+                if self.tables.get(table.table_id) is not table:
+                    continue
+                try:
+                    await loop.run_in_executor(None, DiceRollerPersistence.save_checkpoint,
+                                               table.dice, self._snapshot_path(table.table_id))
+                except Exception as e:
+                    failures[table.table_id] = str(e)
+                    print(f"Couldn't save a snapshot of table {table.table_id}: {e}",
+                          file=sys.stderr)
+        return failures
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """ Starts listening for clients on the unix socket at <path>, or if it's None, on TCP
+        <host> and <port> (0 for any free port). Returns the asyncio.Server.
+        """
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve_client, path,
+                                                           limit=MAX_LINE_LENGTH)
+        else:
+            self._server = await asyncio.start_server(self._serve_client, host, port,
+                                                      limit=MAX_LINE_LENGTH)
+        return self._server
+
+    async def stop(self):
+        """ Stops listening for clients, disconnects every connected client (after it gets the
+        response to the request being handled, if any), and saves a snapshot of every open table.
+        """
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await asyncio.gather(*self._client_tasks, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        await self.snapshot()
+
+    async def _serve_client(self, reader, writer):
+        """ Responds to the requests of a connected client until it disconnects.
+        """
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER_LIMIT)
+        self._writers.add(writer)
+        task = asyncio.current_task()
+        self._client_tasks.add(task)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # The line was longer than MAX_LINE_LENGTH, so the rest of the stream can't
+                    #  be trusted to line up with requests any more
+                    writer.write(_encode({"ok": False, "error": "Request line too long"}))
+                    break
+                if not line:
+                    break
+                writer.write(_encode(await self.handle(line)))
+                # Only waits if the client isn't reading its responses, which stops reading its
+                #  requests until it does
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._client_tasks.discard(task)
+            writer.close()
+
+    async def handle(self, line):
+        """ Returns the response dictionary to the JSON request <line>.
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"ok": False, "error": "Request isn't valid JSON"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Request must be a JSON object"}
+        try:
+            if request.get("op") == "create":
+                response = self.create(request)
+            else:
+                table = self._table(request)
+                async with table.lock:
+                    response = self.apply(table, request)
+            response["ok"] = True
+        except ValueError as e:
+            response = {"ok": False, "error": str(e)}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def create(self, request):
+        """ Opens a new table as described by the "create" <request>, and returns the response.
+        Raises a ValueError if the request is invalid or there are already self.max_tables tables.
+        """
+        if self.max_tables is not None and len(self.tables) >= self.max_tables:
+            raise ValueError(f"Can't have more than {self.max_tables} tables open")
+        num_players = request.get("players")
+        aggressiveness = request.get("aggressiveness")
+        max_history = request.get("max_history")
+        if not isinstance(num_players, int) or isinstance(num_players, bool) or num_players < 1:
+            raise ValueError("players must be a positive integer")
+        # Any more couldn't be saved in snapshots
+        if num_players > DiceRollerPersistence.MAX_PLAYERS:
+            raise ValueError(f"players must be at most {DiceRollerPersistence.MAX_PLAYERS}")
+        # JSON allows Infinity and NaN, which would make every probability NaN
+        if not isinstance(aggressiveness, (int, float)) or isinstance(aggressiveness, bool) or \
+                not math.isfinite(aggressiveness) or aggressiveness < 0:
+            raise ValueError("aggressiveness must be a finite non-negative number")
+        if max_history is not None and (not isinstance(max_history, int) or
+                                        isinstance(max_history, bool) or max_history < 0):
+            raise ValueError("max_history must be a non-negative integer")
+        if max_history is not None and max_history > DiceRollerPersistence.MAX_HISTORY:
+            raise ValueError(f"max_history must be at most {DiceRollerPersistence.MAX_HISTORY}")
+        table_id = self._next_table_id
+        self._next_table_id += 1
+        self.tables[table_id] = Table(table_id, DiceRoller.CatanDice(
+            num_players, aggressiveness, max_history=max_history, **self.dice_options))
+        return {"table": table_id}
+
+    def _table(self, request):
+        """ Returns the open Table which <request> is for. Raises a ValueError if there isn't one.
+        """
+        table_id = request.get("table")
+        # Only integers can be table numbers, and other JSON values (such as lists) can't even be
+        #  looked up
+        table = self.tables.get(table_id) if isinstance(table_id, int) else None
+        if table is None:
+            raise ValueError(f"No open table {request.get('table')!r}")
+        return table
+
+    def apply(self, table, request):
+        """ Does the "roll", "undo", "redo", "state" or "close" <request> to <table>, and returns
+        the response. Raises a ValueError if it can't be done.
+        """
+        op = request.get("op")
+        dice = table.dice
+        if op == "roll":
+            player = dice.curr_player
+            return {"roll": dice.roll(), "player": player, "curr_player": dice.curr_player}
+        if op == "undo":
+            dice.undo()
+            return {"roll": dice.redo_states[-1], "player": dice.curr_player,
+                    "curr_player": dice.curr_player}
+        if op == "redo":
+            player = dice.curr_player
+            dice.redo()
+            return {"roll": dice.undo_states[-1], "player": player,
+                    "curr_player": dice.curr_player}
+        if op == "state":
+            return state(dice)
+        if op == "close":
+            del self.tables[table.table_id]
+            if self.snapshot_directory is not None and \
+                    os.path.exists(self._snapshot_path(table.table_id)):
+                os.remove(self._snapshot_path(table.table_id))
+            return {}
+        raise ValueError(f"Unknown op {op!r}")
+
+
+def state(dice):
+    """ Returns a dictionary describing the state of the CatanDice <dice>, which can be serialized
+    as JSON: the "curr_player", the "frequencies" of every roll other than 7, each player's number
+    of 7s in "sevens", the current player's "probabilities" of every roll, and whether the dice
+    "can_undo" and "can_redo".
+    """
+    return {"curr_player": dice.curr_player,
+            "frequencies": {roll: frequency for roll, frequency in dice.frequencies.items()
+                            if roll != 7},
+            "sevens": dice.players_seven_counts,
+            "probabilities": {roll: float(probability)
+                              for roll, probability in dice.probabilities.items()},
+            "can_undo": dice.can_undo(), "can_redo": dice.can_redo()}
+
+
+def _encode(response):
+    """ Returns the response dictionary <response> as a line of JSON, encoded as bytes.
+    """
+    return json.dumps(response, separators=(",", ":")).encode() + b"\n"
+
+
+async def serve(server, host="127.0.0.1", port=0, path=None):
+    """ Runs <server> (see DiceServer.start()) until the process gets SIGINT or SIGTERM, then stops
+    it, saving a snapshot of every table.
+    """
+    server.load_snapshots()
+    await server.start(host, port, path)
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in signal.SIGINT, signal.SIGTERM:
+        loop.add_signal_handler(signal_number, stopped.set)
+    await stopped.wait()
+    await server.stop()
+
+
+def main():
+    """ Runs a server with the options passed on the command line.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serves many concurrent games of Catan with CatanDice over a local socket, "
+                    "using one JSON object per line.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--unix", help="listen on the unix socket at this path instead of TCP")
+    parser.add_argument("--snapshots",
+                        help="directory tables are saved to on shutdown and loaded from on start")
+    parser.add_argument("--max-tables", type=int, default=None)
+    parser.add_argument("--sampler", choices=DiceRoller.SAMPLERS, default="linear")
+    args = parser.parse_args()
+    server = DiceServer(args.snapshots, args.max_tables, {"sampler": args.sampler})
+    asyncio.run(serve(server, args.host, args.port, args.unix))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import array
+import functools
+import operator
+import time
+
+import DiceRoller
+
+
+class MultiSessionSimulator:
+    """ Simulates many independent sessions, each of which behaves exactly like its own
+    GamblersFallacyDice adjusting additively, stepping all of them in lockstep: each step rolls
+    every session's dice once. All the sessions' frequencies are stored in a single flat array, row
+    by row, and a step draws every session's roll from one batch of random numbers, working
+    through each session's row without building any dictionaries or per-session objects.
+    """
+
+    def __init__(self, num_sessions, num_dice, num_sides, aggressiveness, rng=None):
+        """ Initializes <num_sessions> sessions, each with dice as if created by
+        GamblersFallacyDice(<num_dice>, <num_sides>, <aggressiveness>, adjusting="additive") and
+        never rolled. Raises a ValueError if DiceRoller.USE_MULTIPLICATIVE_ADJUSTING is True or if
+        something else has been registered as the additive adjusting, since sessions only ever
+        adjust with DiceRoller.adjust_additive().
+        <num_sessions>, <num_dice> and <num_sides> must all be positive integers.
+        <aggressiveness> must be a non-negative number.
+        <rng> is the random number generator used for rolling, which must be a DiceRoller.DiceRNG,
+        or None for a new one seeded with fresh entropy.
+        """
+        if DiceRoller.USE_MULTIPLICATIVE_ADJUSTING or \
+                DiceRoller.ADJUSTINGS["additive"] is not DiceRoller.adjust_additive:
+            raise ValueError("MultiSessionSimulator can only adjust probabilities with "
+                             "DiceRoller.adjust_additive()")
+        self.num_sessions = num_sessions
+        self.aggressiveness = aggressiveness
+        self.rng = rng if rng is not None else DiceRoller.DiceRNG()
+        self.min_roll = num_dice
+        self.normal_probabilities = DiceRoller.normal_distribution(num_dice,
+                                                                   num_sides).probabilities
+        self.num_rolls = len(self.normal_probabilities)
+        # Row s (the num_rolls entries starting at s * num_rolls) holds the normal probabilities,
+        #  repeated once per session so that the whole array can be zipped with self.frequencies
+        self._normal = list(self.normal_probabilities.values()) * num_sessions
+        # Row s (the num_rolls entries starting at s * num_rolls) holds session s's frequencies,
+        #  where index i of a row is for roll min_roll + i
+        self.frequencies = array.array("q", bytes(8 * num_sessions * self.num_rolls))
+        # Since every session rolls once per step, this is also the sum of every session's row of
+        #  frequencies
+        self.num_steps = 0
+
+    def session_frequencies(self, session):
+        """ Returns a dictionary mapping each possible roll to the number of times it has been
+        rolled in session number <session>, like GamblersFallacyDice.frequencies.
+        <session> must be an integer in [0, self.num_sessions).
+        """
+        start = session * self.num_rolls
+        return dict(zip(self.normal_probabilities,
+                        self.frequencies[start:start + self.num_rolls]))
+
+    def _weights(self):
+        """ Returns a flat list of every session's additively adjusted probabilities (clamped to 0),
+        laid out like self.frequencies but not yet normalized. Performs the same floating point
+        operations in the same order as GamblersFallacyDice.update_probabilities(), so dividing
+        each session's row by its sum (added up from left to right) gives identical probabilities.
+        """
+        normal = self._normal
+        if self.num_steps == 0:
+            return normal
+        aggressiveness = self.aggressiveness
+        num_steps = self.num_steps
+        weights = [normal_probability - aggressiveness * (frequency / num_steps -
+                                                          normal_probability)
+                   for frequency, normal_probability in zip(self.frequencies, normal)]
+        return [0 if weight < 0 else weight for weight in weights]
+
+    def adjusted_probabilities(self):
+        """ Returns a flat list of every session's current probabilities, laid out like
+        self.frequencies, identical to the ones GamblersFallacyDice.update_probabilities() computes.
+        """
+        if self.num_steps == 0:
+            return list(self._normal)
+        num_rolls = self.num_rolls
+        weights = self._weights()
+        probabilities = []
+        for start in range(0, len(weights), num_rolls):
+            session_weights = weights[start:start + num_rolls]
+            total = functools.reduce(operator.add, session_weights, 0)
+            probabilities.extend([weight / total for weight in session_weights])
+        return probabilities
+
+    def step(self):
+        """ Rolls every session's dice once, and returns an array of the rolls, where index s is
+        session s's roll.
+        """
+        num_rolls = self.num_rolls
+        min_roll = self.min_roll
+        rolls = array.array("H" if min_roll + num_rolls <= 0xFFFF else "L")
+        frequencies = self.frequencies
+        num_steps = self.num_steps
+        weights = self._weights()
+        # Before any rolls, the normal probabilities are used as they are, and dividing by 1
+        #  changes nothing
+        total = 1
+        for start, rand in zip(range(0, len(frequencies), num_rolls),
+                               self.rng.uniforms(self.num_sessions)):
+            session_weights = weights[start:start + num_rolls]
+            if num_steps:
+                total = functools.reduce(operator.add, session_weights, 0)
+            # Same sampling as GamblersFallacyDice.roll_without_updating_frequencies(), dividing
+            #  each weight by the total only once the walk reaches it
+            cumulative = 0
+            index = num_rolls - 1
+            for roll_index, weight in enumerate(session_weights):
+                cumulative += weight / total
+                if rand < cumulative:
+                    index = roll_index
+                    break
+            frequencies[start + index] += 1
+            rolls.append(min_roll + index)
+        self.num_steps += 1
+        return rolls
+
+    def run(self, num_steps):
+        """ Steps every session <num_steps> times, and returns a dictionary containing the number
+        of sessions, the number of steps, the number of seconds it took, and the number of session
+        rolls per second.
+        <num_steps> must be a positive integer.
+        """
+        start = time.perf_counter()
+        for _ in range(num_steps):
+            self.step()
+        seconds = time.perf_counter() - start
+        return {"sessions": self.num_sessions, "steps": num_steps, "seconds": seconds,
+                "sessions_per_second": self.num_sessions * num_steps / seconds}
+
+
+if __name__ == "__main__":
+    for num_sessions in 100, 1000, 10000:
+        simulator = MultiSessionSimulator(num_sessions, num_dice=2, num_sides=6,
+                                          aggressiveness=15)
+        print(simulator.run(num_steps=20))
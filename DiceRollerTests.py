@@ -1,4 +1,24 @@
+import asyncio
+import collections
+import contextlib
+import fractions
+import io
+import json
+import os
+import pickle
+import sys
+import tempfile
+
 import DiceRoller
+import DiceRollerAnalysis
+import DiceRollerBenchmarks
+import DiceRollerEvents
+import DiceRollerHistory
+import DiceRollerInstrumentation
+import DiceRollerPersistence
+import DiceRollerServer
+import DiceRollerSimulation
+import DiceRollerTuning
 
 # TODO: Figure out some Python testing utility to use in the future, instead of doing a lot of this
 #  stuff manually. Actually, probably do that before I finish implementing the rest of these tests
@@ -73,6 +93,213 @@ def dice_sum_probability_test():
         num_failed += 1
 
 
+def dice_sum_counts_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # 4 dice 4 faces
+    expected = [1, 4, 10, 20, 31, 40, 44, 40, 31, 20, 10, 4, 1]
+    actual = DiceRoller.dice_sum_counts(4, 4)
+    if actual != expected:
+        print("dice_sum_counts_test: dice_sum_counts(4, 4)")
+        print("Expected:", expected, "Actual:", actual)
+        failed = True
+
+    # 200 dice 6 faces, which has far too many permutations to be counted with floats
+    actual = DiceRoller.dice_sum_counts(200, 6)
+    if sum(actual) != 6**200 or len(actual) != 1001 or actual[0] != 1 or actual[1] != 200:
+        print("dice_sum_counts_test: dice_sum_counts(200, 6)")
+        print("Expected: 1001 counts summing to 6**200, starting with 1, 200")
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def normal_distribution_cache_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    cache = DiceRoller.NormalDistributionCache(max_size=2)
+    first = cache.get(2, 6)
+    second = cache.get(2, 6)
+    if first is not second or cache.info() != {"hits": 1, "misses": 1, "size": 1, "max_size": 2}:
+        print("normal_distribution_cache_test: cache.get(2, 6) twice")
+        print("Expected: the same distribution both times, 1 hit and 1 miss. Actual:", cache.info())
+        failed = True
+    if not floats_equal_up_to_float_threshold(first.cumulative[-1], 1) or \
+            not floats_equal_up_to_float_threshold(first.cumulative[5], 21/36):
+        print("normal_distribution_cache_test: cache.get(2, 6).cumulative")
+        print("Expected: 21/36 at index 5 and 1 at the end. Actual:", first.cumulative)
+        failed = True
+
+    # (2, 6) is the least recently used when (3, 6) is added, so it gets evicted
+    cache.get(1, 6)
+    cache.get(3, 6)
+    cache.get(1, 6)
+    if cache.info() != {"hits": 2, "misses": 3, "size": 2, "max_size": 2}:
+        print("normal_distribution_cache_test: cache.get() on 3 configurations with max_size 2")
+        print("Expected: 2 hits, 3 misses, size 2. Actual:", cache.info())
+        failed = True
+
+    # Dice share everything computed from their normal distribution, including the exact counts,
+    #  rather than computing it again for every instance
+    dice = DiceRoller.GamblersFallacyDice(3, 6, 10)
+    other_dice = DiceRoller.GamblersFallacyDice(3, 6, 10, exact=True)
+    if dice._normal_counts is not other_dice._normal_counts or \
+            dice._multiplicative_offsets is not other_dice._multiplicative_offsets or \
+            list(dice._normal_counts) != DiceRoller.dice_sum_counts(3, 6):
+        print("normal_distribution_cache_test: counts and offsets of two GamblersFallacyDice(3, 6)")
+        print("Expected: the same shared tuples of", DiceRoller.dice_sum_counts(3, 6),
+              "Actual:", dice._normal_counts, other_dice._normal_counts)
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def alias_table_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    probabilities = [1/36, 2/36, 3/36, 4/36, 5/36, 6/36, 5/36, 4/36, 3/36, 2/36, 1/36]
+    acceptances, aliases = DiceRoller.alias_table(probabilities)
+    # Each index is picked with probability 1/len(probabilities), then either kept or replaced
+    #  with its alias.
+    implied = [acceptance / len(probabilities) for acceptance in acceptances]
+    for index, alias in enumerate(aliases):
+        implied[alias] += (1 - acceptances[index]) / len(probabilities)
+    for probability, implied_probability in zip(probabilities, implied):
+        if not floats_equal_up_to_float_threshold(probability, implied_probability):
+            print(f"alias_table_test: alias_table({probabilities})")
+            print("Expected implied probabilities:", probabilities, "Actual:", implied)
+            failed = True
+            break
+
+    try:
+        DiceRoller.GamblersFallacyDice(2, 6, 8, sampler="quantum")
+        print('alias_table_test: GamblersFallacyDice(2, 6, 8, sampler="quantum")')
+        print("Expected: ValueError, Actual: no exception")
+        failed = True
+    except ValueError:
+        pass
+
+    if failed:
+        num_failed += 1
+
+
+def samplers_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    def implied_probabilities(dice):
+        # The probabilities of the rolls the dice's current sampling table samples
+        table = dice._current_sampling_table()
+        if dice.sampler == "bisect":
+            return [cumulative - previous for previous, cumulative in zip((0,) + table, table)]
+        acceptances, aliases = table
+        implied = [acceptance / len(acceptances) for acceptance in acceptances]
+        for index, alias in enumerate(aliases):
+            implied[alias] += (1 - acceptances[index]) / len(acceptances)
+        return implied
+
+    for sampler in "bisect", "alias":
+        dice = DiceRoller.GamblersFallacyDice(3, 6, 10, sampler=sampler, rng=DiceRoller.DiceRNG(9))
+        for roll in 10, 10, 11, 10, 3, 9, 12, 10:
+            dice._add_roll(roll)
+        # The rolls sampled with the table must follow the probabilities
+        num_samples = 40000
+        counts = collections.Counter(dice.roll_without_updating_frequencies()
+                                     for _ in range(num_samples))
+        error = max(abs(counts[roll] / num_samples - probability)
+                    for roll, probability in dice.probabilities.items())
+        if error > 0.01 or counts[3] or counts[10]:
+            print(f"samplers_test: {num_samples} samples of 3d6 with sampler {sampler!r}")
+            print("Expected:", dice.probabilities, "Actual:",
+                  {roll: count / num_samples for roll, count in sorted(counts.items())})
+            failed = True
+
+        # After a roll the table must be rebuilt for the new probabilities
+        table = dice._current_sampling_table()
+        dice.roll()
+        error = max(abs(implied - probability) for implied, probability in
+                    zip(implied_probabilities(dice), dice.probabilities.values()))
+        if dice._current_sampling_table() is table or error > 1e-12:
+            print(f"samplers_test: sampling table of 3d6 with sampler {sampler!r} after a roll")
+            print("Expected: a new table for", dice.probabilities, "Actual:",
+                  implied_probabilities(dice))
+            failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def dice_rng_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    rng = DiceRoller.DiceRNG(42)
+    first_children = rng.spawn(2)
+    rng.random()
+    second_children = rng.spawn(1)
+    streams = [child.uniforms(5).tolist() for child in first_children + second_children]
+    # Spawning again from the same seed must reproduce the same streams, regardless of how many
+    #  random numbers the parent has generated
+    recreated = DiceRoller.DiceRNG(42).spawn(3)
+    if streams != [child.uniforms(5).tolist() for child in recreated] or \
+            len(set(map(tuple, streams))) != 3:
+        print("dice_rng_test: DiceRNG(42).spawn()")
+        print("Expected: 3 different reproducible streams, Actual:", streams)
+        failed = True
+
+    unpickled = pickle.loads(pickle.dumps(first_children[0]))
+    if unpickled.uniforms(5).tolist() != first_children[0].uniforms(5).tolist() or \
+            unpickled.spawn_key != (0,):
+        print("dice_rng_test: pickling a spawned DiceRNG")
+        print("Expected: the same stream and spawn key after unpickling")
+        failed = True
+
+    # Buffers of random numbers must hold exactly the numbers random() would have returned
+    num_uniforms = 2 * DiceRoller.UNIFORM_BUFFER_SIZE + 3
+    buffers = list(DiceRoller.DiceRNG(7).uniform_buffers(num_uniforms))
+    generator = DiceRoller.DiceRNG(7)
+    expected = [generator.random() for _ in range(num_uniforms)]
+    if [rand for buffer in buffers for rand in buffer] != expected or \
+            max(map(len, buffers)) > DiceRoller.UNIFORM_BUFFER_SIZE:
+        print(f"dice_rng_test: DiceRNG(7).uniform_buffers({num_uniforms})")
+        print("Expected: the numbers random() returns, in buffers of at most",
+              DiceRoller.UNIFORM_BUFFER_SIZE)
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
 def normalize_test():
     """ Returns boolean representing whether test passed or not. Prints results only if it fails.
     Increments num_tests no matter what, increments num_failed iff it fails.
@@ -190,6 +417,1243 @@ def set_negative_values_to_0_test():
         num_failed += 1
 
 
+def additive_adjustment_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # Adjusting the frequencies as sequences must give exactly the same probabilities as adjusting
+    #  them through dictionaries, including when probabilities get clamped to 0
+    for num_dice, num_sides, aggressiveness in (3, 6, 10), (5, 20, 40):
+        dice = DiceRoller.GamblersFallacyDice(num_dice, num_sides, aggressiveness,
+                                              rng=DiceRoller.DiceRNG(0))
+        for i in range(200):
+            dice.roll()
+            if i % 20 == 19:
+                dice.undo()
+                dice.undo()
+                dice.redo()
+            expected = {}
+            for roll, fraction_of_rolls in DiceRoller.normalized(dice.frequencies).items():
+                expected[roll] = dice.normal_probabilities[roll] - \
+                    aggressiveness * (fraction_of_rolls - dice.normal_probabilities[roll])
+            DiceRoller.set_negative_values_to_0(expected)
+            DiceRoller.normalize(expected)
+            if dice.probabilities != expected:
+                print(f"additive_adjustment_test: roll {i} of GamblersFallacyDice({num_dice}, "
+                      f"{num_sides}, {aggressiveness})")
+                print("Expected:", expected, "Actual:", dice.probabilities)
+                failed = True
+                break
+
+    # The frequencies can only be changed through the dice, which keep their total up to date
+    try:
+        dice.frequencies[7] += 5
+        print("additive_adjustment_test: dice.frequencies[7] += 5")
+        print("Expected: TypeError, Actual: no error")
+        failed = True
+    except TypeError:
+        pass
+
+    if failed:
+        num_failed += 1
+
+
+def incremental_dice_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # With verify_incremental, any disagreement with a full recomputation raises a RuntimeError
+    try:
+        dice = DiceRoller.GamblersFallacyDice(3, 6, 10, incremental=True, verify_incremental=True)
+        catan_dice = DiceRoller.CatanDice(3, 15, incremental=True, verify_incremental=True)
+        for each_dice in dice, catan_dice:
+            for _ in range(200):
+                each_dice.roll()
+            for _ in range(20):
+                each_dice.undo()
+            for _ in range(10):
+                each_dice.redo()
+    except RuntimeError as e:
+        print("incremental_dice_test: 200 rolls, 20 undos and 10 redos on incremental 3d6 and",
+              "CatanDice")
+        print("Expected: no RuntimeError, Actual:", e)
+        failed = True
+
+    # The rolls actually sampled by rejection sampling must follow the probabilities, with each
+    #  sampler proposing the rolls
+    for sampler in DiceRoller.SAMPLERS:
+        dice = DiceRoller.GamblersFallacyDice(3, 6, 10, incremental=True, sampler=sampler,
+                                              rng=DiceRoller.DiceRNG(4))
+        for roll in 10, 10, 11, 10, 3, 9, 12, 10:
+            dice._add_roll(roll)
+        num_samples = 40000
+        counts = collections.Counter(dice.roll_without_updating_frequencies()
+                                     for _ in range(num_samples))
+        error = max(abs(counts[roll] / num_samples - probability)
+                    for roll, probability in dice.probabilities.items())
+        if error > 0.01 or counts[3] or counts[10]:
+            print(f"incremental_dice_test: {num_samples} samples of incremental 3d6 with sampler "
+                  f"{sampler!r}")
+            print("Expected:", dice.probabilities, "Actual:",
+                  {roll: count / num_samples for roll, count in sorted(counts.items())})
+            failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def lazy_probabilities_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # Printing and then rolling, like run_catan() does, must only compute each state's
+    #  probabilities once, as must changing the state in any other way
+    dice = DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(5))
+    for _ in range(20):
+        str(dice)
+        dice.probabilities
+        dice.roll()
+    str(dice)
+    dice.undo()
+    str(dice)
+    dice.redo()
+    dice.aggressiveness = 10
+    dice.roll()
+    # The 20 states after rolling, the undone state, and the redone state with the new
+    #  aggressiveness (the initial probabilities are the normal ones, which don't need computing)
+    expected = 20 + 1 + 1
+    if dice.num_probability_updates != expected:
+        print("lazy_probabilities_test: 20 prints and rolls, undo, redo, new aggressiveness, roll")
+        print("Expected num_probability_updates:", expected,
+              "Actual:", dice.num_probability_updates)
+        failed = True
+
+    # The probabilities must be those of the current state, even when it changed without rolling
+    fresh_dice = DiceRoller.CatanDice(3, 10)
+    for roll, frequency in dice.frequencies.items():
+        fresh_dice._set_frequency(roll, frequency)
+    if dice.probabilities != fresh_dice.probabilities:
+        print("lazy_probabilities_test: probabilities after changing the aggressiveness to 10")
+        print("Expected:", fresh_dice.probabilities, "Actual:", dice.probabilities)
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def two_six_sided_fast_path_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # The unrolled 2d6 routines must give exactly the same probabilities and rolls as the general
+    #  ones, including when probabilities get clamped to 0
+    for aggressiveness in 0, 5, 15, 60:
+        fast_dice = DiceRoller.CatanDice(3, aggressiveness, rng=DiceRoller.DiceRNG(7))
+        general_dice = DiceRoller.CatanDice(3, aggressiveness, rng=DiceRoller.DiceRNG(7))
+        general_dice._two_six_sided = False
+        for i in range(300):
+            expected = general_dice.roll()
+            actual = fast_dice.roll()
+            if actual != expected or fast_dice.probabilities != general_dice.probabilities:
+                print(f"two_six_sided_fast_path_test: roll {i} of CatanDice(3, {aggressiveness})")
+                print("Expected:", expected, general_dice.probabilities)
+                print("Actual:", actual, fast_dice.probabilities)
+                failed = True
+                break
+
+    if failed:
+        num_failed += 1
+
+
+def exact_dice_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # Worked out by hand: after rolling a 1 on a 2 sided die with an aggressiveness of 1, the
+    #  adjusted probabilities are 0.5 - (1 - 0.5) = 0 and 0.5 - (0 - 0.5) = 1
+    dice = DiceRoller.GamblersFallacyDice(1, 2, 1, exact=True)
+    dice._add_roll(1)
+    expected = {1: 0, 2: 1}
+    if dice.probabilities != expected or dice.roll() != 2:
+        print("exact_dice_test: GamblersFallacyDice(1, 2, 1, exact=True) after rolling a 1")
+        print("Expected:", expected, "Actual:", dice.probabilities)
+        failed = True
+
+    # Exact probabilities must sum to exactly 1, and agree with the floating point ones (up to
+    #  their rounding errors) in the same state
+    for num_dice, num_sides, aggressiveness in (2, 6, 15), (3, 6, 0.1), (5, 20, 8):
+        exact_dice = DiceRoller.GamblersFallacyDice(num_dice, num_sides, aggressiveness,
+                                                    exact=True, rng=DiceRoller.DiceRNG(8))
+        dice = DiceRoller.GamblersFallacyDice(num_dice, num_sides, aggressiveness)
+        for _ in range(200):
+            dice._add_roll(exact_dice.roll())
+        error = max(abs(probability - dice.probabilities[roll])
+                    for roll, probability in exact_dice.probabilities.items())
+        if sum(exact_dice.probabilities.values()) != 1 or error > 1e-12:
+            print(f"exact_dice_test: GamblersFallacyDice({num_dice}, {num_sides}, "
+                  f"{aggressiveness}, exact=True) after 200 rolls")
+            print("Sum of probabilities:", sum(exact_dice.probabilities.values()),
+                  "largest difference from floating point:", error)
+            failed = True
+
+    # Even before any rolls
+    dice = DiceRoller.GamblersFallacyDice(2, 6, 15, exact=True)
+    if dice.probabilities[2] != fractions.Fraction(1, 36):
+        print("exact_dice_test: initial probability of 2 of GamblersFallacyDice(2, 6, 15, "
+              "exact=True)")
+        print("Expected:", fractions.Fraction(1, 36), "Actual:", repr(dice.probabilities[2]))
+        failed = True
+    for dice in (DiceRoller.GamblersFallacyDice(3, 4, 2, exact=True),
+                 DiceRoller.CatanDice(3, 15, exact=True)):
+        if not all(isinstance(probability, fractions.Fraction)
+                   for probability in dice.probabilities.values()):
+            print(f"exact_dice_test: initial probabilities of exact {type(dice).__name__} aren't "
+                  "all Fractions")
+            print("Actual:", dice.probabilities)
+            failed = True
+
+    try:
+        DiceRoller.CatanDice(3, 15, incremental=True, exact=True)
+        print("exact_dice_test: CatanDice(3, 15, incremental=True, exact=True)")
+        print("Expected: ValueError, Actual: no error")
+        failed = True
+    except ValueError:
+        pass
+
+    if failed:
+        num_failed += 1
+
+
+def multiplicative_engine_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # The dedicated multiplicative engine must agree with the multiplicative adjusting selected by
+    #  USE_MULTIPLICATIVE_ADJUSTING (up to rounding errors), without touching the frequencies
+    for num_dice, num_sides, aggressiveness in (2, 6, 15), (3, 4, 0.5), (5, 20, 3):
+        dice = DiceRoller.GamblersFallacyDice(num_dice, num_sides, aggressiveness,
+                                              adjusting="multiplicative",
+                                              rng=DiceRoller.DiceRNG(21))
+        for _ in range(200):
+            dice.roll()
+        frequencies = dice.frequencies.copy()
+        probabilities = dice.probabilities
+        # The flag is switched on after the dice are created, which must work too
+        global_dice = DiceRoller.GamblersFallacyDice(num_dice, num_sides, aggressiveness)
+        DiceRoller.USE_MULTIPLICATIVE_ADJUSTING = True
+        try:
+            for roll, frequency in frequencies.items():
+                for _ in range(frequency):
+                    global_dice._add_roll(roll)
+            expected = global_dice.probabilities
+        finally:
+            DiceRoller.USE_MULTIPLICATIVE_ADJUSTING = False
+        error = max(abs(probability - expected[roll]) for roll, probability in
+                    probabilities.items())
+        if error > 1e-12 or dice.frequencies != frequencies:
+            print(f"multiplicative_engine_test: GamblersFallacyDice({num_dice}, {num_sides}, "
+                  f"{aggressiveness}, adjusting='multiplicative') after 200 rolls")
+            print("Largest difference from USE_MULTIPLICATIVE_ADJUSTING:", error,
+                  "frequencies unchanged:", dice.frequencies == frequencies)
+            failed = True
+
+    # Dice adjusting each way can be used side by side, whatever the global flag says
+    additive = DiceRoller.CatanDice(3, 15, adjusting="additive")
+    multiplicative = DiceRoller.CatanDice(3, 15, adjusting="multiplicative")
+    for roll in 8, 8, 6, 9:
+        additive._add_roll(roll)
+        multiplicative._add_roll(roll)
+    if additive.probabilities[8] != 0 or not 0 < multiplicative.probabilities[8] < 5/36:
+        print("multiplicative_engine_test: CatanDice(3, 15) after rolling 8, 8, 6, 9")
+        print("Expected: additive 8 probability 0 and multiplicative between 0 and 5/36, Actual:",
+              additive.probabilities[8], multiplicative.probabilities[8])
+        failed = True
+
+    for options in {"adjusting": "geometric"}, {"adjusting": "multiplicative", "exact": True}:
+        try:
+            DiceRoller.GamblersFallacyDice(2, 6, 15, **options)
+            print(f"multiplicative_engine_test: GamblersFallacyDice(2, 6, 15, **{options})")
+            print("Expected: ValueError, Actual: no error")
+            failed = True
+        except ValueError:
+            pass
+
+    if failed:
+        num_failed += 1
+
+
+def adjusting_strategies_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # The dice compute the additive and multiplicative strategies in place, which must give
+    #  exactly the same probabilities as the strategies themselves
+    for adjusting in "additive", "multiplicative":
+        for num_dice, num_sides in (2, 6), (3, 6):
+            dice = DiceRoller.GamblersFallacyDice(num_dice, num_sides, 4, adjusting=adjusting,
+                                                  rng=DiceRoller.DiceRNG(22))
+            for _ in range(100):
+                dice.roll()
+            weights = DiceRoller.ADJUSTINGS[adjusting](tuple(dice.frequencies.values()),
+                                                       tuple(dice.normal_probabilities.values()),
+                                                       dice.sum_of_frequencies, 4)
+            # Summed like the dice do, since the builtin sum() compensates for rounding errors in
+            #  some versions of Python
+            expected = [weight / DiceRoller._sum(weights) for weight in weights]
+            if list(dice.probabilities.values()) != expected:
+                print(f"adjusting_strategies_test: ADJUSTINGS[{adjusting!r}] after 100 rolls of "
+                      f"{num_dice}d{num_sides}")
+                print("Expected:", expected, "Actual:", list(dice.probabilities.values()))
+                failed = True
+
+    # Worked out by hand from old_run_catan(): after player 1 rolls an 8 and player 2 rolls a 6,
+    #  R = 1 / (5/36) = 7.2, so 7 (which player 1 hasn't rolled) has a deficit of 6/36 * 7.2 = 1.2
+    #  out of a total of 26/36 * 7.2 = 5.2, while 6 and 8 have none
+    dice = DiceRoller.CatanDice(2, 15, adjusting="r_ratio")
+    dice._add_roll(8)
+    dice._add_roll(6)
+    expected = {6: 0.3 * 5/36, 7: 0.7 * 1.2 / 5.2 + 0.3 * 6/36, 8: 0.3 * 5/36}
+    if any(abs(dice.probabilities[roll] - probability) > 1e-12
+           for roll, probability in expected.items()):
+        print("adjusting_strategies_test: CatanDice(2, 15, adjusting='r_ratio') after 8, 6")
+        print("Expected:", expected, "Actual:", dice.probabilities)
+        failed = True
+
+    DiceRoller.register_adjusting("normal_for_testing",
+                                  lambda frequencies, normal, total, aggressiveness: list(normal))
+    try:
+        dice = DiceRoller.GamblersFallacyDice(2, 6, 15, adjusting="normal_for_testing")
+        dice.roll()
+        if any(abs(dice.probabilities[roll] - probability) > 1e-12
+               for roll, probability in dice.normal_probabilities.items()):
+            print("adjusting_strategies_test: registered strategy returning normal probabilities")
+            print("Expected:", dict(dice.normal_probabilities), "Actual:", dice.probabilities)
+            failed = True
+        DiceRoller.register_adjusting("additive", DiceRoller.adjust_additive)
+        print("adjusting_strategies_test: register_adjusting('additive', ...)")
+        print("Expected: ValueError, Actual: no error")
+        failed = True
+    except ValueError:
+        pass
+    finally:
+        del DiceRoller.ADJUSTINGS["normal_for_testing"]
+
+    # Replacing a built in strategy must change how dice adjusting that way (including by default)
+    #  compute their probabilities, including dice which already computed (and cached) their
+    #  probabilities and previews with the old strategy
+    existing_dice = DiceRoller.GamblersFallacyDice(3, 6, 15, adjusting="r_ratio")
+    existing_dice._add_roll(10)
+    existing_dice.probabilities
+    existing_dice.preview([10])
+    DiceRoller.register_adjusting("additive",
+                                  lambda frequencies, normal, total, aggressiveness: list(normal),
+                                  replace=True)
+    DiceRoller.register_adjusting("r_ratio",
+                                  lambda frequencies, normal, total, aggressiveness: list(normal),
+                                  replace=True)
+    try:
+        for dice in DiceRoller.CatanDice(3, 15), DiceRoller.GamblersFallacyDice(3, 6, 15):
+            dice._add_roll(10)
+            if any(abs(dice.probabilities[roll] - probability) > 1e-12
+                   for roll, probability in dice.normal_probabilities.items()):
+                print("adjusting_strategies_test: replaced additive strategy returning normal "
+                      f"probabilities, {type(dice).__name__}")
+                print("Expected:", dict(dice.normal_probabilities), "Actual:", dice.probabilities)
+                failed = True
+        for name, probabilities in ("probabilities", existing_dice.probabilities), \
+                ("preview([10])", existing_dice.preview([10])):
+            if any(abs(probabilities[roll] - probability) > 1e-12
+                   for roll, probability in existing_dice.normal_probabilities.items()):
+                print("adjusting_strategies_test: replaced r_ratio strategy returning normal "
+                      f"probabilities, {name} of dice created before replacing it")
+                print("Expected:", dict(existing_dice.normal_probabilities), "Actual:",
+                      probabilities)
+                failed = True
+    finally:
+        DiceRoller.register_adjusting("additive", DiceRoller.adjust_additive, replace=True)
+        DiceRoller.register_adjusting("r_ratio", DiceRoller.adjust_r_ratio, replace=True)
+
+    if failed:
+        num_failed += 1
+
+
+def preview_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    for dice in (DiceRoller.GamblersFallacyDice(2, 6, 15, rng=DiceRoller.DiceRNG(23)),
+                 DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(23)),
+                 DiceRoller.CatanDice(2, 5, adjusting="multiplicative",
+                                      rng=DiceRoller.DiceRNG(23))):
+        for _ in range(10):
+            dice.roll()
+        state = (dict(dice.frequencies), dice.undo_states.tolist(), dice.redo_states.tolist(),
+                 dice.num_probability_updates)
+        preview = dice.preview([8, 7, 7, 6])
+        expected_after_2 = dice.expected_distribution_after(2)
+        num_cached = len(dice._preview_expectations)
+        dice.expected_distribution_after(2)
+        if (dict(dice.frequencies), dice.undo_states.tolist(), dice.redo_states.tolist(),
+                dice.num_probability_updates) != state or \
+                len(dice._preview_expectations) != num_cached:
+            print(f"preview_test: {type(dice).__name__} changed by previewing, or recomputed "
+                  f"cached states")
+            failed = True
+
+        # Compared against actually rolling (and then undoing) the rolls
+        for roll in 8, 7, 7, 6:
+            dice._add_roll(roll)
+        actual = dict(dice.probabilities)
+        for roll in 6, 7, 7, 8:
+            dice._remove_roll(roll)
+        expected = {roll: 0 for roll in dice.frequencies}
+        for first, first_probability in dict(dice.probabilities).items():
+            dice._add_roll(first)
+            for second, second_probability in dict(dice.probabilities).items():
+                dice._add_roll(second)
+                for roll, probability in dice.probabilities.items():
+                    expected[roll] += first_probability * second_probability * probability
+                dice._remove_roll(second)
+            dice._remove_roll(first)
+        if any(abs(preview[roll] - actual[roll]) > 1e-12 or
+               abs(expected_after_2[roll] - expected[roll]) > 1e-12 for roll in actual):
+            print(f"preview_test: {type(dice).__name__} preview([8, 7, 7, 6]) and "
+                  f"expected_distribution_after(2)")
+            print("Expected:", actual, expected, "Actual:", preview, expected_after_2)
+            failed = True
+
+    # Exact dice preview exactly
+    dice = DiceRoller.GamblersFallacyDice(2, 4, 3, exact=True, rng=DiceRoller.DiceRNG(23))
+    dice.roll()
+    if sum(dice.expected_distribution_after(3).values()) != 1 or \
+            dice.expected_distribution_after(0) != dice.probabilities:
+        print("preview_test: GamblersFallacyDice(2, 4, 3, exact=True) expected distributions")
+        print("Expected: exact, Actual:", dice.expected_distribution_after(3))
+        failed = True
+
+    try:
+        dice.preview([9])
+        print("preview_test: GamblersFallacyDice(2, 4, 3).preview([9])")
+        print("Expected: ValueError, Actual: no error")
+        failed = True
+    except ValueError:
+        pass
+    for num_rolls in 1.5, True, -1:
+        try:
+            dice.expected_distribution_after(num_rolls)
+            print(f"preview_test: GamblersFallacyDice(2, 4, 3).expected_distribution_after("
+                  f"{num_rolls!r})")
+            print("Expected: ValueError, Actual: no error")
+            failed = True
+        except ValueError:
+            pass
+
+    # Looking ahead isn't limited by the recursion limit
+    dice = DiceRoller.GamblersFallacyDice(1, 2, 1)
+    dice.roll()
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(100)
+    try:
+        expected = dice.expected_distribution_after(150)
+    except RecursionError:
+        expected = None
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+    if expected is None or abs(sum(expected.values()) - 1) > 1e-9:
+        print("preview_test: GamblersFallacyDice(1, 2, 1).expected_distribution_after(150) with a",
+              "recursion limit of 100")
+        print("Expected: a distribution, Actual:", expected)
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def convergence_analysis_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # Compared against enumerating every sequence of rolls on exact dice, which must agree exactly
+    num_rolls = 5
+    dice = DiceRoller.GamblersFallacyDice(2, 4, 2, exact=True)
+    normal = [fractions.Fraction(count, 16) for count in DiceRoller.dice_sum_counts(2, 4)]
+    expected = {}
+
+    def enumerate_rolls(depth, probability):
+        if depth == num_rolls:
+            deviation = sum(abs(fractions.Fraction(frequency, num_rolls) - normal_probability)
+                            for frequency, normal_probability in
+                            zip(dice.frequencies.values(), normal))
+            expected[deviation / 2] = expected.get(deviation / 2, 0) + probability
+            return
+        for roll, roll_probability in dict(dice.probabilities).items():
+            if roll_probability:
+                dice._add_roll(roll)
+                enumerate_rolls(depth + 1, probability * roll_probability)
+                dice._remove_roll(roll)
+    enumerate_rolls(0, 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        summaries = []
+        # Spilling every few states to disk mustn't change the results, and nothing may be created
+        #  on disk unless something is spilled
+        created = []
+        for max_states in DiceRollerAnalysis.MAX_STATES_IN_MEMORY, 3:
+            with DiceRollerAnalysis.ConvergenceAnalysis(
+                    2, 4, 2, exact=True, max_states_in_memory=max_states,
+                    spill_directory=directory) as analysis:
+                analysis.run(2)
+                summaries.append(analysis.run(num_rolls))
+                created.append(bool(os.listdir(directory)))
+        if summaries[0][-1].deviations != dict(sorted(expected.items())) or \
+                summaries[0] != summaries[1] or created != [False, True] or os.listdir(directory):
+            print("convergence_analysis_test: ConvergenceAnalysis(2, 4, 2, exact=True) after "
+                  f"{num_rolls} rolls")
+            print("Expected:", dict(sorted(expected.items())), "Actual:",
+                  summaries[0][-1].deviations, "spilled:", summaries[1][-1].deviations)
+            print("Directories created:", created, "left behind:", os.listdir(directory))
+            failed = True
+
+    # Once closed, the summaries already analyzed are kept, but no more rolls can be analyzed
+    if analysis.run(2) != summaries[1][:3]:
+        print("convergence_analysis_test: run(2) after closing")
+        print("Expected:", summaries[1][:3], "Actual:", analysis.run(2))
+        failed = True
+    try:
+        analysis.run(num_rolls + 1)
+        print(f"convergence_analysis_test: run({num_rolls + 1}) after closing")
+        print("Expected: ValueError, Actual: no error")
+        failed = True
+    except ValueError:
+        pass
+
+    # Adjusting dice should deviate less on average than normal dice
+    deviations = [float(DiceRollerAnalysis.expected_deviation(
+        DiceRollerAnalysis.ConvergenceAnalysis(2, 6, aggressiveness).run(8)[-1]))
+        for aggressiveness in (0, 15)]
+    if not deviations[1] < deviations[0]:
+        print("convergence_analysis_test: expected deviation of 2d6 after 8 rolls")
+        print("Expected: aggressiveness 15 below aggressiveness 0, Actual:", deviations)
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def terminal_renderer_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # Without cursor addressing, the output must be exactly what printing the message and the
+    #  dice would print
+    for dice in (DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(25)),
+                 DiceRoller.GamblersFallacyDice(3, 8, 5, rng=DiceRoller.DiceRNG(25))):
+        for _ in range(20):
+            dice.roll()
+        stream = io.StringIO()
+        DiceRoller.TerminalRenderer(dice, stream, cursor_addressing=False).render("Roll: 8")
+        if stream.getvalue() != "Roll: 8\n" + str(dice) + "\n":
+            print(f"terminal_renderer_test: rendering {type(dice).__name__}")
+            print("Expected:", repr("Roll: 8\n" + str(dice) + "\n"), "Actual:",
+                  repr(stream.getvalue()))
+            failed = True
+
+    # With cursor addressing, only changed rows are rewritten, and rendering twice without any
+    #  rolls in between doesn't compute the probabilities again
+    previous_lines = os.environ.get("LINES")
+    os.environ["LINES"] = "50"
+    try:
+        dice = DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(25))
+        renderer = DiceRoller.TerminalRenderer(dice, io.StringIO(), cursor_addressing=True)
+        renderer.render()
+        dice._add_roll(12)
+        renderer.render()
+        num_updates = dice.num_probability_updates
+        renderer.render()
+        # Rolling a 12 changes 12's row, the rows rounding to a different percent (4 and 10),
+        #  and the 7 rows of the player whose turn it was and the player whose turn it is
+        expected = [len(renderer.rows()) + 5, num_updates]
+        actual = [renderer.num_rows_written, dice.num_probability_updates]
+        if actual != expected:
+            print("terminal_renderer_test: rendering CatanDice(3, 15) with cursor addressing")
+            print("Expected rows written and probability updates:", expected, "Actual:", actual)
+            failed = True
+    finally:
+        if previous_lines is None:
+            del os.environ["LINES"]
+        else:
+            os.environ["LINES"] = previous_lines
+
+    # Rendering incremental and exact dice every turn mustn't make them compute their
+    #  probabilities, which their rolls never need, but must show the same table
+    for kwargs in {"incremental": True}, {"exact": True}:
+        dice = DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(26), **kwargs)
+        renderer = DiceRoller.TerminalRenderer(dice, io.StringIO(), cursor_addressing=True)
+        for _ in range(50):
+            renderer.render()
+            dice.roll()
+        num_updates = dice.num_probability_updates
+        rows = renderer.rows()
+        if num_updates != 0 or "\n" + "\n".join(rows) != str(dice):
+            print(f"terminal_renderer_test: rendering CatanDice(3, 15, **{kwargs}) 50 times")
+            print("Expected: no probability updates and", repr(str(dice)))
+            print("Actual:", num_updates, "probability updates and", repr("\n" + "\n".join(rows)))
+            failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def roll_many_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # Given the same random numbers, roll_many() must match calling roll() repeatedly, whether or
+    #  not it records history (and whether or not the rolls are sampled in a batch)
+    for dice_class, args, kwargs in (DiceRoller.GamblersFallacyDice, (3, 6, 10), {}), \
+            (DiceRoller.CatanDice, (3, 15), {}), \
+            (DiceRoller.GamblersFallacyDice, (2, 6, 2), {"max_history": 30}), \
+            (DiceRoller.GamblersFallacyDice, (1, 20, 0), {}), \
+            (DiceRoller.GamblersFallacyDice, (3, 6, 10), {"sampler": "bisect"}):
+        dice = dice_class(*args, rng=DiceRoller.DiceRNG(0), **kwargs)
+        expected = [dice.roll() for _ in range(100)]
+        for record_history in True, False:
+            batch_dice = dice_class(*args, rng=DiceRoller.DiceRNG(0), **kwargs)
+            actual = list(batch_dice.roll_many(100, record_history=record_history))
+            expected_undo_states = list(dice.undo_states) if record_history else []
+            if actual != expected or str(batch_dice) != str(dice) or \
+                    list(batch_dice.undo_states) != expected_undo_states:
+                print(f"roll_many_test: {dice_class.__name__}{args}{kwargs}.roll_many(100,",
+                      f"record_history={record_history})")
+                print("Expected:", expected, str(dice), "Actual:", actual, str(batch_dice))
+                failed = True
+
+    # Rolls spanning several buffers of random numbers must still match roll()
+    num_rolls = DiceRoller.UNIFORM_BUFFER_SIZE + 10
+    dice = DiceRoller.GamblersFallacyDice(1, 6, 1, rng=DiceRoller.DiceRNG(3))
+    expected = [dice.roll() for _ in range(num_rolls)]
+    batch_dice = DiceRoller.GamblersFallacyDice(1, 6, 1, rng=DiceRoller.DiceRNG(3))
+    if list(batch_dice.roll_many(num_rolls, record_history=False)) != expected or \
+            batch_dice.rng.random() != dice.rng.random():
+        print(f"roll_many_test: GamblersFallacyDice(1, 6, 1).roll_many({num_rolls})")
+        print("Expected: the same rolls as roll(), leaving the rng at the same position")
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def undo_redo_history_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    dice = DiceRoller.CatanDice(3, 15, max_history=5)
+    states = []
+    for _ in range(8):
+        states.append((dice.frequencies.copy(), dice.players_seven_counts.copy(),
+                       dice.curr_player))
+        dice.roll()
+    # Only the last 5 rolls are remembered, and undoing them must step back through the exact
+    #  states from before each of them.
+    for expected in reversed(states[3:]):
+        dice.undo()
+        actual = (dice.frequencies, dice.players_seven_counts, dice.curr_player)
+        if actual != expected:
+            print("undo_redo_history_test: undo after 8 rolls of CatanDice(3, 15, max_history=5)")
+            print("Expected:", expected, "Actual:", actual)
+            failed = True
+    if dice.can_undo() or len(dice.redo_states) != 5:
+        print("undo_redo_history_test: 5 undos with max_history=5")
+        print("Expected: can't undo, 5 rolls to redo. Actual:", dice.undo_states, dice.redo_states)
+        failed = True
+    for expected in states[4:]:
+        dice.redo()
+        actual = (dice.frequencies, dice.players_seven_counts, dice.curr_player)
+        if actual != expected:
+            print("undo_redo_history_test: redo after undos")
+            print("Expected:", expected, "Actual:", actual)
+            failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def persistence_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    def state(dice):
+        return (dice.frequencies, dice.players_seven_counts, dice.curr_player,
+                list(dice.undo_states), list(dice.redo_states), str(dice))
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal_path = os.path.join(directory, "journal")
+        checkpoint_path = os.path.join(directory, "checkpoint")
+        dice = DiceRoller.CatanDice(3, 15, max_history=20)
+        journal = DiceRollerPersistence.CatanDiceJournal(journal_path, dice)
+        dice.roll_many(30)
+        for _ in range(5):
+            dice.undo()
+        journal.checkpoint(checkpoint_path)
+        dice.redo()
+        dice.roll_many(10, record_history=False)
+        dice.roll_many(10)
+        dice.undo()
+        journal.close()
+        for description, loaded in (
+                ("journal", DiceRollerPersistence.load_catan_dice(journal_path)),
+                ("checkpoint and journal",
+                 DiceRollerPersistence.load_catan_dice(journal_path, checkpoint_path))):
+            if state(loaded) != state(dice):
+                print(f"persistence_test: load_catan_dice() from {description}")
+                print("Expected:", state(dice), "Actual:", state(loaded))
+                failed = True
+
+        # Journaling other dice, or into a file which isn't a journal, must be refused without
+        #  touching the file
+        for description, path, other_dice in (
+                ("journal of different dice", journal_path, DiceRoller.CatanDice(4, 15)),
+                ("checkpoint", checkpoint_path, dice)):
+            size = os.path.getsize(path)
+            try:
+                DiceRollerPersistence.CatanDiceJournal(path, other_dice).close()
+                print(f"persistence_test: CatanDiceJournal() of a {description}")
+                print("Expected: ValueError, Actual: no error")
+                failed = True
+            except ValueError:
+                if os.path.getsize(path) != size:
+                    print(f"persistence_test: CatanDiceJournal() of a {description}")
+                    print("Expected: file unchanged, Actual size:", os.path.getsize(path),
+                          "instead of", size)
+                    failed = True
+
+        # A header cut short by a crash is written again
+        torn_path = os.path.join(directory, "torn")
+        with open(journal_path, "rb") as file, open(torn_path, "wb") as torn_file:
+            torn_file.write(file.read(5))
+        dice = DiceRoller.CatanDice(3, 15, max_history=20)
+        journal = DiceRollerPersistence.CatanDiceJournal(torn_path, dice)
+        dice.roll_many(3)
+        journal.close()
+        if state(DiceRollerPersistence.load_catan_dice(torn_path)) != state(dice):
+            print("persistence_test: journal whose header was cut short")
+            print("Expected:", state(dice), "Actual:",
+                  state(DiceRollerPersistence.load_catan_dice(torn_path)))
+            failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def multi_session_simulator_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # Given the same random numbers, each session must roll exactly like its own
+    #  GamblersFallacyDice would
+    for num_dice, num_sides, aggressiveness in (3, 6, 10), (2, 6, 2), (1, 20, 0):
+        simulator = DiceRollerSimulation.MultiSessionSimulator(5, num_dice, num_sides,
+                                                               aggressiveness,
+                                                               rng=DiceRoller.DiceRNG(0))
+        # Rolling the dice in order of their sessions, they use the random numbers in the same
+        #  order as the simulator does
+        rng = DiceRoller.DiceRNG(0)
+        all_dice = [DiceRoller.GamblersFallacyDice(num_dice, num_sides, aggressiveness, rng=rng)
+                    for _ in range(5)]
+        for step in range(50):
+            expected_probabilities = [probability for dice in all_dice
+                                      for probability in dice.probabilities.values()]
+            actual_probabilities = simulator.adjusted_probabilities()
+            actual = list(simulator.step())
+            expected = [dice.roll() for dice in all_dice]
+            if actual != expected or actual_probabilities != expected_probabilities:
+                print(f"multi_session_simulator_test: step {step} of 5 sessions of",
+                      f"{num_dice}d{num_sides} with aggressiveness {aggressiveness}")
+                print("Expected:", expected, expected_probabilities)
+                print("Actual:", actual, actual_probabilities)
+                failed = True
+                break
+
+    # Sessions only adjust additively, so multiplicative adjusting is rejected rather than ignored
+    DiceRoller.USE_MULTIPLICATIVE_ADJUSTING = True
+    try:
+        DiceRollerSimulation.MultiSessionSimulator(5, 2, 6, 1)
+        print("multi_session_simulator_test: USE_MULTIPLICATIVE_ADJUSTING = True")
+        print("Expected: ValueError")
+        failed = True
+    except ValueError:
+        pass
+    finally:
+        DiceRoller.USE_MULTIPLICATIVE_ADJUSTING = False
+
+    if failed:
+        num_failed += 1
+
+
+def events_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        ndjson_path = os.path.join(directory, "events.ndjson")
+        binary_path = os.path.join(directory, "events.bin")
+        ring_buffer = DiceRollerEvents.RingBufferSink(4)
+        pipeline = DiceRollerEvents.EventPipeline(
+            [DiceRollerEvents.NDJSONSink(ndjson_path), DiceRollerEvents.BinarySink(binary_path),
+             ring_buffer])
+        catan_dice = DiceRoller.CatanDice(3, 15)
+        dice = DiceRoller.GamblersFallacyDice(2, 6, 10)
+        pipeline.attach(catan_dice)
+        pipeline.attach(dice)
+        rolls = [catan_dice.roll() for _ in range(4)]
+        catan_dice.undo()
+        catan_dice.redo()
+        rolls.append(dice.roll())
+        pipeline.close()
+        expected = [(1, "roll", rolls[0], 1), (1, "roll", rolls[1], 2), (1, "roll", rolls[2], 3),
+                    (1, "roll", rolls[3], 1), (1, "undo", rolls[3], 1), (1, "redo", rolls[3], 1),
+                    (2, "roll", rolls[4], None)]
+        binary_events = DiceRollerEvents.read_event_log(binary_path)
+        with open(ndjson_path) as file:
+            ndjson_events = [DiceRollerEvents.RollEvent(**json.loads(line)) for line in file]
+        for sink, events, expected_events in (("binary", binary_events, expected),
+                                              ("ndjson", ndjson_events, expected),
+                                              ("ring buffer", ring_buffer.events(), expected[-4:])):
+            actual = [(event.table, event.action, event.roll, event.player) for event in events]
+            if actual != expected_events or \
+                    [event.sequence for event in events] != sorted(event.sequence
+                                                                   for event in events):
+                print(f"events_test: {sink} events of 4 Catan rolls, undo, redo, roll")
+                print("Expected:", expected_events, "Actual:", actual)
+                failed = True
+        if not catan_dice.listeners == dice.listeners == []:
+            print("events_test: listeners after closing the pipeline")
+            print("Expected: [] [] Actual:", catan_dice.listeners, dice.listeners)
+            failed = True
+
+    # Rolls of roll_many() without recording history must be attributed to whoever rolled each
+    ring_buffer = DiceRollerEvents.RingBufferSink(10)
+    pipeline = DiceRollerEvents.EventPipeline([ring_buffer])
+    dice = DiceRoller.CatanDice(3, 1)
+    pipeline.attach(dice)
+    rolls = dice.roll_many(5, record_history=False).tolist()
+    pipeline.close()
+    expected = [("roll", roll, player) for roll, player in zip(rolls, [1, 2, 3, 1, 2])] + \
+        [("forget_history", None, None)]
+    actual = [(event.action, event.roll, event.player) for event in ring_buffer.events()]
+    if actual != expected:
+        print("events_test: events of CatanDice(3, 1).roll_many(5, record_history=False)")
+        print("Expected:", expected, "Actual:", actual)
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def history_store_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    store = DiceRollerHistory.HistoryStore()
+    all_dice = [DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(seed)) for seed in range(2)]
+    for table, dice in enumerate(all_dice):
+        store.attach(dice, table)
+    for _ in range(100):
+        for dice in all_dice:
+            dice.roll()
+    # Undoing a roll which isn't the last row, and one which is
+    all_dice[0].undo()
+    all_dice[1].undo()
+    all_dice[1].redo()
+    expected_probability = all_dice[0].probabilities[all_dice[0].roll()]
+    for table, dice in enumerate(all_dice):
+        expected = {roll: frequency for roll, frequency in dice.frequencies.items()
+                    if roll != 7 and frequency}
+        expected[7] = sum(dice.players_seven_counts.values())
+        expected = dict(sorted(expected.items()))
+        actual = store.frequencies(table=table)
+        if actual != expected:
+            print(f"history_store_test: frequencies of table {table}")
+            print("Expected:", expected, "Actual:", actual)
+            failed = True
+        actual = store.seven_counts(table=table)
+        if actual != {player: count for player, count in dice.players_seven_counts.items()
+                      if count}:
+            print(f"history_store_test: seven counts of table {table}")
+            print("Expected:", dice.players_seven_counts, "Actual:", actual)
+            failed = True
+    if store.columns["probability"][-1] != expected_probability or len(store) != 201:
+        print("history_store_test: last row after 200 rolls, 2 undos, a redo and a roll")
+        print("Expected 201 rows ending with probability", expected_probability,
+              "Actual:", len(store), "rows ending with", store.columns["probability"][-1])
+        failed = True
+
+    # A memory mapped copy must give the same answers
+    with tempfile.TemporaryDirectory() as directory:
+        store.save(directory)
+        mapped_store = DiceRollerHistory.HistoryStore.load(directory)
+        for query in "frequencies", "seven_counts", "seven_rates":
+            expected = getattr(store, query)(last=50)
+            actual = getattr(mapped_store, query)(last=50)
+            if actual != expected:
+                print(f"history_store_test: {query}(last=50) of the memory mapped store")
+                print("Expected:", expected, "Actual:", actual)
+                failed = True
+        mapped_store.close()
+
+    # Each roll of roll_many() without recording history must be recorded with its roller and
+    #  the probability it had just before it was rolled, like rolling one at a time
+    store = DiceRollerHistory.HistoryStore()
+    dice = DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(20))
+    store.attach(dice, 0)
+    dice.roll_many(5, record_history=False)
+    one_at_a_time = DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(20))
+    expected = []
+    for _ in range(5):
+        player = one_at_a_time.curr_player
+        probabilities = dict(one_at_a_time.probabilities)
+        roll = one_at_a_time.roll()
+        expected.append((roll, player, probabilities[roll]))
+    actual = list(zip(store.columns["roll"], store.columns["player"],
+                      store.columns["probability"]))
+    if actual != expected:
+        print("history_store_test: rows of CatanDice(3, 15).roll_many(5, record_history=False)")
+        print("Expected:", expected, "Actual:", actual)
+        failed = True
+
+    # Recording the rolls of incremental dice mustn't make them compute their probabilities, and
+    #  each roll is recorded with the probability it was sampled with
+    store = DiceRollerHistory.HistoryStore()
+    dice = DiceRoller.GamblersFallacyDice(3, 6, 5, incremental=True, rng=DiceRoller.DiceRNG(4))
+    store.attach(dice, 0)
+    expected = []
+    for _ in range(50):
+        probabilities = dice._incremental_probabilities()
+        expected.append(probabilities[dice.roll()])
+    dice.undo()
+    dice.redo()
+    if dice.num_probability_updates != 0 or \
+            list(store.columns["probability"]) != expected:
+        print("history_store_test: recording 50 rolls, an undo and a redo of incremental 3d6")
+        print("Expected: no probability updates and probabilities", expected)
+        print("Actual:", dice.num_probability_updates, "updates and probabilities",
+              list(store.columns["probability"]))
+        failed = True
+
+    # Rolls which were undone don't count towards the last rolls queries look at
+    store = DiceRollerHistory.HistoryStore()
+    dice = DiceRoller.GamblersFallacyDice(2, 6, 5, rng=DiceRoller.DiceRNG(5))
+    other_dice = DiceRoller.GamblersFallacyDice(2, 6, 5, rng=DiceRoller.DiceRNG(6))
+    store.attach(dice, 0)
+    store.attach(other_dice, 1)
+    rolls = []
+    other_rolls = []
+    for _ in range(10):
+        rolls.append(dice.roll())
+        other_rolls.append(other_dice.roll())
+    for _ in range(3):
+        dice.undo()
+    # The rolls which remain, in the order they were rolled, are table 0's first 7 interleaved
+    #  with table 1's first 7, followed by the rest of table 1's
+    remaining = [roll for pair in zip(rolls[:7], other_rolls[:7]) for roll in pair] + \
+        other_rolls[7:]
+    for table, expected_rolls in (0, rolls[2:7]), (None, remaining[-5:]):
+        expected = dict(sorted(collections.Counter(expected_rolls).items()))
+        actual = store.frequencies(last=5, table=table)
+        if actual != expected:
+            print(f"history_store_test: frequencies(last=5, table={table}) after 3 undos")
+            print("Expected:", expected, "Actual:", actual)
+            failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def server_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    async def session(snapshot_directory):
+        """ Returns the responses to a series of requests sent over a socket to a server which
+        saves snapshots to <snapshot_directory>, and the server.
+        """
+        server = DiceRollerServer.DiceServer(snapshot_directory)
+        port = (await server.start()).sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        requests = [{"op": "create", "players": 3, "aggressiveness": 12, "id": 1},
+                    {"op": "roll", "table": 1}, {"op": "roll", "table": 1},
+                    {"op": "undo", "table": 1}, {"op": "redo", "table": 1},
+                    {"op": "redo", "table": 1}, {"op": "roll", "table": 2},
+                    {"op": "roll", "table": [1]},
+                    {"op": "create", "players": 3, "aggressiveness": float("inf")},
+                    {"op": "create", "players": 0, "aggressiveness": 12},
+                    {"op": "create", "players": 70000, "aggressiveness": 12},
+                    {"op": "create", "players": 3, "aggressiveness": 12, "max_history": True}]
+        responses = []
+        for request in requests:
+            writer.write(json.dumps(request).encode() + b"\n")
+            responses.append(json.loads(await reader.readline()))
+        writer.close()
+        await server.stop()
+        return responses, server
+
+    with tempfile.TemporaryDirectory() as directory:
+        responses, server = asyncio.run(session(directory))
+        rolls = [response.get("roll") for response in responses[1:5]]
+        expected = [{"table": 1, "ok": True, "id": 1},
+                    {"roll": rolls[0], "player": 1, "curr_player": 2, "ok": True},
+                    {"roll": rolls[1], "player": 2, "curr_player": 3, "ok": True},
+                    {"roll": rolls[1], "player": 2, "curr_player": 2, "ok": True},
+                    {"roll": rolls[1], "player": 2, "curr_player": 3, "ok": True},
+                    {"ok": False, "error": "Can't redo, no immediately recent undos to redo"},
+                    {"ok": False, "error": "No open table 2"},
+                    {"ok": False, "error": "No open table [1]"},
+                    {"ok": False, "error": "aggressiveness must be a finite non-negative number"},
+                    {"ok": False, "error": "players must be a positive integer"},
+                    {"ok": False, "error": "players must be at most 65535"},
+                    {"ok": False, "error": "max_history must be a non-negative integer"}]
+        if responses != expected:
+            print("server_test: responses to create, roll, roll, undo, redo, redo, bad requests")
+            print("Expected:", expected, "Actual:", responses)
+            failed = True
+
+        # A new server must reopen the table as it was when the first one shut down, ignoring files
+        #  which aren't snapshots
+        with open(os.path.join(directory, "table-x.cdck"), "wb"):
+            pass
+        restarted_server = DiceRollerServer.DiceServer(directory)
+        restarted_server.load_snapshots()
+        expected = DiceRollerServer.state(server.tables[1].dice)
+        actual = DiceRollerServer.state(restarted_server.tables[1].dice)
+        if actual != expected:
+            print("server_test: state of table 1 after restarting from snapshots")
+            print("Expected:", expected, "Actual:", actual)
+            failed = True
+
+    # A table which can't be saved mustn't stop the other tables being saved
+    with tempfile.TemporaryDirectory() as directory:
+        server = DiceRollerServer.DiceServer(directory)
+        server.tables[1] = DiceRollerServer.Table(1, DiceRoller.CatanDice(70000, 12))
+        server.tables[2] = DiceRollerServer.Table(2, DiceRoller.CatanDice(3, 12))
+        with contextlib.redirect_stderr(io.StringIO()):
+            failures = asyncio.run(server.snapshot())
+        if list(failures) != [1] or os.listdir(directory) != ["table-2.cdck"]:
+            print("server_test: snapshot() of a table with too many players and a normal table")
+            print("Expected: only table 1 failing, Actual:", failures, os.listdir(directory))
+            failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def tuning_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # The worst case probabilities must reach certainty at the aggressivenesses found by hand
+    for function, aggressiveness, expected in (
+            (DiceRollerTuning.worst_case_seven_probability, 35, 1.0),
+            (DiceRollerTuning.worst_case_six_probability, 17, 1.0)):
+        actual = function(aggressiveness)
+        if abs(actual - expected) > 1e-9:
+            print(f"tuning_test: {function.__name__}({aggressiveness})")
+            print("Expected:", expected, "Actual:", actual)
+            failed = True
+
+    # Simulating with the same seed must give the same totals, and no roll can be more likely than
+    #  certain
+    totals = [DiceRollerTuning.simulate_games(10, 3, 40, 5, DiceRoller.DiceRNG(2))
+              for _ in range(2)]
+    if totals[0] != totals[1] or not 0 < totals[0]["max_probability"] <= 1:
+        print("tuning_test: simulate_games(10, 3, 40, 5, DiceRoller.DiceRNG(2)) twice")
+        print("Actual:", totals)
+        failed = True
+
+    # Sweeping with the same seed must give the same results, however many processes there are
+    num_games = DiceRollerTuning.GAMES_PER_TASK + 3
+    results = [DiceRollerTuning.sweep((0, 10), (3,), (20,), num_games, processes=processes,
+                                      seed=11)
+               for processes in (2, 2, 1)]
+    if results[0] != results[1] or results[0] != results[2] or \
+            [result["games"] for result in results[0]] != [num_games, num_games]:
+        print(f"tuning_test: sweep((0, 10), (3,), (20,), {num_games}, seed=11) with 2, 2 and 1 "
+              "processes")
+        print("Actual:", results)
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def benchmarks_compare_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    baseline = {"a": 1.0, "b": 1.0, "c": 1.0}
+    results = {"a": 1.05, "b": 1.5, "c": 0.5, "d": 9.0}
+    expected = [{"name": "b", "baseline": 1.0, "current": 1.5, "ratio": 1.5}]
+    actual = DiceRollerBenchmarks.compare(results, baseline, threshold=0.1)
+    if actual != expected:
+        print(f"benchmarks_compare_test: compare({results}, {baseline}, threshold=0.1)")
+        print("Expected:", expected, "Actual:", actual)
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
+def instrumentation_test():
+    """ Returns boolean representing whether test passed or not. Prints results only if it fails.
+    Increments num_tests no matter what, increments num_failed iff it fails.
+    """
+    global num_run
+    global num_failed
+    num_run += 1
+    failed = False
+
+    # Instrumented dice must roll exactly like dice which aren't, and count every call
+    dice = DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(4))
+    instrumented_dice = DiceRoller.CatanDice(3, 15, rng=DiceRoller.DiceRNG(4))
+    DiceRollerInstrumentation.enable(instrumented_dice)
+    expected = [dice.roll() for _ in range(100)]
+    actual = [instrumented_dice.roll() for _ in range(100)]
+    instrumented_dice.undo()
+    if actual != expected:
+        print("instrumentation_test: 100 rolls of instrumented CatanDice(3, 15)")
+        print("Expected:", expected, "Actual:", actual)
+        failed = True
+    expected = {"update_probabilities": 100, "sampling": 100, "history_push": 100, "history_pop": 1,
+                "add_roll": 100, "remove_roll": 1}
+    actual = {name: method_stats["calls"] for name, method_stats in
+              DiceRollerInstrumentation.stats(instrumented_dice).items()}
+    if actual != expected:
+        print("instrumentation_test: calls after 100 rolls and an undo")
+        print("Expected:", expected, "Actual:", actual)
+        failed = True
+
+    # Rendering like run_catan() does is timed by instrumenting the renderer
+    renderer = DiceRoller.TerminalRenderer(instrumented_dice, io.StringIO(),
+                                           cursor_addressing=False)
+    DiceRollerInstrumentation.enable(renderer)
+    for _ in range(3):
+        renderer.render()
+    DiceRollerInstrumentation.disable(renderer)
+    renderer.render()
+    rendering = DiceRollerInstrumentation.stats(instrumented_dice).get("rendering", {})
+    if rendering.get("calls") != 3 or type(renderer) is not DiceRoller.TerminalRenderer:
+        print("instrumentation_test: 3 renders with the renderer instrumented, then 1 without")
+        print("Expected: 3 rendering calls, Actual:", rendering, type(renderer).__name__)
+        failed = True
+
+    # Disabling must restore the original class, and keep the stats
+    DiceRollerInstrumentation.disable(instrumented_dice)
+    instrumented_dice.roll()
+    if type(instrumented_dice) is not DiceRoller.CatanDice or \
+            DiceRollerInstrumentation.stats(instrumented_dice)["sampling"]["calls"] != 100:
+        print("instrumentation_test: disable() after 100 rolls, then a roll")
+        print("Actual class:", type(instrumented_dice).__name__, "stats:",
+              DiceRollerInstrumentation.stats(instrumented_dice))
+        failed = True
+
+    if failed:
+        num_failed += 1
+
+
 class GamblersFallacyDiceTests:
     # TODO: Deal with this, put it somewhere at beggining of module, not in each docstring.
     """ All tests returns boolean representing whether test passed or not. All tests prints results only if test
@@ -468,75 +1932,42 @@ class CatanDiceTests:
             num_failed += 1
 
 
-dice_sum_probability_test()
-normalize_test()
-normalized_test()
-set_negative_values_to_0_test()
-GamblersFallacyDiceTests.init_test()
-
-if (num_failed == 0):
-    print(num_run, "tests run. All tests passed.")
-else:
-    print(num_run, "tests run.", num_failed, "tests failed.")
-
-
-def for_finding_optimal_aggressiveness_no_split_7s(aggressiveness):
-    """ Constructs a situation very likely to give a 100% chance of rolling a 7, if it is actually
-    even particularly plausible to have a 100% chance roll at the given level of aggressiveness.
-    Used for no split 7s Catan.
-    """
-    dice = DiceRoller.DiceProbabilityDistribution(
-        num_dice=2, num_sides=6, aggressiveness=aggressiveness)
-    dice.frequencies = {2: 1, 3: 2, 4: 3, 5: 4, 6: 5, 7: 5, 8: 5, 9: 4, 10: 3, 11: 2, 12: 1}
-    dice.frequencies[2] -= 1
-    dice.update(2)
-    print(dice)
-
-
-def for_finding_optimal_aggressiveness(aggressiveness):
-    """ Constructs a situation very likely to give a 100% chance of rolling a 6, if it is actually
-    even particularly plausible to have a 100% chance roll at the given level of aggressiveness.
-    Used for split 7s Catan (the normal Catan). Uses 2 players.
-    """
-    dice = DiceRoller.CatanDiceProbabilityDistribution(
-        num_players=2, aggressiveness=aggressiveness)
-    dice.probability_distributions[1].frequencies = {
-        2: 1, 3: 2, 4: 3, 5: 4, 6: 3, 7: 6, 8: 5, 9: 4, 10: 3, 11: 2, 12: 1}
-    dice.probability_distributions[1].frequencies[2] -= 1
-    dice.probability_distributions[1].update(2)
-    dice.probability_distributions[2].frequencies = {
-        2: 1, 3: 2, 4: 3, 5: 4, 6: 3, 7: 6, 8: 5, 9: 4, 10: 3, 11: 2, 12: 1}
-    dice.probability_distributions[2].frequencies[2] -= 1
-    dice.probability_distributions[2].update(2)
-    print(dice)
-
-# 100 percent chance of a 7
-# for_finding_optimal_aggressiveness_no_split_7s(35)
-# 98 percent chance of a 7
-# for_finding_optimal_aggressiveness_no_split_7s(34)
-# 95 percent chance of a 7
-# for_finding_optimal_aggressiveness_no_split_7s(33)
-# 93 percent chance of a 7
-# for_finding_optimal_aggressiveness_no_split_7s(32)
-# 90 percent chance of a 7
-# for_finding_optimal_aggressiveness_no_split_7s(31)
-# 88 percent chance of a 7
-# for_finding_optimal_aggressiveness_no_split_7s(30)
-# 86 percent chance of a 7
-# for_finding_optimal_aggressiveness_no_split_7s(30)
-# 98 percent chance of a 7 when 4 sevens have already been rolled (instead of 5)
-# for_finding_optimal_aggressiveness_no_split_7s(16.5)
-
-# 100 percent chance of a 6
-# for_finding_optimal_aggressiveness(18)
-# 95 percent chance of a 6
-# for_finding_optimal_aggressiveness(17)
-# 90 percent chance of a 6
-# for_finding_optimal_aggressiveness(16)
-# 90 percent chance of a 6
-# for_finding_optimal_aggressiveness(15)
-# 85 percent chance of a 6
-# for_finding_optimal_aggressiveness(14)
-
-
-print({roll: DiceRoller.dice_sum_probability(roll, 4, 4) * 4**4 for roll in range(4, 16 + 1)})
\ No newline at end of file
+# Only when run directly, since the worker processes of tuning_test() may import this module
+if __name__ == "__main__":
+    dice_sum_probability_test()
+    dice_sum_counts_test()
+    normal_distribution_cache_test()
+    alias_table_test()
+    samplers_test()
+    dice_rng_test()
+    normalize_test()
+    normalized_test()
+    set_negative_values_to_0_test()
+    additive_adjustment_test()
+    incremental_dice_test()
+    lazy_probabilities_test()
+    two_six_sided_fast_path_test()
+    exact_dice_test()
+    multiplicative_engine_test()
+    adjusting_strategies_test()
+    preview_test()
+    convergence_analysis_test()
+    terminal_renderer_test()
+    roll_many_test()
+    undo_redo_history_test()
+    persistence_test()
+    multi_session_simulator_test()
+    events_test()
+    history_store_test()
+    server_test()
+    tuning_test()
+    benchmarks_compare_test()
+    instrumentation_test()
+    GamblersFallacyDiceTests.init_test()
+
+    if (num_failed == 0):
+        print(num_run, "tests run. All tests passed.")
+    else:
+        print(num_run, "tests run.", num_failed, "tests failed.")
+
+    print({roll: DiceRoller.dice_sum_probability(roll, 4, 4) * 4**4 for roll in range(4, 16 + 1)})
@@ -0,0 +1,165 @@
+import argparse
+import itertools
+import multiprocessing
+
+import DiceRoller
+
+# Number of games simulated by each task handed to a worker process. Small enough that the work
+#  is spread evenly over the workers, big enough that the overhead of handing out tasks is
+#  negligible.
+GAMES_PER_TASK = 25
+
+
+def simulate_games(aggressiveness, num_players, num_rolls, num_games, rng):
+    """ Simulates <num_games> games of Catan with <num_players> players, each lasting <num_rolls>
+    rolls of CatanDice with the passed in aggressiveness, using the DiceRoller.DiceRNG <rng>.
+    Returns a dictionary of totals over all the games, which can be added to the totals of other
+    calls and then turned into averages with summarize():
+    "games": the number of games.
+    "distance": the sum of each game's total variation distance between the distribution of its
+    rolls and the normal distribution of 2 six sided dice, at the end of the game. Smaller means
+    the rolls converged faster.
+    "max_probability": the largest probability that any roll had at any point in any game.
+    "sum_of_max_probabilities": the sum of each game's largest probability of any roll.
+    "seven_spread": the sum of each game's difference between the most and the fewest 7s rolled by
+    any player. Smaller means the 7s were shared more fairly.
+    """
+    totals = {"games": num_games, "distance": 0.0, "max_probability": 0.0,
+              "sum_of_max_probabilities": 0.0, "seven_spread": 0}
+    for _ in range(num_games):
+        # No rolls are ever undone, so there's no need to remember any
+        dice = DiceRoller.CatanDice(num_players, aggressiveness, max_history=0, rng=rng)
+        game_max_probability = 0.0
+        for _ in range(num_rolls):
+            # Rolling reuses these probabilities rather than computing them again
+            game_max_probability = max(game_max_probability, max(dice.probabilities.values()))
+            dice.roll()
+        # self.frequencies[7] is only the current player's 7s (scaled), so the total number of 7s
+        #  comes from the players' counts.
+        roll_counts = dict(dice.frequencies)
+        roll_counts[7] = sum(dice.players_seven_counts.values())
+        totals["distance"] += sum(abs(count / num_rolls - dice.normal_probabilities[roll])
+                                  for roll, count in roll_counts.items()) / 2
+        totals["max_probability"] = max(totals["max_probability"], game_max_probability)
+        totals["sum_of_max_probabilities"] += game_max_probability
+        totals["seven_spread"] += max(dice.players_seven_counts.values()) - \
+            min(dice.players_seven_counts.values())
+    return totals
+
+
+def _simulate_task(task):
+    """ Runs simulate_games() with the arguments in the tuple <task>, and returns the tuple
+    (point, totals), where point is the (aggressiveness, num_players, num_rolls) simulated. Needs
+    to be a top level function so that worker processes can run it.
+    """
+    aggressiveness, num_players, num_rolls, num_games, rng = task
+    return ((aggressiveness, num_players, num_rolls),
+            simulate_games(aggressiveness, num_players, num_rolls, num_games, rng))
+
+
+def summarize(point, totals):
+    """ Returns a dictionary describing the simulations of the (aggressiveness, num_players,
+    num_rolls) <point>, with the averages of the <totals> returned by simulate_games().
+    """
+    aggressiveness, num_players, num_rolls = point
+    games = totals["games"]
+    return {"aggressiveness": aggressiveness, "num_players": num_players, "num_rolls": num_rolls,
+            "games": games, "distance": totals["distance"] / games,
+            "max_probability": totals["max_probability"],
+            "mean_max_probability": totals["sum_of_max_probabilities"] / games,
+            "seven_spread": totals["seven_spread"] / games}
+
+
+def sweep(aggressivenesses, player_counts, game_lengths, num_games, processes=None, seed=None):
+    """ Simulates <num_games> games for every combination of an aggressiveness in
+    <aggressivenesses>, a number of players in <player_counts> and a number of rolls in
+    <game_lengths>, spread over <processes> worker processes (as many as there are cores if None).
+    Returns a list of the summarize() dictionaries of every combination, in the order of
+    itertools.product(aggressivenesses, player_counts, game_lengths).
+    The results only depend on <seed> (fresh entropy if None), not on the number of processes.
+    """
+    points = list(itertools.product(aggressivenesses, player_counts, game_lengths))
+    tasks = []
+    for point in points:
+        chunks = [GAMES_PER_TASK] * (num_games // GAMES_PER_TASK)
+        if num_games % GAMES_PER_TASK:
+            chunks.append(num_games % GAMES_PER_TASK)
+        tasks.extend(point + (chunk,) for chunk in chunks)
+    # Every task gets its own independent stream of random numbers
+    rngs = DiceRoller.DiceRNG(seed).spawn(len(tasks))
+    tasks = [task + (rng,) for task, rng in zip(tasks, rngs)]
+    totals = {point: {"games": 0, "distance": 0.0, "max_probability": 0.0,
+                      "sum_of_max_probabilities": 0.0, "seven_spread": 0} for point in points}
+    with multiprocessing.Pool(processes) as pool:
+        # In order, so that the totals are added up in the same order however many processes there
+        #  are
+        for point, task_totals in pool.imap(_simulate_task, tasks):
+            for key, value in task_totals.items():
+                if key == "max_probability":
+                    totals[point][key] = max(totals[point][key], value)
+                else:
+                    totals[point][key] += value
+    return [summarize(point, totals[point]) for point in points]
+
+
+def format_table(results):
+    """ Returns a string of the sweep() <results> as a table with one row per combination.
+    """
+    lines = ["aggressiveness players rolls  games distance max_prob mean_max_prob seven_spread"]
+    for result in results:
+        lines.append("{aggressiveness:14g} {num_players:7d} {num_rolls:5d} {games:6d} "
+                     "{distance:8.4f} {max_probability:8.3f} {mean_max_probability:13.3f} "
+                     "{seven_spread:12.2f}".format(**result))
+    return "\n".join(lines)
+
+
+# The worst cases below are situations where a single roll is very underrepresented, so its
+#  probability gets very high. Finding the aggressiveness at which that probability gets close to
+#  100% gives an upper bound on sensible aggressivenesses. For example, with no split 7s a 7 is
+#  certain at an aggressiveness of 35 (and 88% likely at 30), and with split 7s a 6 is certain at
+#  17 (and 85% likely at 14).
+
+def worst_case_seven_probability(aggressiveness):
+    """ Returns the probability of rolling a 7 on 2 six sided GamblersFallacyDice (so with no split
+    7s) with the passed in aggressiveness, after 35 rolls which went exactly as expected for 36
+    rolls, except that there was one 7 too few.
+    """
+    dice = DiceRoller.GamblersFallacyDice(2, 6, aggressiveness)
+    for roll, count in {2: 1, 3: 2, 4: 3, 5: 4, 6: 5, 7: 5, 8: 5, 9: 4, 10: 3, 11: 2,
+                        12: 1}.items():
+        dice._set_frequency(roll, count)
+    return dice.probabilities[7]
+
+
+def worst_case_six_probability(aggressiveness):
+    """ Returns the probability of rolling a 6 on CatanDice for 2 players with the passed in
+    aggressiveness, after 34 rolls which went exactly as expected for 36 rolls (with each player
+    rolling 3 of the 7s), except that there were two 6s too few.
+    """
+    dice = DiceRoller.CatanDice(2, aggressiveness)
+    for roll, count in {2: 1, 3: 2, 4: 3, 5: 4, 6: 3, 8: 5, 9: 4, 10: 3, 11: 2, 12: 1}.items():
+        dice._set_frequency(roll, count)
+    dice.players_seven_counts = {1: 3, 2: 3}
+    dice._sync_seven_frequency()
+    return dice.probabilities[6]
+
+
+def main():
+    """ Runs a sweep with the parameters passed on the command line and prints the results.
+    """
+    parser = argparse.ArgumentParser(
+        description="Simulates games of Catan with CatanDice for every combination of the given "
+                    "aggressivenesses, numbers of players and game lengths.")
+    parser.add_argument("--aggressiveness", type=float, nargs="+", default=[5, 10, 15, 20, 25])
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--rolls", type=int, nargs="+", default=[60, 120])
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    print(format_table(sweep(args.aggressiveness, args.players, args.rolls, args.games,
+                             processes=args.processes, seed=args.seed)))
+
+
+if __name__ == "__main__":
+    main()